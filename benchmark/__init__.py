@@ -0,0 +1 @@
+# Benchmark e suite di carico dei due microservizi (python -m benchmark.suite)
@@ -0,0 +1,55 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent import futures
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "user_manager"))
+from hashing import PasswordHasher
+
+# Benchmark degli hash delle password della registrazione: per ogni costo scrypt (n) simula
+# --threads richieste concorrenti (i thread di Flask) che calcolano l'hash inline oppure nel
+# pool di processi di hashing.py, e riporta registrazioni/s e latenza p50/p99 dell'hash.
+# Uso: python benchmark/bench_hashing.py --costs 8192,16384,32768 --threads 16 --workers 4
+
+
+def misura(nome, hasher, threads, registrazioni):
+    tempi = []
+
+    def registra(i):
+        t = time.perf_counter()
+        hasher.hash(f"password-{i}")
+        return (time.perf_counter() - t) * 1000
+
+    hasher.hash("riscaldamento")
+    inizio = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        tempi = sorted(executor.map(registra, range(registrazioni)))
+    durata = time.perf_counter() - inizio
+
+    p99 = tempi[int(len(tempi) * 0.99) - 1]
+    print(f"{nome:<28} reg/s={registrazioni / durata:9.1f}  p50={statistics.median(tempi):8.2f} ms  p99={p99:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--costs", default="8192,16384,32768", help="valori di n per scrypt")
+    parser.add_argument("--threads", type=int, default=16, help="richieste concorrenti")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="processi del pool")
+    parser.add_argument("--count", type=int, default=400, help="registrazioni per misura")
+    args = parser.parse_args()
+
+    misura("sha256 (vecchio)", PasswordHasher("sha256", {}, workers=0), args.threads, args.count)
+
+    for n in [int(c) for c in args.costs.split(",")]:
+        parametri = {"n": n, "r": 8, "p": 1}
+        misura(f"scrypt n={n} inline", PasswordHasher("scrypt", parametri, workers=0), args.threads, args.count)
+
+        pool = PasswordHasher("scrypt", parametri, workers=args.workers)
+        misura(f"scrypt n={n} pool x{args.workers}", pool, args.threads, args.count)
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import time
+import uuid
+from collections import Counter
+from concurrent import futures
+import requests
+
+# Benchmark dell'import massivo: righe/s di POST /users/bulk (un solo stream NDJSON) contro
+# POST /users (un utente per richiesta, --threads richieste concorrenti) sullo User Manager avviato.
+# Uso: python benchmark/bench_import.py --url http://localhost:5000 --rows 20000 --single 1000 --threads 16
+
+
+def genera_righe(prefisso, quanti):
+    for i in range(quanti):
+        yield {"email": f"bulk-{prefisso}-{i}@example.com", "password": f"pw-{i}", "nome": "Bench", "cognome": "Import"}
+
+
+def bench_bulk(url, righe):
+    corpo = (json.dumps(r).encode() + b"\n" for r in righe)
+    inizio = time.perf_counter()
+    r = requests.post(f"{url}/users/bulk", data=corpo, headers={"Content-Type": "application/x-ndjson"}, stream=True)
+    stati = Counter(json.loads(linea)["stato"] for linea in r.iter_lines() if linea)
+    durata = time.perf_counter() - inizio
+    return sum(stati.values()), durata, dict(stati)
+
+
+def bench_singolo(url, righe, threads):
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=threads))
+
+    def invia(riga):
+        return session.post(f"{url}/users", json=riga, headers={"Request-ID": uuid.uuid4().hex}).status_code
+
+    inizio = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        stati = Counter(executor.map(invia, righe))
+    durata = time.perf_counter() - inizio
+    return sum(stati.values()), durata, dict(stati)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--rows", type=int, default=20000, help="utenti importati con /users/bulk")
+    parser.add_argument("--single", type=int, default=1000, help="utenti registrati con /users")
+    parser.add_argument("--threads", type=int, default=16, help="richieste concorrenti per /users")
+    args = parser.parse_args()
+
+    prefisso = uuid.uuid4().hex[:8]
+    risultati = {}
+    for nome, (righe, durata, stati) in {
+        "bulk": bench_bulk(args.url, genera_righe(prefisso + "b", args.rows)),
+        "singolo": bench_singolo(args.url, list(genera_righe(prefisso + "s", args.single)), args.threads),
+    }.items():
+        risultati[nome] = {"righe": righe, "durata_s": round(durata, 2), "righe_al_secondo": round(righe / durata, 1), "esiti": stati}
+
+    print(json.dumps(risultati, indent=4))
+
+
+if __name__ == '__main__':
+    main()
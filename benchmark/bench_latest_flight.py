@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import statistics
+import time
+from pymongo import MongoClient, ASCENDING, DESCENDING
+
+# Benchmark di /flights/last: confronta il vecchio percorso (find_one ordinato sugli snapshot con
+# tutto l'array 'data') con la vista materializzata latest_flight e con la mappa in memoria.
+# Usa un database separato (bench_flight_db) che viene ricreato ad ogni esecuzione.
+# Uso: MONGO_URL=mongodb://localhost:27017/ python benchmark/bench_latest_flight.py --snapshots 10000
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
+
+
+def genera_volo(airport, first_seen):
+    return {
+        "icao24": f"{random.getrandbits(24):06x}",
+        "firstSeen": first_seen,
+        "lastSeen": first_seen + 3600,
+        "estDepartureAirport": airport,
+        "estArrivalAirport": "LIRF",
+        "callsign": f"BENCH{random.randint(100, 999)}",
+    }
+
+
+def prepara_dati(db, aeroporti, snapshots, voli_per_snapshot):
+    db.flights.create_index([("airport", ASCENDING), ("timestamp", DESCENDING)])
+    inizio = time.time() - snapshots * 600
+
+    for airport in aeroporti:
+        blocco = []
+        ultimo = None
+        for i in range(snapshots):
+            ts = inizio + i * 600
+            voli = [genera_volo(airport, int(ts) - random.randint(0, 600)) for _ in range(voli_per_snapshot)]
+            blocco.append({"airport": airport, "timestamp": ts, "count": len(voli), "data": voli})
+            ultimo = max(voli, key=lambda v: v["firstSeen"])
+            if len(blocco) == 1000:
+                db.flights.insert_many(blocco)
+                blocco = []
+        if blocco:
+            db.flights.insert_many(blocco)
+
+        db.latest_flight.replace_one(
+            {"_id": airport},
+            {"firstSeen": ultimo["firstSeen"], "volo": dict(ultimo, airport=airport)},
+            upsert=True
+        )
+
+
+def misura(nome, funzione, aeroporti, ripetizioni):
+    tempi = []
+    for _ in range(ripetizioni):
+        airport = random.choice(aeroporti)
+        t = time.perf_counter()
+        funzione(airport)
+        tempi.append((time.perf_counter() - t) * 1000)
+
+    tempi.sort()
+    p99 = tempi[int(len(tempi) * 0.99) - 1]
+    print(f"{nome:<28} media={statistics.mean(tempi):8.3f} ms  p50={statistics.median(tempi):8.3f} ms  "
+          f"p99={p99:8.3f} ms  ops/s={1000 / statistics.mean(tempi):10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--airports", type=int, default=3)
+    parser.add_argument("--snapshots", type=int, default=10000, help="snapshot per aeroporto")
+    parser.add_argument("--flights", type=int, default=50, help="voli per snapshot")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    client = MongoClient(MONGO_URL)
+    client.drop_database("bench_flight_db")
+    db = client["bench_flight_db"]
+    aeroporti = [f"BN{i:02d}" for i in range(args.airports)]
+
+    print(f"Preparo {args.snapshots} snapshot x {args.flights} voli per {args.airports} aeroporti...")
+    prepara_dati(db, aeroporti, args.snapshots, args.flights)
+
+    def vecchio_percorso(airport):
+        # la vecchia get_ultimo_volo: documento intero, poi data[0]
+        record = db.flights.find_one({"airport": airport, "count": {"$gt": 0}}, sort=[("timestamp", -1)])
+        return record["data"][0]
+
+    def vista_materializzata(airport):
+        return db.latest_flight.find_one({"_id": airport})["volo"]
+
+    mappa = {airport: vista_materializzata(airport) for airport in aeroporti}
+
+    def mappa_in_memoria(airport):
+        return dict(mappa[airport])
+
+    misura("snapshot find_one + data[0]", vecchio_percorso, aeroporti, args.repeat)
+    misura("latest_flight per _id", vista_materializzata, aeroporti, args.repeat)
+    misura("mappa in memoria", mappa_in_memoria, aeroporti, args.repeat)
+
+    client.drop_database("bench_flight_db")
+
+
+if __name__ == '__main__':
+    main()
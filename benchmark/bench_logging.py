@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent import futures
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_collector"))
+
+# Throughput di una route come GET /flights/last con i vecchi print() (dump del volo con
+# json.dumps(indent=4) su stdout non bufferizzato, come con PYTHONUNBUFFERED=1 nei container)
+# e con logger.py (righe in coda scritte da un thread dedicato, dump solo a DEBUG, righe per
+# richiesta campionate). stdout va in una pipe svuotata da un processo 'cat', come sotto docker.
+# Per la misura end-to-end sul servizio avviato usare benchmark/loadtest.py prima e dopo.
+# Uso: python benchmark/bench_logging.py --richieste 20000 --threads 16
+
+VOLO = {
+    "icao24": "4ca7b5", "firstSeen": 1700000000, "estDepartureAirport": "LIRF", "lastSeen": 1700003600,
+    "estArrivalAirport": "EGLL", "callsign": "AZA204  ", "estDepartureAirportHorizDistance": 1234,
+    "estDepartureAirportVertDistance": 56, "estArrivalAirportHorizDistance": 789,
+    "estArrivalAirportVertDistance": 12, "departureAirportCandidatesCount": 1,
+    "arrivalAirportCandidatesCount": 2,
+}
+
+
+def crea_app(registra):
+    app = Flask(__name__)
+
+    @app.route('/flights/last')
+    def ultimo_volo():
+        volo = dict(VOLO)
+        registra(volo)
+        return jsonify(volo), 200
+
+    return app
+
+
+def con_print(volo):
+    #com'era app.get_last_flight prima di logger.py
+    print(f"\n Ultimo volo trovato per LIRF:")
+    print(json.dumps(volo, indent=4))
+    print("-" * 30)
+
+
+def misura(app, richieste, threads):
+    client = app.test_client()
+    for _ in range(200):
+        client.get('/flights/last')  #riscaldamento
+
+    inizio = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: client.get('/flights/last').status_code, range(richieste)))
+    return richieste / (time.perf_counter() - inizio)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--richieste", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    #il report va sul vero stdout, tutto il resto nella pipe
+    report = os.fdopen(os.dup(1), "w")
+    scarico = subprocess.Popen(["cat"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    os.dup2(scarico.stdin.fileno(), 1)
+    sys.stdout = open(1, "w", buffering=1, closefd=False)
+
+    risultati = {"print_json_indent": misura(crea_app(con_print), args.richieste, args.threads)}
+
+    import logging
+    from logger import get_logger, CAMPIONA
+    log = get_logger("bench")
+
+    def con_logger(volo):
+        log.info("Richiesta ultimo volo per %s", "LIRF", extra=CAMPIONA)
+        log.debug("Ultimo volo trovato per %s: %s", "LIRF", volo)
+
+    app = crea_app(con_logger)
+    logging.getLogger().setLevel(logging.INFO)
+    risultati["logger_info"] = misura(app, args.richieste, args.threads)
+    logging.getLogger().setLevel(logging.DEBUG)
+    risultati["logger_debug"] = misura(app, args.richieste, args.threads)
+
+    report.write(json.dumps({
+        "richieste": args.richieste,
+        "threads": args.threads,
+        "richieste_al_secondo": {k: round(v, 1) for k, v in risultati.items()},
+        "guadagno_info_vs_print": round(risultati["logger_info"] / risultati["print_json_indent"], 2),
+    }, indent=4) + "\n")
+    report.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import sys
+import time
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "user_manager"))
+import metriche
+
+# Costo della strumentazione di metriche.py: tempo per chiamata di misura()/conta_cache() e differenza
+# per richiesta tra un'app Flask con e senza registra_flask() (test client, nessuna rete).
+# Il costo viene confrontato con --latenza-ms, la latenza tipica di una richiesta del servizio
+# (es. il p50 di benchmark/loadtest.py): l'obiettivo è restare sotto l'1%.
+# Uso: python benchmark/bench_metriche.py --iterazioni 200000 --richieste 20000 --latenza-ms 2
+
+
+def costo_per_chiamata(funzione, iterazioni):
+    inizio = time.perf_counter()
+    for _ in range(iterazioni):
+        funzione()
+    return (time.perf_counter() - inizio) / iterazioni * 1e6
+
+
+def crea_app(strumentata):
+    app = Flask(f"bench_{strumentata}")
+    if strumentata:
+        metriche.registra_flask(app)
+
+    @app.route('/flights/last')
+    def ultimo_volo():
+        return jsonify({"icao24": "abc123", "callsign": "AZ123", "firstSeen": 1700000000}), 200
+
+    return app
+
+
+def costo_richiesta(app, richieste):
+    client = app.test_client()
+    for _ in range(200):
+        client.get('/flights/last')  #riscaldamento
+    inizio = time.perf_counter()
+    for _ in range(richieste):
+        client.get('/flights/last')
+    return (time.perf_counter() - inizio) / richieste * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterazioni", type=int, default=200000)
+    parser.add_argument("--richieste", type=int, default=20000)
+    parser.add_argument("--latenza-ms", type=float, default=2.0, help="latenza tipica di una richiesta del servizio")
+    args = parser.parse_args()
+
+    def vuoto():
+        with metriche.cronometra("bench"):
+            pass
+
+    primitive = {
+        "cronometra_us": costo_per_chiamata(vuoto, args.iterazioni),
+        "conta_cache_us": costo_per_chiamata(lambda: metriche.conta_cache("bench", True), args.iterazioni),
+    }
+
+    senza = costo_richiesta(crea_app(False), args.richieste)
+    con = costo_richiesta(crea_app(True), args.richieste)
+    aggiunto = max(0.0, con - senza)
+
+    report = {k: round(v, 3) for k, v in primitive.items()}
+    report.update({
+        "richiesta_senza_metriche_us": round(senza, 1),
+        "richiesta_con_metriche_us": round(con, 1),
+        "costo_hook_flask_us": round(aggiunto, 1),
+        "overhead_su_latenza_tipica_pct": round(aggiunto / (args.latenza_ms * 1000) * 100, 3),
+        "multiprocesso": bool(os.getenv("PROMETHEUS_MULTIPROC_DIR")),
+    })
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
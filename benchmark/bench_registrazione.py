@@ -0,0 +1,68 @@
+import argparse
+import json
+import statistics
+import time
+import uuid
+from collections import Counter
+from concurrent import futures
+import requests
+
+# Benchmark di POST /users con invii duplicati concorrenti: ogni registrazione viene spedita
+# --retries volte con lo stesso Request-ID (come un client che riprova), e --same-email richieste
+# diverse usano la stessa email. Tutti gli invii partono insieme da --threads thread.
+# Alla fine: registrazioni/s, latenze p50/p99, conteggio degli status e controllo che ogni
+# Request-ID abbia ricevuto sempre la stessa risposta (nessun 500 da unique violation).
+# Uso: python benchmark/bench_registrazione.py --url http://localhost:5000 --users 200 --retries 5 --threads 32
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--users", type=int, default=200, help="registrazioni distinte (Request-ID)")
+    parser.add_argument("--retries", type=int, default=5, help="invii per ogni Request-ID")
+    parser.add_argument("--same-email", type=int, default=2, help="Request-ID diversi per la stessa email")
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    prefisso = uuid.uuid4().hex[:8]
+    invii = []
+    for i in range(args.users):
+        email = f"bench-{prefisso}-{i // args.same_email}@example.com"
+        request_id = f"{prefisso}-{i}"
+        invii += [(request_id, email)] * args.retries
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.threads))
+
+    def invia(invio):
+        request_id, email = invio
+        t = time.perf_counter()
+        r = session.post(f"{args.url}/users", headers={"Request-ID": request_id},
+                         json={"email": email, "password": "bench-password", "nome": "Bench"})
+        return request_id, r.status_code, (time.perf_counter() - t) * 1000
+
+    inizio = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=args.threads) as executor:
+        risultati = list(executor.map(invia, invii))
+    durata = time.perf_counter() - inizio
+
+    tempi = sorted(r[2] for r in risultati)
+    per_richiesta = {}
+    for request_id, status, _ in risultati:
+        per_richiesta.setdefault(request_id, set()).add(status)
+
+    report = {
+        "invii": len(invii),
+        "durata_s": round(durata, 2),
+        "richieste_al_secondo": round(len(invii) / durata, 1),
+        "p50_ms": round(statistics.median(tempi), 2),
+        "p99_ms": round(tempi[int(len(tempi) * 0.99) - 1], 2),
+        "status": dict(Counter(r[1] for r in risultati)),
+        "utenti_creati_attesi": -(-args.users // args.same_email),
+        "request_id_con_risposte_diverse": sum(1 for s in per_richiesta.values() if len(s) > 1),
+    }
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+import httpx
+
+# Carichi scriptati della suite (benchmark/suite.py). Ogni carico manda le sue richieste con
+# 'concorrenza' client asyncio e restituisce throughput, latenze p50/p95/p99 per endpoint e status.
+# contesto = dizionario condiviso tra i carichi (utenti e aeroporti creati dal fan-out, usati dalle letture)
+
+AEROPORTI = ["LIRF", "LIMC", "LIME", "LIPZ", "LICC", "LIRN", "LIPE", "LIBD", "EGLL", "LFPG",
+             "EDDF", "LEMD", "EHAM", "LSZH", "LOWW", "EBBR", "LPPT", "EIDW", "EKCH", "ESSA"]
+
+
+def percentile(tempi, p):
+    return tempi[min(len(tempi) - 1, int(len(tempi) * p))] if tempi else None
+
+
+class Misure:
+    def __init__(self):
+        self.tempi = {}
+        self.status = {}
+        self.errori = Counter()
+
+    def registra(self, nome, status, millisecondi):
+        self.tempi.setdefault(nome, []).append(millisecondi)
+        self.status.setdefault(nome, Counter())[status] += 1
+
+    def riepilogo(self, durata):
+
+        endpoint = {}
+        tutti = []
+        for nome, tempi in sorted(self.tempi.items()):
+            tempi.sort()
+            tutti.extend(tempi)
+            endpoint[nome] = {
+                "richieste": len(tempi),
+                "errori_rete": self.errori.get(nome, 0),
+                "rps": round(len(tempi) / durata, 1),
+                "p50_ms": round(percentile(tempi, 0.50), 2),
+                "p95_ms": round(percentile(tempi, 0.95), 2),
+                "p99_ms": round(percentile(tempi, 0.99), 2),
+                "status": {str(k): v for k, v in sorted(self.status[nome].items())},
+            }
+
+        tutti.sort()
+        return {
+            "richieste": len(tutti),
+            "errori_rete": sum(self.errori.values()),
+            "durata_s": round(durata, 2),
+            "rps": round(len(tutti) / durata, 1) if durata > 0 else 0,
+            "p50_ms": round(percentile(tutti, 0.50), 2) if tutti else None,
+            "p95_ms": round(percentile(tutti, 0.95), 2) if tutti else None,
+            "p99_ms": round(percentile(tutti, 0.99), 2) if tutti else None,
+            "endpoint": endpoint,
+        }
+
+
+async def esegui_richieste(richieste, concorrenza, osserva=None):
+
+    #richieste = iterabile di (nome, metodo, url, opzioni httpx) condiviso tra i client: ognuno prende
+    #la prossima appena ha finito la precedente. osserva(richiesta, risposta) per controlli sul contenuto
+    misure = Misure()
+    sorgente = iter(richieste)
+    limiti = httpx.Limits(max_connections=concorrenza, max_keepalive_connections=concorrenza)
+
+    async with httpx.AsyncClient(limits=limiti, timeout=60) as http:
+
+        async def client():
+            for richiesta in sorgente:
+                nome, metodo, url, opzioni = richiesta
+                t = time.perf_counter()
+                try:
+                    risposta = await http.request(metodo, url, **opzioni)
+                except httpx.HTTPError:
+                    misure.errori[nome] += 1
+                    continue
+                misure.registra(nome, risposta.status_code, (time.perf_counter() - t) * 1000)
+                if osserva is not None:
+                    osserva(richiesta, risposta)
+
+        inizio = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concorrenza)))
+        durata = time.perf_counter() - inizio
+
+    return misure.riepilogo(durata)
+
+
+def utente(prefisso, i):
+    return {"email": f"bench-{prefisso}-{i}@example.com", "password": f"password-{i}", "nome": "Bench", "cognome": "Suite"}
+
+
+async def registrazioni(args, contesto):
+
+    #tempesta di registrazioni: utenti tutti diversi, ognuno con il suo Request-ID
+    prefisso = uuid.uuid4().hex[:8]
+    url = f"{args.user_manager_url}/users"
+    richieste = (
+        ("POST /users", "POST", url, {"json": utente(prefisso, i), "headers": {"Request-ID": f"{prefisso}-{i}"}})
+        for i in range(args.utenti)
+    )
+    return await esegui_richieste(richieste, args.concorrenza)
+
+
+async def retry_duplicati(args, contesto):
+
+    #ogni registrazione arriva --retry volte con lo stesso Request-ID, in ordine casuale e in parallelo:
+    #tutte le copie devono ricevere la stessa risposta e ogni email deve essere creata una sola volta
+    prefisso = uuid.uuid4().hex[:8]
+    url = f"{args.user_manager_url}/users"
+    invii = [i for i in range(args.utenti) for _ in range(args.retry)]
+    random.shuffle(invii)
+    richieste = (
+        ("POST /users (retry)", "POST", url, {"json": utente(prefisso, i), "headers": {"Request-ID": f"{prefisso}-{i}"}})
+        for i in invii
+    )
+
+    risposte = {}
+
+    def osserva(richiesta, risposta):
+        request_id = richiesta[3]["headers"]["Request-ID"]
+        risposte.setdefault(request_id, set()).add((risposta.status_code, risposta.text))
+
+    risultato = await esegui_richieste(richieste, args.concorrenza, osserva)
+    create = sum(1 for varianti in risposte.values() if any(status == 201 for status, _ in varianti))
+    risultato["request_id"] = len(risposte)
+    risultato["request_id_con_risposte_diverse"] = sum(1 for varianti in risposte.values() if len(varianti) > 1)
+    risultato["utenti_creati"] = create
+    return risultato
+
+
+async def fanout_interessi(args, contesto):
+
+    #utenti creati con un solo import massivo (fuori dalla misura), poi ogni utente segue --interessi
+    #aeroporti: ogni POST /interests fa una CheckUser gRPC e mette in coda il download da OpenSky
+    prefisso = uuid.uuid4().hex[:8]
+    utenti = [utente(prefisso, i) for i in range(args.utenti)]
+    corpo = "".join(json.dumps(u) + "\n" for u in utenti)
+    async with httpx.AsyncClient(timeout=300) as http:
+        r = await http.post(f"{args.user_manager_url}/users/bulk", content=corpo.encode(),
+                            headers={"Content-Type": "application/x-ndjson"})
+        r.raise_for_status()
+
+    aeroporti = AEROPORTI[:args.aeroporti]
+    url = f"{args.data_collector_url}/interests"
+    richieste = (
+        ("POST /interests", "POST", url, {"json": {"email": u["email"], "airport": airport}})
+        for u in utenti
+        for airport in random.sample(aeroporti, min(args.interessi, len(aeroporti)))
+    )
+    risultato = await esegui_richieste(richieste, args.concorrenza)
+
+    #tempo perché tutti i download richiesti siano finiti
+    inizio = time.perf_counter()
+    in_sospeso = set(aeroporti)
+    async with httpx.AsyncClient(timeout=30) as http:
+        while in_sospeso and time.perf_counter() - inizio < args.timeout_download:
+            for airport in list(in_sospeso):
+                r = await http.get(f"{args.data_collector_url}/interests/status/{airport}")
+                if r.status_code == 200 and r.json().get("stato") not in ("in_coda", "in_corso"):
+                    in_sospeso.discard(airport)
+            if in_sospeso:
+                await asyncio.sleep(0.2)
+    risultato["download_completati_in_s"] = round(time.perf_counter() - inizio, 2)
+    risultato["aeroporti_non_completati"] = sorted(in_sospeso)
+
+    contesto["utenti"] = [u["email"] for u in utenti]
+    contesto["aeroporti"] = aeroporti
+    return risultato
+
+
+async def letture_voli(args, contesto):
+
+    #letture miste su /flights/* per --durata secondi sugli aeroporti e gli utenti del fan-out
+    aeroporti = contesto.get("aeroporti") or AEROPORTI[:args.aeroporti]
+    utenti = contesto.get("utenti") or []
+    base = args.data_collector_url
+    scelte = [
+        lambda: ("GET /flights/last", "GET", f"{base}/flights/last", {"params": {"airport": random.choice(aeroporti)}}),
+        lambda: ("GET /flights/average", "GET", f"{base}/flights/average",
+                 {"params": {"airport": random.choice(aeroporti), "days": random.choice([1, 7, 30])}}),
+        lambda: ("GET /flights/daily", "GET", f"{base}/flights/daily", {"params": {"airport": random.choice(aeroporti), "days": 7}}),
+    ]
+    if utenti:
+        scelte.append(lambda: ("GET /flights/my-interests", "GET", f"{base}/flights/my-interests",
+                               {"params": {"email": random.choice(utenti), "limit": 100}}))
+
+    def richieste():
+        scadenza = time.monotonic() + args.durata
+        while time.monotonic() < scadenza:
+            yield random.choice(scelte)()
+
+    return await esegui_richieste(richieste(), args.concorrenza)
+
+
+#ordine di esecuzione: le letture usano utenti e aeroporti creati dal fan-out
+CARICHI = {
+    "registrazioni": registrazioni,
+    "retry_duplicati": retry_duplicati,
+    "fanout_interessi": fanout_interessi,
+    "letture_voli": letture_voli,
+}
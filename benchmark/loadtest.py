@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import httpx
+
+# Carico HTTP sulle letture del Data Collector, per confrontare la versione a thread (app.py)
+# con quella asyncio (app_async.py) sugli stessi dati: N client concorrenti per D secondi,
+# poi richieste al secondo e latenze p50/p99 per endpoint.
+# Uso: python benchmark/loadtest.py --url http://localhost:5001 --concurrency 200 --duration 30 \
+#          --airports LIRF,LIMC --email mario@example.com
+
+
+def percentile(tempi, p):
+    return tempi[min(len(tempi) - 1, int(len(tempi) * p))]
+
+
+async def client(http, base_url, richieste, scadenza, tempi, errori):
+    while time.monotonic() < scadenza:
+        nome, path, params = random.choice(richieste)
+        t = time.perf_counter()
+        try:
+            r = await http.get(base_url + path, params=params)
+            if r.status_code >= 500:
+                errori[nome] = errori.get(nome, 0) + 1
+        except httpx.HTTPError:
+            errori[nome] = errori.get(nome, 0) + 1
+            continue
+        tempi.setdefault(nome, []).append((time.perf_counter() - t) * 1000)
+
+
+async def esegui(args):
+    aeroporti = args.airports.split(",")
+    richieste = []
+    for airport in aeroporti:
+        richieste.append(("/flights/last", "/flights/last", {"airport": airport}))
+        richieste.append(("/flights/average", "/flights/average", {"airport": airport, "days": 7}))
+    if args.email:
+        richieste.append(("/flights/my-interests", "/flights/my-interests", {"email": args.email, "limit": 100}))
+
+    tempi, errori = {}, {}
+    limiti = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limiti, timeout=30) as http:
+        inizio = time.monotonic()
+        scadenza = inizio + args.duration
+        await asyncio.gather(*(client(http, args.url, richieste, scadenza, tempi, errori) for _ in range(args.concurrency)))
+        durata = time.monotonic() - inizio
+
+    risultato = {"url": args.url, "concurrency": args.concurrency, "durata_s": round(durata, 2), "endpoint": {}}
+    totale = 0
+    for nome, lista in sorted(tempi.items()):
+        lista.sort()
+        totale += len(lista)
+        risultato["endpoint"][nome] = {
+            "richieste": len(lista),
+            "errori": errori.get(nome, 0),
+            "rps": round(len(lista) / durata, 1),
+            "p50_ms": round(statistics.median(lista), 2),
+            "p99_ms": round(percentile(lista, 0.99), 2),
+        }
+    risultato["rps_totali"] = round(totale / durata, 1)
+    return risultato
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--concurrency", type=int, default=100, help="client concorrenti")
+    parser.add_argument("--duration", type=int, default=30, help="secondi di carico")
+    parser.add_argument("--airports", default="LIRF")
+    parser.add_argument("--email", default="", help="utente per /flights/my-interests (opzionale)")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(esegui(args)), indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Stub locale di OpenSky per i benchmark: risponde a GET /api/flights/departure con voli generati
+# (stessi campi dell'API vera) e a POST /auth con un token finto, così il Data Collector scarica
+# senza rete e senza rate limit esterni. Conta le richieste ricevute per verificare la coalescenza.
+# Da solo: python -m benchmark.opensky_stub --porta 8090
+
+
+class ServerStub(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  #con il valore di default (5) le connessioni in più aspettano il retry del SYN
+
+
+class OpenSkyStub:
+    def __init__(self, host="127.0.0.1", porta=0, voli_per_richiesta=50, latenza_ms=0):
+
+        self.voli_per_richiesta = voli_per_richiesta
+        self.latenza = latenza_ms / 1000
+        self.lock = threading.Lock()
+        self.richieste = {"departure": 0, "auth": 0}
+
+        stub = self
+
+        class Gestore(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  #keep-alive, come l'API vera
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path.endswith("/flights/departure"):
+                    stub._conta("departure")
+                    parametri = {k: v[0] for k, v in parse_qs(url.query).items()}
+                    return self._rispondi(200, stub.genera_voli(parametri))
+                self._rispondi(404, {"errore": "non trovato"})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if urlsplit(self.path).path.endswith("/auth"):
+                    stub._conta("auth")
+                    return self._rispondi(200, {"access_token": "token-benchmark", "expires_in": 1800})
+                self._rispondi(404, {"errore": "non trovato"})
+
+            def _rispondi(self, status, corpo):
+                if stub.latenza:
+                    time.sleep(stub.latenza)
+                dati = json.dumps(corpo).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dati)))
+                self.end_headers()
+                self.wfile.write(dati)
+
+            def log_message(self, *args):
+                pass  #niente righe su stderr per ogni richiesta
+
+        self.server = ServerStub((host, porta), Gestore)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, porta = self.server.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def _conta(self, tipo):
+        with self.lock:
+            self.richieste[tipo] += 1
+
+    def genera_voli(self, parametri):
+
+        #voli con firstSeen nella finestra richiesta: finestre diverse danno voli diversi
+        airport = parametri.get("airport", "LIRF")
+        fine = int(parametri.get("end") or time.time())
+        inizio = int(parametri.get("begin") or fine - 3600)
+        casuale = random.Random(f"{airport}:{inizio}:{fine}")
+        voli = []
+        for _ in range(self.voli_per_richiesta):
+            first_seen = casuale.randint(inizio, max(inizio, fine))
+            voli.append({
+                "icao24": f"{casuale.getrandbits(24):06x}",
+                "firstSeen": first_seen,
+                "estDepartureAirport": airport,
+                "lastSeen": first_seen + casuale.randint(1800, 36000),
+                "estArrivalAirport": casuale.choice(["LIRF", "LIMC", "EGLL", "LFPG", "EDDF", "LEMD"]),
+                "callsign": f"BENCH{casuale.randint(100, 999)}",
+            })
+        return voli
+
+    def avvia(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="opensky-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.richieste)
+
+    def ferma(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--porta", type=int, default=8090)
+    parser.add_argument("--voli", type=int, default=50, help="voli restituiti per ogni richiesta")
+    parser.add_argument("--latenza-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    stub = OpenSkyStub(porta=args.porta, voli_per_richiesta=args.voli, latenza_ms=args.latenza_ms)
+    print(f"Stub OpenSky su {stub.url} (OPENSKY_API_URL={stub.url}/api OPENSKY_AUTH_URL={stub.url}/auth)")
+    stub.server.serve_forever()
@@ -0,0 +1,180 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import httpx
+
+# Avvio dei due microservizi per i benchmark, come processi figli puntati a Postgres/Mongo locali
+# e allo stub di OpenSky, e misura della memoria (RSS) di ogni servizio con tutti i suoi processi
+# (worker gunicorn, processi gRPC, pool di hashing), letta da /proc.
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def processi_del_servizio(pid):
+
+    #pid e tutti i suoi discendenti (ricavati dal ppid di /proc/<pid>/stat)
+    figli = {}
+    for voce in os.listdir("/proc"):
+        if not voce.isdigit():
+            continue
+        try:
+            with open(f"/proc/{voce}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        figli.setdefault(ppid, []).append(int(voce))
+
+    albero, da_visitare = [], [pid]
+    while da_visitare:
+        corrente = da_visitare.pop()
+        albero.append(corrente)
+        da_visitare.extend(figli.get(corrente, []))
+    return albero
+
+
+def rss_mb(pid):
+    totale_kb = 0
+    for processo in processi_del_servizio(pid):
+        try:
+            with open(f"/proc/{processo}/status") as f:
+                for riga in f:
+                    if riga.startswith("VmRSS:"):
+                        totale_kb += int(riga.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(totale_kb / 1024, 1)
+
+
+class Servizio:
+    def __init__(self, nome, cartella, url, indirizzo_grpc, env, produzione=False, log_dir=None):
+
+        self.nome = nome
+        self.cartella = os.path.join(RADICE, cartella)
+        self.url = url
+        self.indirizzo_grpc = indirizzo_grpc
+        self.env = env
+        #sviluppo = "python app.py" (un processo), produzione = "python server.py" (gunicorn + processi gRPC)
+        self.script = "server.py" if produzione else "app.py"
+        self.log_dir = log_dir
+        self.processo = None
+
+    def avvia(self, timeout=90):
+        uscita = subprocess.DEVNULL
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+            uscita = open(os.path.join(self.log_dir, f"{self.nome}.log"), "w")
+
+        #nuova sessione: alla fine si termina tutto il gruppo (anche worker e processi gRPC)
+        self.processo = subprocess.Popen(
+            [sys.executable, self.script], cwd=self.cartella, env=dict(os.environ, **self.env),
+            stdout=uscita, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+        self.attendi_pronto(timeout)
+        return self
+
+    def attendi_pronto(self, timeout):
+
+        #pronto = /stats risponde e il server gRPC accetta connessioni
+        import grpc
+        scadenza = time.monotonic() + timeout
+        while time.monotonic() < scadenza:
+            if self.processo is not None and self.processo.poll() is not None:
+                raise RuntimeError(f"{self.nome} è terminato all'avvio (codice {self.processo.returncode})")
+            try:
+                if httpx.get(f"{self.url}/stats", timeout=5).status_code == 200:
+                    canale = grpc.insecure_channel(self.indirizzo_grpc)
+                    try:
+                        grpc.channel_ready_future(canale).result(timeout=max(1, scadenza - time.monotonic()))
+                    finally:
+                        canale.close()
+                    return
+            except (httpx.HTTPError, grpc.FutureTimeoutError):
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"{self.nome} non è pronto dopo {timeout} secondi")
+
+    def memoria_mb(self):
+        return rss_mb(self.processo.pid) if self.processo is not None else None
+
+    def ferma(self):
+        if self.processo is None or self.processo.poll() is not None:
+            return
+        try:
+            os.killpg(self.processo.pid, signal.SIGTERM)
+            self.processo.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.processo.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def crea_servizi(args, url_stub):
+
+    #configurazione comune: gRPC su localhost, OpenSky sullo stub senza rate limit, log solo per gli errori
+    comune = {
+        "LOG_LEVEL": args.log_level,
+        "HTTP_WORKERS": str(args.http_workers),
+        "PYTHONUNBUFFERED": "1",
+    }
+    user_manager = Servizio("user_manager", "user_manager", args.user_manager_url, "localhost:50051", dict(comune, **{
+        "DATABASE_URL": args.database_url,
+        "DATA_COLLECTOR_GRPC": "localhost:50052",
+        "HASH_SCRYPT_N": str(args.hash_n),
+        "GRPC_PROCESSES": "2",
+    }), produzione=args.produzione, log_dir=args.log_dir)
+    data_collector = Servizio("data_collector", "data_collector", args.data_collector_url, "localhost:50052", dict(comune, **{
+        "MONGO_URL": args.mongo_url,
+        "USER_MANAGER_GRPC": "localhost:50051",
+        "OPENSKY_API_URL": f"{url_stub}/api",
+        "OPENSKY_AUTH_URL": f"{url_stub}/auth",
+        "OPENSKY_CLIENT_ID": "benchmark",
+        "OPENSKY_CLIENT_SECRET": "benchmark",
+        "OPENSKY_RATE_LIMIT": "1000",
+        "OPENSKY_RATE_BURST": "100",
+        "GRPC_PROCESSES": "1",
+    }), produzione=args.produzione, log_dir=args.log_dir)
+    return user_manager, data_collector
+
+
+class CampionatoreMemoria:
+    def __init__(self, servizi, intervallo=0.25):
+
+        #RSS di ogni servizio letto ogni 'intervallo' secondi mentre gira un carico
+        self.servizi = servizi
+        self.intervallo = intervallo
+        self.massimi = {}
+        self.fermo = threading.Event()
+        self.thread = None
+
+    def _campiona(self):
+        for servizio in self.servizi:
+            valore = servizio.memoria_mb()
+            if valore is not None:
+                self.massimi[servizio.nome] = max(self.massimi.get(servizio.nome, 0), valore)
+
+    def _loop(self):
+        while not self.fermo.wait(self.intervallo):
+            self._campiona()
+
+    def __enter__(self):
+        self._campiona()
+        self.iniziali = dict(self.massimi)
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *eccezione):
+        self.fermo.set()
+        self.thread.join()
+        return False
+
+    def risultato(self):
+        finali = {s.nome: s.memoria_mb() for s in self.servizi}
+        return {
+            nome: {"rss_inizio_mb": self.iniziali.get(nome), "rss_max_mb": massimo, "rss_fine_mb": finali.get(nome)}
+            for nome, massimo in self.massimi.items()
+        }
@@ -2,143 +2,178 @@ import os
 import uuid
 import time
 import threading
-import requests
 import grpc
 import json
-from flask import Flask, request, jsonify
+import re
+from flask import Flask, request, jsonify, Response, stream_with_context
 import user_pb2
 import user_pb2_grpc
 from concurrent import futures
 from database_mongo import mongo_db
-
+from grpc_channels import channel_registry, opzioni_server, GRPC_TIMEOUT
+from fetcher import FetcherConcorrente
+from coda_fetch import CodaFetch
+from elezione import Lease
+from opensky_auth import token_provider
+from http_client import http_session, tempi_richieste
+from voli import calcola_finestra, chiavi_sovrapposizione, deduplica_voli, volo_mock, decodifica_cursore, codifica_cursore, cancellazioni_richieste
+from metriche import registra_flask, InterceptorMetriche, tempo_ciclo, DURATA_OPENSKY, FALLBACK_MOCK
+from logger import get_logger, CAMPIONA
+
+log = get_logger("data_collector.app")
 app = Flask(__name__)
+#latenze per route e /metrics
+registra_flask(app)
 
 USER_MANAGER_ADDRESS = os.getenv("USER_MANAGER_GRPC", "localhost:50051")
 MY_CLIENT_ID = "data_collector_service"
-OPENSKY_CLIENT_ID = os.getenv("OPENSKY_CLIENT_ID")
-OPENSKY_CLIENT_SECRET = os.getenv("OPENSKY_CLIENT_SECRET")
-AUTH_URL = "https://auth.opensky-network.org/auth/realms/opensky-network/protocol/openid-connect/token"
+OPENSKY_API_URL = os.getenv("OPENSKY_API_URL", "https://opensky-network.org/api")  #sovrascrivibile per puntare a uno stub locale
+PAGINA_DEFAULT = 100                         #voli per pagina in /flights/my-interests
+PAGINA_MASSIMA = 1000
+GIORNI_MASSIMI = 1000                        #giorni massimi di /flights/daily (come limit in /flights/my-interests)
+CAMPO_VALIDO = re.compile(r"^[A-Za-z0-9_]+$")  #nomi di campo ammessi nella proiezione
+INTERVALLO_MONITORAGGIO = int(os.getenv("INTERVALLO_MONITORAGGIO", "600"))  #secondi tra un ciclo e l'altro
+INTERVALLO_COMPATTAZIONE = int(os.getenv("INTERVALLO_COMPATTAZIONE", "3600"))
 
 
 # server gRPC che diventa il DATA-COLLECTOR in caso di eliminazione degli utenti con interessi
 class DataCollectorGRPC(user_pb2_grpc.DataCollectorServicer):
     def DeleteData(self, request, context):
         email = request.email
-        print(f"Richiesta cancellazione dati per: {email}")
+        log.info("Richiesta cancellazione dati per: %s", email, extra=CAMPIONA)
 
         count = mongo_db.rimuovi_interessi_utente(email)
 
         return user_pb2.DeleteDataResponse(success=True)
 
+    def DeleteDataBatch(self, request, context):
+        cancellazioni = cancellazioni_richieste(request)
+        log.info("Richiesta cancellazione dati per %d utenti", len(cancellazioni))
+
+        count = mongo_db.rimuovi_interessi_utenti(cancellazioni)
+
+        return user_pb2.DeleteDataBatchResponse(success=True, deleted_count=count)
 
-def start_grpc_server():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+
+def start_grpc_server(max_workers=10):
+    # SO_REUSEPORT: più processi (server.py) possono ascoltare sulla stessa porta, il kernel distribuisce le connessioni
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers), options=opzioni_server(),
+                         interceptors=[InterceptorMetriche()])
     user_pb2_grpc.add_DataCollectorServicer_to_server(DataCollectorGRPC(), server)
 
     # Usiamo una porta diversa dallo User Manager usando la 50052
     port = 50052
     server.add_insecure_port(f'[::]:{port}')
-    print(f"Data Collector gRPC Server attivo sulla porta {port}")
+    log.info("Data Collector gRPC Server attivo sulla porta %d", port)
     server.start()
     server.wait_for_termination()
 
 
-def get_opensky_token():
-    if not OPENSKY_CLIENT_ID or not OPENSKY_CLIENT_SECRET:
-        print(" Client ID o Secret mancanti.")
-        return None
-
-    payload = {
-        "grant_type": "client_credentials",
-        "client_id": OPENSKY_CLIENT_ID,
-        "client_secret": OPENSKY_CLIENT_SECRET
-    }
-
-    try:
-        # Facciamo una POST all'URL di autenticazione di OPENSKY
-        r = requests.post(AUTH_URL, data=payload, timeout=5)
-        if r.status_code == 200:
-            token = r.json().get("access_token")
-            return token
-        else:
-            print(f"[OpenSky Auth Error] Status {r.status_code}: {r.text}")
-            return None
-    except Exception as e:
-        print(f"[OpenSky Auth Exception] {e}")
-        return None
-
-
 def fetch_opensky_data(airport):
     ora_fine = int(time.time())
-    # Cerchiamo nelle ultime 24 ore (7200 modificato a 86400 se vuoi 24h reali, qui ho lasciato il tuo 7200)
-    # Nota: 7200 secondi sono 2 ore. Se vuoi 24 ore metti 86400.
-    ora_inizio = ora_fine - 7200
+    # dopo la prima richiesta si scarica solo la finestra nuova (vedi voli.calcola_finestra)
+    ora_inizio, chiavi_note = calcola_finestra(mongo_db.get_stato_fetch(airport), ora_fine)
 
-    url = "https://opensky-network.org/api/flights/departure"
+    url = f"{OPENSKY_API_URL}/flights/departure"
     params = {'airport': airport, 'begin': ora_inizio, 'end': ora_fine}
-    token = get_opensky_token()
+    #token condiviso e in cache: la POST di autenticazione si fa solo quando sta per scadere
+    token = token_provider.get_token()
     headers = {}
     if token:
         headers["Authorization"] = f"Bearer {token}"
-        print(f"Token ottenuto, eseguo richiesta autenticata per {airport}...")
+        log.debug("Token ottenuto, eseguo richiesta autenticata per %s...", airport)
     else:
-        print(f"Token non disponibile, eseguo richiesta anonima per {airport}...")
+        log.debug("Token non disponibile, eseguo richiesta anonima per %s...", airport)
 
+    inizio = time.perf_counter()
     try:
-        # Passiamo 'headers' invece di 'auth'
-        r = requests.get(url, params=params, headers=headers, timeout=10)
+        # Passiamo 'headers' invece di 'auth'; la sessione riusa le connessioni già aperte
+        r = http_session.get(url, params=params, headers=headers, timeout=10)
 
         if r.status_code == 200:
-            dati = r.json()
+            dati = r.json() or []
+            DURATA_OPENSKY.labels(esito="ok" if dati else "vuoto").observe(time.perf_counter() - inizio)
+            nuovi = deduplica_voli(dati, chiavi_note)
             if dati:
-                return dati
+                log.info("%s: %d voli ricevuti, %d nuovi (finestra %d-%d)", airport, len(dati), len(nuovi), ora_inizio, ora_fine)
             else:
-                print(f"Nessun volo trovato per {airport} nel periodo richiesto.")
-        else:
-            print(f"Status {r.status_code}: {r.text}")
+                log.info("Nessun volo trovato per %s nel periodo richiesto.", airport)
+
+            #fin dove è arrivata questa finestra e quali voli cadono nella sovrapposizione con la prossima:
+            #si registra in salva_download, solo dopo che i voli sono stati salvati
+            return nuovi, (ora_fine, chiavi_sovrapposizione(dati, ora_fine))
+
+        esito = "errore_http"
+        log.warning("OpenSky ha risposto %d per %s: %s", r.status_code, airport, r.text)
 
     except Exception as e:
-        print(f"[OpenSky Exception] {e}")
-
-    # solo per scopi dimostrativi
-    print(f"Generazione dati MOCK per {airport}")
-    mock_flight = [{
-        "icao24": "mock_id",
-        "firstSeen": int(time.time()) - 1000,
-        "estDepartureAirport": airport,
-        "lastSeen": int(time.time()),
-        "estArrivalAirport": "LIRF",
-        "callsign": f"TEST_{airport}",
-        "estDepartureAirportHorizDistance": 0,
-        "estDepartureAirportVertDistance": 0,
-        "estArrivalAirportHorizDistance": 0,
-        "estArrivalAirportVertDistance": 0,
-        "departureAirportCandidatesCount": 0,
-        "arrivalAirportCandidatesCount": 0
-    }]
-    return mock_flight
+        esito = "eccezione"
+        log.warning("Errore nella richiesta a OpenSky per %s: %s", airport, e)
+
+    DURATA_OPENSKY.labels(esito=esito).observe(time.perf_counter() - inizio)
+    FALLBACK_MOCK.inc()
+
+    # solo per scopi dimostrativi; la finestra non avanza, al prossimo giro si riscarica
+    log.info("Generazione dati MOCK per %s", airport)
+    return volo_mock(airport), None
+
+
+def salva_download(airport, voli, finestra):
+    mongo_db.salva_voli(airport, voli)
+    #l'high-water mark avanza solo a salvataggio riuscito: se salva_voli fallisce (o il processo muore)
+    #la stessa finestra viene scaricata di nuovo
+    if finestra is not None:
+        mongo_db.aggiorna_stato_fetch(airport, *finestra)
+
+
+#un solo fetcher (pool e rate limit verso OpenSky) per il monitoraggio ciclico e per la coda dei download immediati
+fetcher = FetcherConcorrente(fetch_opensky_data, salva_download)
+coda_fetch = CodaFetch(fetcher.scarica_e_salva, mongo_db.get_ultimo_aggiornamento)
+#con più worker (server.py) monitoraggio e compattazione girano solo nel processo che tiene il lease
+lease_monitoraggio = Lease(lambda: mongo_db.db, "monitoraggio")
 
 
 # task in background
 def monitoraggio_ciclico():
-    print("Avvio Thread Monitoraggio Ciclico...")
+    log.info("Avvio Thread Monitoraggio Ciclico...")
     while True:
         try:
+            if not lease_monitoraggio.e_leader():
+                time.sleep(lease_monitoraggio.ttl / 3)
+                continue
+
+            durata = 0
             aeroporti = mongo_db.get_tutti_aeroporti_monitorati()
             if aeroporti:
-                print(f"Aggiornamento per: {aeroporti}")
-                for airport in aeroporti:
-                    voli = fetch_opensky_data(airport)
-                    mongo_db.salva_voli(airport, voli)
-                    print(f"Dati aggiornati per {airport}")
-
-            # Attesa ciclo (es. 10 minuti)
-            time.sleep(600)
+                log.info("Aggiornamento per: %s", aeroporti)
+                #gli aeroporti vengono scaricati in parallelo e salvati appena pronti
+                with tempo_ciclo("monitoraggio"):
+                    durata = fetcher.esegui_ciclo(aeroporti)
+
+            # Attesa ciclo (es. 10 minuti), togliendo il tempo già speso nel download
+            time.sleep(max(0, INTERVALLO_MONITORAGGIO - durata))
         except Exception as e:
-            print(f"[BACKGROUND ERROR] {e}")
+            log.exception("Errore nel monitoraggio ciclico: %s", e)
             time.sleep(60)
 
 
+# compattazione periodica dei dati vecchi (retention)
+def compattazione_ciclica():
+    log.info("Avvio Thread Compattazione...")
+    while True:
+        if not lease_monitoraggio.e_leader():
+            time.sleep(lease_monitoraggio.ttl / 3)
+            continue
+        try:
+            with tempo_ciclo("compattazione"):
+                mongo_db.compatta_dati_vecchi()
+            #aggiorna anche le metriche sulle dimensioni delle collection
+            mongo_db.get_statistiche_storage()
+        except Exception as e:
+            log.exception("Errore nella compattazione: %s", e)
+        time.sleep(INTERVALLO_COMPATTAZIONE)
+
+
 # API REST
 @app.route('/interests', methods=['POST'])
 def add_interest():
@@ -152,43 +187,23 @@ def add_interest():
     # 1. Verifica Utente via gRPC
     messaggio_univoco = str(uuid.uuid4())
     try:
-        #Configuro il canale per riprovare se il server è giù
-        service_config = {
-            "methodConfig": [
-                {
-                    "name": [{"service": "UserManager"}],
-                    "timeout": "5s",                            #timeout totale
-                    "retryPolicy": {
-                        "maxAttempts": 5,                       #Riprovare massimo 5 volte
-                        "initialBackoff": "0.5s",               #Aspetta 0.5s al primo errore
-                        "maxBackoff": "2s",                     #massima attesa
-                        "backoffMultiplier": 2,                 #Raddoppia l'attesa ogni volta
-                        "retryableStatusCodes": ["UNAVAILABLE"] #Riprova solo se il server è irraggiungibile
-                    }
-                }
-            ]
-        }
-
-        options = [('grpc.service_config', json.dumps(service_config))] #mettere json.dumps se no da errore
-
-
-        with grpc.insecure_channel(USER_MANAGER_ADDRESS, options=options) as channel:
-            stub = user_pb2_grpc.UserManagerStub(channel)
-
-            grpc_req = user_pb2.CheckUserRequest(
-                client_id=MY_CLIENT_ID,
-                message_id=messaggio_univoco,
-                email=email
-            )
-
-            risposta = stub.CheckUser(grpc_req)
-
-            if not risposta.exists:
-                return jsonify({"errore": "Utente non registrato"}), 404
+        #il canale verso lo User Manager viene creato una volta sola e riusato da tutte le richieste
+        stub = channel_registry.get_stub(USER_MANAGER_ADDRESS, user_pb2_grpc.UserManagerStub, "UserManager")
+
+        grpc_req = user_pb2.CheckUserRequest(
+            client_id=MY_CLIENT_ID,
+            message_id=messaggio_univoco,
+            email=email
+        )
+
+        risposta = stub.CheckUser(grpc_req, timeout=GRPC_TIMEOUT)
+
+        if not risposta.exists:
+            return jsonify({"errore": "Utente non registrato"}), 404
 
     except grpc.RpcError as e:
 
-        print(f"Errore gRPC reale: {e}")
+        log.warning("Errore gRPC reale: %s", e)
 
         if e.code() == grpc.StatusCode.UNAVAILABLE:
             return jsonify({"errore": "User Manager non raggiungibile"}), 503
@@ -198,12 +213,28 @@ def add_interest():
     # 2. Aggiunge l'interesse nel Data DB
     mongo_db.aggiungi_interesse(email, airport)
 
-    # 3. Download IMMEDIATO
-    print(f"Download immediato dati per {airport}...")
-    voli = fetch_opensky_data(airport)
-    mongo_db.salva_voli(airport, voli)
+    # 3. Download dei dati iniziali in coda: si risponde subito, lo stato si legge dall'URL restituito
+    stato = coda_fetch.richiedi(airport)
+    log.info("Download dati per %s: %s", airport, stato['stato'], extra=CAMPIONA)
+
+    return jsonify({
+        "messaggio": f"Interesse aggiunto per {airport}, dati iniziali in aggiornamento",
+        "download": stato,
+        "status_url": f"/interests/status/{airport}"
+    }), 202
 
-    return jsonify({"messaggio": f"Interesse aggiunto e dati iniziali recuperati per {airport}"}), 200
+
+@app.route('/interests/status/<airport>', methods=['GET'])
+def get_interest_status(airport):
+    stato = coda_fetch.get_stato(airport)
+    if stato is None:
+        #con più worker la richiesta può arrivare a un processo diverso da quello che ha in coda il download
+        ultimo = mongo_db.get_ultimo_aggiornamento(airport)
+        if ultimo is None:
+            return jsonify({"errore": f"Nessun download richiesto per {airport}"}), 404
+        stato = {"airport": airport, "stato": "gia_aggiornato", "aggiornato_alle": ultimo}
+
+    return jsonify(stato), 200
 
 
 @app.route('/interests', methods=['DELETE'])
@@ -227,9 +258,8 @@ def get_last_flight():
     if volo:
         if '_id' in volo: del volo['_id']
 
-        print(f"\n Ultimo volo trovato per {airport}:")
-        print(json.dumps(volo, indent=4))
-        print("-" * 30)
+        #il dump del volo viene formattato solo con LOG_LEVEL=DEBUG, e comunque fuori dal thread della richiesta
+        log.debug("Ultimo volo trovato per %s: %s", airport, volo)
 
         return jsonify(volo), 200
 
@@ -257,13 +287,53 @@ def get_average_flights():
         "average_flights": media
     }
 
-    print(f"Calcolo Media:")
-    print(json.dumps(response_data, indent=4))
-    print("-" * 30)
+    log.debug("Calcolo Media: %s", response_data)
 
     return jsonify(response_data), 200
 
 
+@app.route('/flights/daily', methods=['GET'])
+def get_daily_flights():
+    airport = request.args.get('airport')
+    days = request.args.get('days', '7')
+
+    if not airport:
+        return jsonify({"errore": "Airport mancante"}), 400
+
+    try:
+        days = int(days)
+    except ValueError:
+        return jsonify({"errore": "Days deve essere un numero"}), 400
+
+    #un elemento per giorno nella risposta: il numero di giorni va limitato
+    days = min(days, GIORNI_MASSIMI)
+
+    # un documento di rollup per giorno: i giorni senza voli valgono 0
+    oggi = time.time()
+    giorni = [time.strftime("%Y-%m-%d", time.gmtime(oggi - i * 86400)) for i in range(days - 1, -1, -1)]
+    conteggi = mongo_db.get_conteggi_giornalieri(airport, giorni[0], giorni[-1]) if giorni else {}
+
+    return jsonify({
+        "airport": airport,
+        "days": days,
+        "daily_flights": [{"day": g, "count": conteggi.get(g, 0)} for g in giorni]
+    }), 200
+
+
+def leggi_intero(nome):
+    #parametro intero opzionale della query string (ValueError se non è un numero)
+    valore = request.args.get(nome)
+    return int(valore) if valore not in (None, "") else None
+
+
+def pulisci_volo(volo, campi):
+    #toglie i campi interni usati solo per la paginazione
+    volo.pop('_id', None)
+    if campi and 'firstSeen' not in campi:
+        volo.pop('firstSeen', None)
+    return volo
+
+
 @app.route('/flights/my-interests', methods=['GET'])
 def get_my_interest_flights():
     email = request.args.get('email')
@@ -271,27 +341,96 @@ def get_my_interest_flights():
     if not email:
         return jsonify({"errore": "Parametro email obbligatorio"}), 400
 
-    voli = mongo_db.get_voli_di_interesse_utente(email)
+    formato = request.args.get('format', 'json')
+    campi = [c for c in request.args.get('fields', '').split(',') if c]
+    if any(not CAMPO_VALIDO.match(c) for c in campi):
+        return jsonify({"errore": "Campi non validi"}), 400
+
+    try:
+        limite = leggi_intero('limit')
+        inizio = leggi_intero('from')
+        fine = leggi_intero('to')
+        dopo = decodifica_cursore(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({"errore": "Parametri limit/from/to/cursor non validi"}), 400
+
+    if limite is not None and limite < 1:
+        return jsonify({"errore": "limit deve essere positivo"}), 400
+
+    if formato == 'ndjson':
+        # streaming: un volo per riga letto direttamente dal cursore Mongo, memoria costante
+        cursore = mongo_db.get_voli_di_interesse_utente(email, limite, dopo, campi, inizio, fine)
+
+        def genera():
+            for volo in cursore:
+                yield json.dumps(pulisci_volo(volo, campi), default=str) + "\n"
+
+        log.info("Recupero interessi per %s in streaming", email, extra=CAMPIONA)
+        return Response(stream_with_context(genera()), mimetype='application/x-ndjson'), 200
+
+    limite = min(limite or PAGINA_DEFAULT, PAGINA_MASSIMA)
+
+    # chiedo un volo in più per sapere se esiste una pagina successiva
+    voli = list(mongo_db.get_voli_di_interesse_utente(email, limite + 1, dopo, campi, inizio, fine))
+    next_cursor = None
+    if len(voli) > limite:
+        voli = voli[:limite]
+        next_cursor = codifica_cursore(voli[-1])
 
     response_data = {
         "user": email,
-        "total_flights_found": len(voli),
-        "flights": voli
+        "count": len(voli),
+        "flights": [pulisci_volo(v, campi) for v in voli],
+        "next_cursor": next_cursor
     }
+    # totale dei voli trovati solo sulla prima pagina: il conteggio scorre tutto l'intervallo dell'indice
+    # e ripeterlo a ogni pagina renderebbe di nuovo lineare il costo della paginazione per chiave
+    if dopo is None:
+        response_data["total_flights_found"] = mongo_db.conta_voli_di_interesse_utente(email, inizio, fine)
 
-    print(f"Recupero interessi per {email}:")
-    print(json.dumps(response_data, indent=4))
-    print("-" * 30)
+    log.info("Recupero interessi per %s: %d voli restituiti", email, len(voli), extra=CAMPIONA)
 
     return jsonify(response_data), 200
 
 
-if __name__ == '__main__':
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    #tempi delle chiamate HTTP verso OpenSky, coda dei download, dimensioni delle collection e compattazione
+    return jsonify({
+        "http": tempi_richieste.get_stats(),
+        "coda_fetch": coda_fetch.get_stats(),
+        "storage": mongo_db.get_statistiche_storage()
+    }), 200
+
+
+@app.route('/diagnostics/indexes', methods=['GET'])
+def get_diagnostics_indexes():
+    #explain() delle query calde: mostra se usano gli indici e quanti documenti esaminano
+    airport = request.args.get('airport', 'LIRF')
+    email = request.args.get('email', '')
+
+    return jsonify(mongo_db.diagnostica_query(airport, email)), 200
+
+
+def avvia_thread_background():
+
+    #thread di ogni processo che serve le API REST (qui sotto o in ogni worker di server.py)
+    token_provider.avvia_refresh_automatico()
+    coda_fetch.avvia()
+    lease_monitoraggio.avvia()
+
     bg_thread = threading.Thread(target=monitoraggio_ciclico, daemon=True)
     bg_thread.start()
 
+    compattazione_thread = threading.Thread(target=compattazione_ciclica, daemon=True)
+    compattazione_thread.start()
+
+
+if __name__ == '__main__':
+    avvia_thread_background()
+
     grpc_thread = threading.Thread(target=start_grpc_server, daemon=True)
     grpc_thread.start()
 
-    print("Data Collector attivo sulla porta 5001 per FLASK e 5002 per il canale grpc")
+    log.info("Data Collector attivo sulla porta 5001 per FLASK e 5002 per il canale grpc")
     app.run(host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
@@ -0,0 +1,427 @@
+import asyncio
+import os
+import uuid
+import time
+import grpc
+import json
+import re
+from quart import Quart, request, jsonify, Response
+import user_pb2
+import user_pb2_grpc
+from database_mongo_async import mongo_db_async
+from grpc_channels import opzioni_canale, opzioni_server, GRPC_TIMEOUT
+from fetcher import FETCH_CONCURRENCY
+from coda_fetch import FRESCHEZZA_FETCH
+from opensky_async import AsyncHttpClient, AsyncTokenProvider, AsyncRateLimiter
+from voli import calcola_finestra, chiavi_sovrapposizione, deduplica_voli, volo_mock, decodifica_cursore, codifica_cursore, cancellazioni_richieste
+from logger import get_logger, CAMPIONA
+
+# Data Collector su asyncio: stesse API REST e gRPC di app.py, ma un solo event loop
+# (Quart + grpc.aio + AsyncMongoClient + httpx) al posto di un thread per richiesta.
+# Rispetto ad app.py mancano /metrics, il ciclo di compattazione e il lease del monitoraggio:
+# va avviato in un solo processo (vedi README).
+# Si avvia con:  uvicorn app_async:app --host 0.0.0.0 --port 5001
+
+log = get_logger("data_collector.app_async")
+app = Quart(__name__)
+
+USER_MANAGER_ADDRESS = os.getenv("USER_MANAGER_GRPC", "localhost:50051")
+MY_CLIENT_ID = "data_collector_service"
+OPENSKY_API_URL = os.getenv("OPENSKY_API_URL", "https://opensky-network.org/api")
+PAGINA_DEFAULT = 100
+PAGINA_MASSIMA = 1000
+GIORNI_MASSIMI = 1000
+CAMPO_VALIDO = re.compile(r"^[A-Za-z0-9_]+$")
+INTERVALLO_MONITORAGGIO = int(os.getenv("INTERVALLO_MONITORAGGIO", "600"))
+GRPC_PORT = int(os.getenv("GRPC_PORT", "50052"))
+
+rate_limiter = AsyncRateLimiter()
+http = AsyncHttpClient(rate_limiter=rate_limiter)
+token_provider = AsyncTokenProvider(http)
+
+#creati dentro l'event loop all'avvio (before_serving)
+canale_user_manager = None
+server_grpc = None
+task_in_background = []
+semaforo_fetch = None
+
+#download immediati di POST /interests: Chiave = airport -> valore = task (uno solo per aeroporto)
+download_in_corso = {}
+statistiche_coda = {"richieste": 0, "unite": 0, "saltate_perche_aggiornate": 0}
+
+
+# server gRPC (grpc.aio) per la cancellazione degli interessi degli utenti eliminati
+class DataCollectorGRPC(user_pb2_grpc.DataCollectorServicer):
+    async def DeleteData(self, request, context):
+        email = request.email
+        log.info("Richiesta cancellazione dati per: %s", email, extra=CAMPIONA)
+
+        await mongo_db_async.rimuovi_interessi_utente(email)
+
+        return user_pb2.DeleteDataResponse(success=True)
+
+    async def DeleteDataBatch(self, request, context):
+        cancellazioni = cancellazioni_richieste(request)
+        log.info("Richiesta cancellazione dati per %d utenti", len(cancellazioni))
+
+        count = await mongo_db_async.rimuovi_interessi_utenti(cancellazioni)
+
+        return user_pb2.DeleteDataBatchResponse(success=True, deleted_count=count)
+
+
+async def start_grpc_server():
+    server = grpc.aio.server(options=opzioni_server())
+    user_pb2_grpc.add_DataCollectorServicer_to_server(DataCollectorGRPC(), server)
+    server.add_insecure_port(f'[::]:{GRPC_PORT}')
+    await server.start()
+    log.info("Data Collector gRPC Server (asyncio) attivo sulla porta %d", GRPC_PORT)
+    return server
+
+
+async def fetch_opensky_data(airport):
+    ora_fine = int(time.time())
+    ora_inizio, chiavi_note = calcola_finestra(await mongo_db_async.get_stato_fetch(airport), ora_fine)
+
+    url = f"{OPENSKY_API_URL}/flights/departure"
+    params = {'airport': airport, 'begin': ora_inizio, 'end': ora_fine}
+    token = await token_provider.get_token()
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+        log.debug("Token ottenuto, eseguo richiesta autenticata per %s...", airport)
+    else:
+        log.debug("Token non disponibile, eseguo richiesta anonima per %s...", airport)
+
+    try:
+        r = await http.request("GET", url, params=params, headers=headers, timeout=10)
+
+        if r.status_code == 200:
+            dati = r.json() or []
+            nuovi = deduplica_voli(dati, chiavi_note)
+            if dati:
+                log.info("%s: %d voli ricevuti, %d nuovi (finestra %d-%d)", airport, len(dati), len(nuovi), ora_inizio, ora_fine)
+            else:
+                log.info("Nessun volo trovato per %s nel periodo richiesto.", airport)
+            #la finestra si registra in scarica_e_salva, dopo il salvataggio dei voli
+            return nuovi, (ora_fine, chiavi_sovrapposizione(dati, ora_fine))
+
+        log.warning("OpenSky ha risposto %d per %s: %s", r.status_code, airport, r.text)
+
+    except Exception as e:
+        log.warning("Errore nella richiesta a OpenSky per %s: %s", airport, e)
+
+    # solo per scopi dimostrativi; la finestra non avanza
+    log.info("Generazione dati MOCK per %s", airport)
+    return volo_mock(airport), None
+
+
+async def scarica_e_salva(airport, semaforo):
+    #come FetcherConcorrente.scarica_e_salva: al massimo FETCH_CONCURRENCY download insieme
+    async with semaforo:
+        await rate_limiter.acquire()
+        inizio = time.perf_counter()
+        try:
+            voli, finestra = await fetch_opensky_data(airport)
+            latenza_fetch = time.perf_counter() - inizio
+            await mongo_db_async.salva_voli(airport, voli)
+            if finestra is not None:
+                await mongo_db_async.aggiorna_stato_fetch(airport, *finestra)
+            latenza_totale = time.perf_counter() - inizio
+            log.info("airport=%s voli=%d fetch_s=%.3f totale_s=%.3f", airport, len(voli), latenza_fetch, latenza_totale)
+            return None
+        except Exception as e:
+            #l'errore diventa il risultato del task: /interests/status lo riporta come in coda_fetch.CodaFetch
+            log.error("Download di %s fallito: %s", airport, e)
+            return str(e)
+
+
+async def richiedi_download(airport):
+
+    #stessa logica di coda_fetch.CodaFetch: un solo download per aeroporto, niente download se è fresco
+    statistiche_coda["richieste"] += 1
+    task = download_in_corso.get(airport)
+    if task is not None and not task.done():
+        statistiche_coda["unite"] += 1
+        return "in_corso"
+
+    ultimo = await mongo_db_async.get_ultimo_aggiornamento(airport)
+    task = download_in_corso.get(airport)
+    if task is not None and not task.done():
+        statistiche_coda["unite"] += 1
+        return "in_corso"
+    if ultimo is not None and time.time() - ultimo < FRESCHEZZA_FETCH:
+        statistiche_coda["saltate_perche_aggiornate"] += 1
+        return "gia_aggiornato"
+
+    download_in_corso[airport] = asyncio.ensure_future(scarica_e_salva(airport, semaforo_fetch))
+    return "in_coda"
+
+
+# task in background
+async def monitoraggio_ciclico():
+    log.info("Avvio Task Monitoraggio Ciclico...")
+    semaforo = semaforo_fetch
+    while True:
+        try:
+            durata = 0
+            aeroporti = await mongo_db_async.get_tutti_aeroporti_monitorati()
+            if aeroporti:
+                log.info("Aggiornamento per: %s", aeroporti)
+                inizio = time.perf_counter()
+                await asyncio.gather(*(scarica_e_salva(a, semaforo) for a in aeroporti))
+                durata = time.perf_counter() - inizio
+                log.info("Ciclo di %d aeroporti completato in %.2fs", len(aeroporti), durata)
+
+            await asyncio.sleep(max(0, INTERVALLO_MONITORAGGIO - durata))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception("Errore nel monitoraggio ciclico: %s", e)
+            await asyncio.sleep(60)
+
+
+@app.before_serving
+async def avvio():
+    global canale_user_manager, server_grpc, semaforo_fetch
+    await mongo_db_async.connect_db()
+    semaforo_fetch = asyncio.Semaphore(FETCH_CONCURRENCY)
+    #un solo canale grpc.aio verso lo User Manager, con la stessa retry policy di grpc_channels.py
+    canale_user_manager = grpc.aio.insecure_channel(USER_MANAGER_ADDRESS, options=opzioni_canale("UserManager"))
+    server_grpc = await start_grpc_server()
+    task_in_background.append(asyncio.ensure_future(token_provider.loop_refresh()))
+    task_in_background.append(asyncio.ensure_future(monitoraggio_ciclico()))
+
+
+@app.after_serving
+async def arresto():
+    for task in task_in_background:
+        task.cancel()
+    await server_grpc.stop(grace=5)
+    await canale_user_manager.close()
+    await http.close()
+    await mongo_db_async.close()
+
+
+# API REST
+@app.route('/interests', methods=['POST'])
+async def add_interest():
+    data = await request.get_json()
+    email = data.get('email')
+    airport = data.get('airport')
+
+    if not email or not airport:
+        return jsonify({"errore": "Email e Airport obbligatori"}), 400
+
+    # 1. Verifica Utente via gRPC
+    messaggio_univoco = str(uuid.uuid4())
+    try:
+        stub = user_pb2_grpc.UserManagerStub(canale_user_manager)
+
+        grpc_req = user_pb2.CheckUserRequest(
+            client_id=MY_CLIENT_ID,
+            message_id=messaggio_univoco,
+            email=email
+        )
+
+        risposta = await stub.CheckUser(grpc_req, timeout=GRPC_TIMEOUT)
+
+        if not risposta.exists:
+            return jsonify({"errore": "Utente non registrato"}), 404
+
+    except grpc.RpcError as e:
+
+        log.warning("Errore gRPC reale: %s", e)
+
+        if e.code() == grpc.StatusCode.UNAVAILABLE:
+            return jsonify({"errore": "User Manager non raggiungibile"}), 503
+
+        return jsonify({"errore": f"Errore comunicazione gRPC: {e.details()}"}), 500
+
+    # 2. Aggiunge l'interesse nel Data DB
+    await mongo_db_async.aggiungi_interesse(email, airport)
+
+    # 3. Download dei dati iniziali in background
+    stato = await richiedi_download(airport)
+
+    return jsonify({
+        "messaggio": f"Interesse aggiunto per {airport}, dati iniziali in aggiornamento",
+        "download": {"airport": airport, "stato": stato},
+        "status_url": f"/interests/status/{airport}"
+    }), 202
+
+
+@app.route('/interests/status/<airport>', methods=['GET'])
+async def get_interest_status(airport):
+    task = download_in_corso.get(airport)
+    if task is None:
+        return jsonify({"errore": f"Nessun download richiesto per {airport}"}), 404
+
+    if not task.done():
+        return jsonify({"airport": airport, "stato": "in_corso"}), 200
+
+    errore = task.result()
+    if errore is not None:
+        return jsonify({"airport": airport, "stato": "errore", "errore": errore}), 200
+    return jsonify({"airport": airport, "stato": "completato"}), 200
+
+
+@app.route('/interests', methods=['DELETE'])
+async def remove_interests():
+    email = request.args.get('email')
+
+    if not email:
+        return jsonify({"errore": "Email mancante"}), 400
+
+    count = await mongo_db_async.rimuovi_interessi_utente(email)
+
+    return jsonify({"messaggio": f"Rimossi {count} interessi per {email}"}), 200
+
+
+@app.route('/flights/last', methods=['GET'])
+async def get_last_flight():
+    airport = request.args.get('airport')
+    if not airport: return jsonify({"errore": "Airport mancante"}), 400
+
+    volo = await mongo_db_async.get_ultimo_volo(airport)
+    if volo:
+        volo.pop('_id', None)
+        return jsonify(volo), 200
+
+    return jsonify({"messaggio": "Nessun dato trovato"}), 404
+
+
+@app.route('/flights/average', methods=['GET'])
+async def get_average_flights():
+    airport = request.args.get('airport')
+    days = request.args.get('days')
+
+    if not airport or not days:
+        return jsonify({"errore": "Parametri mancanti"}), 400
+
+    try:
+        days = int(days)
+    except ValueError:
+        return jsonify({"errore": "Days deve essere un numero"}), 400
+
+    media = await mongo_db_async.get_media_voli(airport, days)
+
+    return jsonify({"airport": airport, "days": days, "average_flights": media}), 200
+
+
+@app.route('/flights/daily', methods=['GET'])
+async def get_daily_flights():
+    airport = request.args.get('airport')
+    days = request.args.get('days', '7')
+
+    if not airport:
+        return jsonify({"errore": "Airport mancante"}), 400
+
+    try:
+        days = int(days)
+    except ValueError:
+        return jsonify({"errore": "Days deve essere un numero"}), 400
+
+    #un elemento per giorno nella risposta: il numero di giorni va limitato
+    days = min(days, GIORNI_MASSIMI)
+
+    oggi = time.time()
+    giorni = [time.strftime("%Y-%m-%d", time.gmtime(oggi - i * 86400)) for i in range(days - 1, -1, -1)]
+    conteggi = await mongo_db_async.get_conteggi_giornalieri(airport, giorni[0], giorni[-1]) if giorni else {}
+
+    return jsonify({
+        "airport": airport,
+        "days": days,
+        "daily_flights": [{"day": g, "count": conteggi.get(g, 0)} for g in giorni]
+    }), 200
+
+
+def leggi_intero(nome):
+    valore = request.args.get(nome)
+    return int(valore) if valore not in (None, "") else None
+
+
+def pulisci_volo(volo, campi):
+    volo.pop('_id', None)
+    if campi and 'firstSeen' not in campi:
+        volo.pop('firstSeen', None)
+    return volo
+
+
+@app.route('/flights/my-interests', methods=['GET'])
+async def get_my_interest_flights():
+    email = request.args.get('email')
+
+    if not email:
+        return jsonify({"errore": "Parametro email obbligatorio"}), 400
+
+    formato = request.args.get('format', 'json')
+    campi = [c for c in request.args.get('fields', '').split(',') if c]
+    if any(not CAMPO_VALIDO.match(c) for c in campi):
+        return jsonify({"errore": "Campi non validi"}), 400
+
+    try:
+        limite = leggi_intero('limit')
+        inizio = leggi_intero('from')
+        fine = leggi_intero('to')
+        dopo = decodifica_cursore(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({"errore": "Parametri limit/from/to/cursor non validi"}), 400
+
+    if limite is not None and limite < 1:
+        return jsonify({"errore": "limit deve essere positivo"}), 400
+
+    if formato == 'ndjson':
+        cursore = await mongo_db_async.get_voli_di_interesse_utente(email, limite, dopo, campi, inizio, fine)
+
+        async def genera():
+            if cursore is None:
+                return
+            async for volo in cursore:
+                yield json.dumps(pulisci_volo(volo, campi), default=str) + "\n"
+
+        return Response(genera(), mimetype='application/x-ndjson'), 200
+
+    limite = min(limite or PAGINA_DEFAULT, PAGINA_MASSIMA)
+
+    cursore = await mongo_db_async.get_voli_di_interesse_utente(email, limite + 1, dopo, campi, inizio, fine)
+    voli = await cursore.to_list() if cursore is not None else []
+    next_cursor = None
+    if len(voli) > limite:
+        voli = voli[:limite]
+        next_cursor = codifica_cursore(voli[-1])
+
+    risposta = {
+        "user": email,
+        "count": len(voli),
+        "flights": [pulisci_volo(v, campi) for v in voli],
+        "next_cursor": next_cursor
+    }
+    # come in app.py: il totale solo sulla prima pagina
+    if dopo is None:
+        risposta["total_flights_found"] = await mongo_db_async.conta_voli_di_interesse_utente(email, inizio, fine)
+    return jsonify(risposta), 200
+
+
+@app.route('/diagnostics/indexes', methods=['GET'])
+async def get_diagnostics_indexes():
+    airport = request.args.get('airport', 'LIRF')
+    email = request.args.get('email', '')
+
+    return jsonify(await mongo_db_async.diagnostica_query(airport, email)), 200
+
+
+@app.route('/stats', methods=['GET'])
+async def get_stats():
+    richieste = statistiche_coda["richieste"]
+    risparmiate = statistiche_coda["unite"] + statistiche_coda["saltate_perche_aggiornate"]
+    coda = dict(
+        statistiche_coda,
+        in_corso=sum(1 for t in download_in_corso.values() if not t.done()),
+        rapporto_coalescenza=round(risparmiate / richieste, 3) if richieste else 0.0
+    )
+    return jsonify({"http": http.tempi.get_stats(), "coda_fetch": coda}), 200
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv("PORT", "5001")))
@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+import time
+from logger import get_logger
+
+log = get_logger("data_collector.coda_fetch")
+
+# Coda dei download "immediati" richiesti da POST /interests: la richiesta HTTP non aspetta più
+# OpenSky, mette l'aeroporto in coda e risponde subito. Se l'aeroporto è già in coda (o in download)
+# la richiesta si unisce a quella esistente; se è stato aggiornato da poco non si scarica affatto.
+
+CODA_FETCH_WORKERS = int(os.getenv("CODA_FETCH_WORKERS", "2"))       #thread che svuotano la coda
+FRESCHEZZA_FETCH = int(os.getenv("FRESCHEZZA_FETCH", "120"))          #secondi in cui un aeroporto è considerato aggiornato
+
+IN_CODA = "in_coda"
+IN_CORSO = "in_corso"
+COMPLETATO = "completato"
+AGGIORNATO = "gia_aggiornato"
+ERRORE = "errore"
+
+
+class CodaFetch:
+    def __init__(self, scarica_fn, ultimo_aggiornamento_fn, workers=CODA_FETCH_WORKERS, freschezza=FRESCHEZZA_FETCH):
+
+        #scarica_fn(airport) scarica e salva, ultimo_aggiornamento_fn(airport) -> timestamp o None
+        self.scarica_fn = scarica_fn
+        self.ultimo_aggiornamento_fn = ultimo_aggiornamento_fn
+        self.workers = workers
+        self.freschezza = freschezza
+
+        self.coda = queue.Queue()
+        #Chiave = airport -> valore = {"stato": ..., "richieste": n, "aggiornato_alle": ts, ...}
+        self.stati = {}
+        self.lock = threading.Lock()
+        self.thread = []
+
+        self.richieste = 0
+        self.unite = 0          #richieste unite a un download già in coda o in corso
+        self.saltate = 0        #richieste per aeroporti ancora freschi
+        self.eseguite = 0
+        self.errori = 0
+
+    def avvia(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"coda-fetch-{i}", daemon=True)
+            t.start()
+            self.thread.append(t)
+
+    def richiedi(self, airport):
+
+        #restituisce lo stato del download per l'aeroporto dopo aver (eventualmente) accodato la richiesta
+        with self.lock:
+            self.richieste += 1
+            stato = self.stati.get(airport)
+            if stato is not None and stato["stato"] in (IN_CODA, IN_CORSO):
+                self.unite += 1
+                stato["richieste"] += 1
+                return dict(stato)
+
+        ultimo = self.ultimo_aggiornamento_fn(airport)
+        now = time.time()
+
+        with self.lock:
+            #ricontrollo: un altro thread può aver accodato lo stesso aeroporto nel frattempo
+            stato = self.stati.get(airport)
+            if stato is not None and stato["stato"] in (IN_CODA, IN_CORSO):
+                self.unite += 1
+                stato["richieste"] += 1
+                return dict(stato)
+
+            if ultimo is not None and now - ultimo < self.freschezza:
+                self.saltate += 1
+                stato = {"airport": airport, "stato": AGGIORNATO, "richieste": 1, "aggiornato_alle": ultimo}
+                self.stati[airport] = stato
+                return dict(stato)
+
+            stato = {"airport": airport, "stato": IN_CODA, "richieste": 1, "accodato_alle": now}
+            self.stati[airport] = stato
+            self.coda.put(airport)
+            return dict(stato)
+
+    def get_stato(self, airport):
+        with self.lock:
+            stato = self.stati.get(airport)
+            return dict(stato) if stato is not None else None
+
+    def _worker(self):
+        while True:
+            airport = self.coda.get()
+            with self.lock:
+                self.stati[airport]["stato"] = IN_CORSO
+
+            try:
+                self.scarica_fn(airport)
+                esito = {"stato": COMPLETATO, "aggiornato_alle": time.time()}
+                with self.lock:
+                    self.eseguite += 1
+            except Exception as e:
+                log.error("Download in coda di %s fallito: %s", airport, e)
+                esito = {"stato": ERRORE, "errore": str(e)}
+                with self.lock:
+                    self.errori += 1
+
+            with self.lock:
+                self.stati[airport].update(esito)
+            self.coda.task_done()
+
+    def get_stats(self):
+        with self.lock:
+            risparmiate = self.unite + self.saltate
+            return {
+                "in_coda": self.coda.qsize(),
+                "in_corso": sum(1 for s in self.stati.values() if s["stato"] == IN_CORSO),
+                "richieste": self.richieste,
+                "unite": self.unite,
+                "saltate_perche_aggiornate": self.saltate,
+                "download_eseguiti": self.eseguite,
+                "errori": self.errori,
+                "rapporto_coalescenza": round(risparmiate / self.richieste, 3) if self.richieste else 0.0,
+            }
@@ -1,15 +1,39 @@
 import os
+import calendar
 import time
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+import threading
+from datetime import datetime, timezone
+from pymongo import MongoClient, DeleteMany, UpdateOne, ReplaceOne
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, OperationFailure
+from voli import giorno_e_ora, incrementi_rollup, volo_piu_recente, filtro_voli, filtro_cancellazione, pipeline_compattazione, ORDINE_VOLI
+from indici import riconcilia_indici, indici_con_retention, spiega_query_calde, INDICE_VOLI
+from metriche import tempo_db, conta_cache, registra_compattazione, registra_storage
+from logger import get_logger
+
+log = get_logger("data_collector.database_mongo")
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
+#giorni per cui vengono tenuti i dati grezzi (snapshot e singoli voli); i rollup giornalieri restano
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+#durata massima delle medie in cache (0 = cache disattivata). La cache è del singolo processo: i rollup
+#scritti da questo processo la invalidano subito, quelli scritti dal worker eletto per il monitoraggio no,
+#quindi negli altri worker una media può restare indietro fino a CACHE_MEDIE_TTL secondi
+CACHE_MEDIE_TTL = int(os.getenv("CACHE_MEDIE_TTL", "60"))
+#l'ultimo volo è tenuto anche in memoria; la durata breve copre i salvataggi fatti da altri processi
+CACHE_ULTIMO_VOLO_TTL = float(os.getenv("CACHE_ULTIMO_VOLO_TTL", "5"))
 
 
 class MongoDB:
     def __init__(self):
         self.client = None
         self.db = None
+
+        #cache in memoria delle medie: Chiave = (aeroporto, giorni, giorno corrente) -> (media, scadenza)
+        self.cache_medie = {}
+        #ultimo volo per aeroporto: Chiave = aeroporto -> (volo, scadenza)
+        self.ultimi_voli = {}
+        self.ultima_compattazione = None
+        self.cache_lock = threading.Lock()
         self.connect_db()
 
     def connect_db(self):
@@ -18,18 +42,19 @@ class MongoDB:
             try:
                 self.client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=5000)
                 self.client.admin.command('ping')
-                print("Connessione riuscita con MONGO")
+                log.info("Connessione riuscita con MONGO")
                 self.db = self.client["flight_db"]
-                self.db.flights.create_index("airport")
-                self.db.flights.create_index("timestamp")
+                # gli indici sono dichiarati in indici.py e allineati ad ogni avvio
+                riconcilia_indici(self.db, indici_con_retention(RETENTION_DAYS))
                 return
             except ConnectionFailure:
-                print("Tentativo di riconnessione con MONGO...")
+                log.warning("Tentativo di riconnessione con MONGO...")
                 time.sleep(3)
                 tentativi -= 1
-        print("Impossibile connettersi con MONGO.")
+        log.error("Impossibile connettersi con MONGO.")
 
 
+    @tempo_db("mongo", "aggiungi_interesse")
     def aggiungi_interesse(self, email, aeroporto):
 
         if self.db is None: return False
@@ -37,38 +62,197 @@ class MongoDB:
         # update_one' con upsert=True per evitare duplicati
         self.db.interests.update_one(
             {"user": email, "airport": aeroporto},
-            {"$set": {"user": email, "airport": aeroporto}},
+            #added_at = ultima volta che l'interesse è stato aggiunto: le cancellazioni arrivate in ritardo
+            #dall'outbox toccano solo gli interessi aggiunti prima della cancellazione dell'utente
+            {"$set": {"user": email, "airport": aeroporto, "added_at": time.time()}},
             upsert=True
         )
         return True
 
 
     #per il delete quando togliamo un utente
+    @tempo_db("mongo", "rimuovi_interessi_utente")
     def rimuovi_interessi_utente(self, email):
 
             if self.db is None: return 0
 
             result = self.db.interests.delete_many({"user": email})
-            print(f"Cancellati {result.deleted_count} interessi per {email}")
+            log.info("Cancellati %d interessi per %s", result.deleted_count, email)
+            return result.deleted_count
+
+
+    #per il delete di più utenti insieme (outbox dello User Manager): una sola delete_many
+    @tempo_db("mongo", "rimuovi_interessi_utenti")
+    def rimuovi_interessi_utenti(self, cancellazioni):
+
+            #cancellazioni = {email: istante della cancellazione dell'utente (None = tutti gli interessi)}
+            if self.db is None or not cancellazioni: return 0
+
+            #una sola bulk_write con una DeleteMany per utente (ognuna usa l'indice user_airport)
+            operazioni = [DeleteMany(filtro_cancellazione(email, alle)) for email, alle in cancellazioni.items()]
+            result = self.db.interests.bulk_write(operazioni, ordered=False)
+            log.info("Cancellati %d interessi per %d utenti", result.deleted_count, len(cancellazioni))
             return result.deleted_count
 
 
     #Salva i dati scaricati dal monitoraggio ciclico
+    @tempo_db("mongo", "salva_voli")
     def salva_voli(self, aeroporto, voli):
 
 
         if self.db is None: return None
+
+        # ogni volo diventa (o aggiorna) il suo documento in flight_events
+        nuovi = self.upsert_voli(aeroporto, voli)
+
+        # i voli mai visti prima vanno a incrementare i contatori giornalieri/orari
+        self.aggiorna_rollup(aeroporto, nuovi)
+
+        # e il più recente diventa l'ultimo volo dell'aeroporto (se è più nuovo di quello salvato)
+        self.aggiorna_ultimo_volo(aeroporto, nuovi)
+
+        # nello snapshot resta solo il conteggio, senza l'array dei voli
         documento = {
             "airport": aeroporto,
             "timestamp": time.time(),
-            "count": len(voli),  # Utile per le statistiche
-            "data": voli
+            "created_at": datetime.now(timezone.utc),  # campo Date per l'indice TTL (retention)
+            "count": len(nuovi),  # Utile per le statistiche: voli mai visti prima
         }
         res = self.db.flights.insert_one(documento)
         return str(res.inserted_id)
 
 
+    #Upsert in blocco dei voli di un aeroporto: restituisce i voli che non erano ancora salvati
+    def upsert_voli(self, aeroporto, voli):
+
+        operazioni = []
+        for volo in voli:
+            # seen_at (Date della partenza) è il campo su cui lavora l'indice TTL di flight_events
+            seen_at = datetime.fromtimestamp(volo.get("firstSeen") or time.time(), timezone.utc)
+            operazioni.append(UpdateOne(
+                {"airport": aeroporto, "icao24": volo.get("icao24"), "firstSeen": volo.get("firstSeen")},
+                {"$set": dict(volo, airport=aeroporto, seen_at=seen_at)},
+                upsert=True
+            ))
+
+        if not operazioni:
+            return []
+
+        # ordered=False: il server esegue le scritture senza fermarsi al primo errore
+        risultato = self.db.flight_events.bulk_write(operazioni, ordered=False)
+
+        # upserted_ids ha come chiavi gli indici delle operazioni che hanno inserito un documento nuovo
+        return [voli[i] for i in risultato.upserted_ids]
+
+
+    #Contatori pre-aggregati per aeroporto e giorno (con il dettaglio orario) dei voli in partenza
+    def aggiorna_rollup(self, aeroporto, voli):
+
+        if not voli: return
+
+        incrementi = incrementi_rollup(voli)
+        operazioni = [
+            UpdateOne(
+                {"_id": f"{aeroporto}:{giorno}"},
+                {"$inc": inc, "$setOnInsert": {"airport": aeroporto, "day": giorno}},
+                upsert=True
+            )
+            for giorno, inc in incrementi.items()
+        ]
+        if operazioni:
+            self.db.flight_rollups.bulk_write(operazioni, ordered=False)
+            self.invalida_cache_medie(aeroporto)
+
+
+    #Ricalcola da zero i rollup partendo da flight_events (dopo una migrazione o per riallinearli)
+    def ricostruisci_rollup(self):
+
+        if self.db is None: return 0
+
+        pipeline = [
+            {"$match": {"firstSeen": {"$gt": 0}}},
+            {"$project": {"airport": 1, "data": {"$toDate": {"$multiply": ["$firstSeen", 1000]}}}},
+            {"$group": {
+                "_id": {
+                    "airport": "$airport",
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$data"}},
+                    "hour": {"$dateToString": {"format": "%H", "date": "$data"}},
+                },
+                "n": {"$sum": 1}
+            }}
+        ]
+
+        documenti = {}
+        for riga in self.db.flight_events.aggregate(pipeline, allowDiskUse=True):
+            chiave = riga["_id"]
+            doc = documenti.setdefault(f"{chiave['airport']}:{chiave['day']}", {
+                "airport": chiave["airport"], "day": chiave["day"], "count": 0, "hours": {}
+            })
+            doc["count"] += riga["n"]
+            doc["hours"][chiave["hour"]] = riga["n"]
+
+        operazioni = [ReplaceOne({"_id": _id}, doc, upsert=True) for _id, doc in documenti.items()]
+        if operazioni:
+            self.db.flight_rollups.bulk_write(operazioni, ordered=False)
+        self.invalida_cache_medie()
+
+        log.info("Rollup ricostruiti: %d documenti giornalieri", len(operazioni))
+        return len(operazioni)
+
+
+    #Migrazione dai vecchi snapshot (array 'data' dentro flights) a flight_events
+    def migra_flights_a_flight_events(self):
+
+        if self.db is None: return 0
+
+        migrati = 0
+        cursore = self.db.flights.find({"data": {"$exists": True}}, {"airport": 1, "data": 1})
+        for doc in cursore:
+            voli = doc.get("data") or []
+            migrati += len(self.upsert_voli(doc["airport"], voli))
+
+            # lo snapshot resta per le statistiche, ma senza l'array dei voli
+            self.db.flights.update_one({"_id": doc["_id"]}, {"$unset": {"data": ""}})
+
+        log.info("Migrazione completata: %d voli copiati in flight_events", migrati)
+        return migrati
+
+
+    #High-water mark del download: fin dove è arrivata l'ultima finestra scaricata per l'aeroporto
+    @tempo_db("mongo", "get_stato_fetch")
+    def get_stato_fetch(self, aeroporto):
+
+        if self.db is None: return None
+
+        return self.db.fetch_state.find_one({"_id": aeroporto})
+
+
+    @tempo_db("mongo", "get_ultimo_aggiornamento")
+    def get_ultimo_aggiornamento(self, aeroporto):
+
+        #fine dell'ultima finestra scaricata da OpenSky per l'aeroporto (None se mai scaricato)
+        if self.db is None: return None
+
+        stato = self.db.fetch_state.find_one({"_id": aeroporto}, {"last_end": 1})
+        return stato["last_end"] if stato else None
+
+
+    @tempo_db("mongo", "aggiorna_stato_fetch")
+    def aggiorna_stato_fetch(self, aeroporto, fine_finestra, chiavi_recenti):
+
+        if self.db is None: return
+
+        # $max: se due download dello stesso aeroporto si sovrappongono, vince la finestra più recente
+        self.db.fetch_state.update_one(
+            {"_id": aeroporto},
+            {"$max": {"last_end": fine_finestra},
+             "$set": {"chiavi_recenti": chiavi_recenti}},
+            upsert=True
+        )
+
+
     #Restituisce la lista degli aeroporti unici che interessano agli utenti
+    @tempo_db("mongo", "get_tutti_aeroporti_monitorati")
     def get_tutti_aeroporti_monitorati(self):
 
 
@@ -78,79 +262,258 @@ class MongoDB:
         return self.db.interests.distinct("airport")
 
 
+    #Vista materializzata latest_flight: un documento per aeroporto con il volo partito per ultimo
+    def aggiorna_ultimo_volo(self, aeroporto, voli):
+
+        volo = volo_piu_recente(aeroporto, voli)
+        if volo is None: return
+
+        # aggiornamento atomico e condizionato: vince sempre il volo con firstSeen più alto,
+        # anche se due salvataggi dello stesso aeroporto si sovrappongono
+        res = self.db.latest_flight.update_one(
+            {"_id": aeroporto, "firstSeen": {"$lt": volo["firstSeen"]}},
+            {"$set": {"firstSeen": volo["firstSeen"], "volo": volo}}
+        )
+        if res.matched_count == 0:
+            try:
+                self.db.latest_flight.insert_one({"_id": aeroporto, "firstSeen": volo["firstSeen"], "volo": volo})
+            except DuplicateKeyError:
+                return  # esiste già un volo più recente (o uguale)
+
+        with self.cache_lock:
+            self.ultimi_voli[aeroporto] = (volo, time.monotonic() + CACHE_ULTIMO_VOLO_TTL)
+
+
     #Recupera l'ultimo volo registrato per un aeroporto
+    @tempo_db("mongo", "get_ultimo_volo")
     def get_ultimo_volo(self, aeroporto):
 
 
         if self.db is None: return None
 
-        # Cerca l'ultimo inserimento (timestamp decrescente)
-        record = self.db.flights.find_one(
-            {"airport": aeroporto, "count": {"$gt": 0}},  # Deve avere almeno un volo
-            sort=[("timestamp", -1)]
+        # prima la mappa in memoria, poi la vista materializzata (lettura per _id)
+        with self.cache_lock:
+            valore = self.ultimi_voli.get(aeroporto)
+            hit = valore is not None and valore[1] > time.monotonic()
+        conta_cache("ultimo_volo", hit)
+        if hit:
+            return dict(valore[0])
+
+        doc = self.db.latest_flight.find_one({"_id": aeroporto})
+        if doc:
+            volo = doc["volo"]
+        else:
+            # vista non ancora popolata (es. dati migrati): la ricavo da flight_events e la salvo
+            volo = self.db.flight_events.find_one(
+                {"airport": aeroporto},
+                {"_id": 0, "seen_at": 0},
+                sort=[("firstSeen", -1)]
+            )
+            if volo is None:
+                return None
+            self.aggiorna_ultimo_volo(aeroporto, [volo])
+
+        with self.cache_lock:
+            self.ultimi_voli[aeroporto] = (volo, time.monotonic() + CACHE_ULTIMO_VOLO_TTL)
+        return dict(volo)
+
+
+    # Conteggio dei voli per giorno (dai rollup): legge al massimo un documento per giorno richiesto
+    @tempo_db("mongo", "get_conteggi_giornalieri")
+    def get_conteggi_giornalieri(self, aeroporto, primo_giorno, ultimo_giorno):
+
+        if self.db is None: return {}
+
+        cursore = self.db.flight_rollups.find(
+            {"airport": aeroporto, "day": {"$gte": primo_giorno, "$lte": ultimo_giorno}},
+            {"_id": 0, "day": 1, "count": 1}
         )
+        return {doc["day"]: doc["count"] for doc in cursore}
 
-        if record and "data" in record and len(record["data"]) > 0:
-
-            # Restituisce il primo volo della lista più recente
-            return record["data"][0]
-        return None
 
     # Calcola la media voli degli ultimi X giorni
+    @tempo_db("mongo", "get_media_voli")
     def get_media_voli(self, aeroporto, giorni):
 
-        if self.db is None: return 0
+        if self.db is None or giorni < 1: return 0
 
-        now = time.time()
-        limite_tempo = now - (giorni * 86400)  # 86400 secondi in un giorno
+        oggi = time.time()
+        ultimo_giorno, _ = giorno_e_ora(oggi)
+        primo_giorno, _ = giorno_e_ora(oggi - (giorni - 1) * 86400)  # 86400 secondi in un giorno
 
-        pipeline = [
-            #Filtra documenti di quell'aeroporto negli ultimi X giorni
-            {"$match": {
-                "airport": aeroporto,
-                "timestamp": {"$gte": limite_tempo}
-            }},
-            #Somma il numero di voli trovati
-            {"$group": {
-                "_id": None,
-                "totale_voli": {"$sum": "$count"}
-            }}
-        ]
+        #la chiave contiene il giorno corrente: a mezzanotte la finestra cambia da sola
+        chiave = (aeroporto, giorni, ultimo_giorno)
+        with self.cache_lock:
+            valore = self.cache_medie.get(chiave)
+            hit = valore is not None and valore[1] > time.monotonic()
+        conta_cache("medie", hit)
+        if hit:
+            return valore[0]
 
-        risultato = list(self.db.flights.aggregate(pipeline))
-        if not risultato:
-            return 0
-
-        totale_voli = risultato[0]["totale_voli"]
+        totale_voli = sum(self.get_conteggi_giornalieri(aeroporto, primo_giorno, ultimo_giorno).values())
 
         # Media = Totale Voli / Giorni
-        return round(totale_voli / giorni, 2)
+        media = round(totale_voli / giorni, 2)
 
+        if CACHE_MEDIE_TTL > 0:
+            with self.cache_lock:
+                self.cache_medie[chiave] = (media, time.monotonic() + CACHE_MEDIE_TTL)
+        return media
 
-    def get_voli_di_interesse_utente(self, email):
 
-        if self.db is None: return []
+    def invalida_cache_medie(self, aeroporto=None):
+
+        #chiamata quando questo processo modifica i rollup: le medie di quell'aeroporto vanno ricalcolate
+        with self.cache_lock:
+            if aeroporto is None:
+                self.cache_medie.clear()
+            else:
+                for chiave in [k for k in self.cache_medie if k[0] == aeroporto]:
+                    del self.cache_medie[chiave]
+
+
+    @tempo_db("mongo", "conta_voli_di_interesse_utente")
+    def conta_voli_di_interesse_utente(self, email, inizio=None, fine=None):
+
+        #numero totale dei voli che l'utente vedrebbe scorrendo tutte le pagine (total_flights_found):
+        #conteggio sulle sole chiavi dell'indice, senza leggere i documenti
+        if self.db is None: return 0
+
+        lista_aeroporti = [doc["airport"] for doc in self.db.interests.find({"user": email}, {"_id": 0, "airport": 1})]
+        if not lista_aeroporti:
+            return 0
+        return self.db.flight_events.count_documents(filtro_voli(lista_aeroporti, inizio, fine), hint=INDICE_VOLI)
+
+
+    def get_voli_di_interesse_utente(self, email, limite=None, dopo=None, campi=None, inizio=None, fine=None):
+
+        #Restituisce un cursore (non una lista): i voli vengono letti da Mongo a blocchi mentre si scorre
+        #dopo = (firstSeen, _id) dell'ultimo volo della pagina precedente, campi = proiezione richiesta
+
+        if self.db is None: return iter([])
 
         #Trova gli aeroporti seguiti dall'utente
-        interessi_cursor = self.db.interests.find({"user": email})
+        interessi_cursor = self.db.interests.find({"user": email}, {"_id": 0, "airport": 1})  # coperta dall'indice (user, airport)
         lista_aeroporti = [doc["airport"] for doc in interessi_cursor]
 
         if not lista_aeroporti:
-            return []  # L'utente non segue nessun aeroporto
+            return iter([])  # L'utente non segue nessun aeroporto
+
+        # filtro temporale sulla partenza del volo e paginazione per chiave: riparte subito dopo
+        # l'ultimo volo già restituito (vedi voli.filtro_voli)
+        filtro = filtro_voli(lista_aeroporti, inizio, fine, dopo)
+
+        proiezione = {"seen_at": 0}  # campo interno della retention
+        if campi:
+            # firstSeen e _id servono sempre per costruire il token della pagina successiva
+            proiezione = dict.fromkeys(campi, 1)
+            proiezione.update({"firstSeen": 1, "_id": 1})
+
+        #Trova tutti i voli che matchano quegli aeroporti: un documento per volo, niente duplicati
+        #Ordiniamo dai più recenti leggendo l'indice nello stesso ordine: niente SORT in memoria
+        cursor_flights = self.db.flight_events.find(filtro, proiezione).sort(ORDINE_VOLI).hint(INDICE_VOLI)
+        if limite:
+            cursor_flights = cursor_flights.limit(limite)
+
+        return cursor_flights
+
+
+    #Compattazione: i giorni che stanno per uscire dalla retention vengono consolidati nei rollup giornalieri
+    #(che non scadono), poi i dati grezzi vecchi senza campo Date (salvati prima del TTL) vengono cancellati
+    @tempo_db("mongo", "compatta_dati_vecchi")
+    def compatta_dati_vecchi(self, giorni_retention=RETENTION_DAYS):
+
+        if self.db is None: return None
+
+        inizio = time.perf_counter()
+        now = time.time()
+        limite_retention = now - giorni_retention * 86400
+        # mi porto avanti di un giorno, così ogni giorno viene consolidato prima che il TTL lo cancelli
+        giorno_limite, _ = giorno_e_ora(limite_retention + 86400)
+        fino_a = calendar.timegm(time.strptime(giorno_limite, "%Y-%m-%d"))  # mezzanotte UTC di quel giorno
+
+        stato = self.db.compaction_state.find_one({"_id": "flight_events"}) or {}
+        da = stato.get("fino_a", 0)
+
+        giorni = {}
+        voli_letti = 0
+        for riga in self.db.flight_events.aggregate(pipeline_compattazione(da, fino_a), allowDiskUse=True):
+            chiave = riga["_id"]
+            doc = giorni.setdefault((chiave["airport"], chiave["day"]), {"count": 0})
+            doc["count"] += riga["n"]
+            doc[f"hours.{chiave['hour']}"] = riga["n"]
+            voli_letti += riga["n"]
+
+        # $max: se parte dei voli grezzi è già stata cancellata non abbasso mai i contatori esistenti
+        operazioni = [
+            UpdateOne(
+                {"_id": f"{airport}:{giorno}"},
+                {"$max": conteggi, "$set": {"airport": airport, "day": giorno, "compacted": True}},
+                upsert=True
+            )
+            for (airport, giorno), conteggi in giorni.items()
+        ]
+        if operazioni:
+            self.db.flight_rollups.bulk_write(operazioni, ordered=False)
+            self.invalida_cache_medie()
+
+        self.db.compaction_state.update_one(
+            {"_id": "flight_events"}, {"$max": {"fino_a": fino_a}}, upsert=True
+        )
+
+        # documenti salvati prima dell'introduzione del TTL: li cancello a mano
+        eliminati = self.db.flight_events.delete_many(
+            {"seen_at": {"$exists": False}, "firstSeen": {"$lt": min(fino_a, limite_retention)}}
+        ).deleted_count
+        eliminati += self.db.flights.delete_many(
+            {"created_at": {"$exists": False}, "timestamp": {"$lt": limite_retention}}
+        ).deleted_count
+
+        durata = time.perf_counter() - inizio
+        risultato = {
+            "voli_consolidati": voli_letti,
+            "giorni_consolidati": len(operazioni),
+            "documenti_eliminati": eliminati,
+            "durata_s": round(durata, 3),
+            "voli_al_secondo": round(voli_letti / durata, 1) if durata > 0 else 0,
+            "eseguita_alle": now,
+        }
+        with self.cache_lock:
+            self.ultima_compattazione = risultato
+        registra_compattazione(voli_letti, eliminati)
+        log.info("Compattazione completata: %s", risultato)
+        return risultato
+
+
+    #Dimensione delle collection principali (collStats, esportata anche su /metrics) e ultimo risultato della compattazione
+    def get_statistiche_storage(self):
+
+        if self.db is None: return {}
+
+        storage = {}
+        for nome in ("flights", "flight_events", "flight_rollups", "latest_flight", "interests"):
+            try:
+                stats = self.db.command("collStats", nome)
+                storage[nome] = {
+                    "documenti": stats.get("count", 0),
+                    "dimensione_dati": stats.get("size", 0),
+                    "dimensione_storage": stats.get("storageSize", 0),
+                    "dimensione_indici": stats.get("totalIndexSize", 0),
+                }
+            except OperationFailure:
+                storage[nome] = {"documenti": 0}
+        registra_storage(storage)
 
+        with self.cache_lock:
+            compattazione = self.ultima_compattazione
+        return {"retention_giorni": RETENTION_DAYS, "collections": storage, "ultima_compattazione": compattazione}
 
-        #Trova tutti i voli che matchano quegli aeroporti
-        cursor_flights = self.db.flights.find({
-            "airport": {"$in": lista_aeroporti}
-        }).sort("timestamp", -1)  # Ordiniamo dai più recenti
 
+    #Piani di esecuzione delle query più frequenti (endpoint di diagnostica)
+    def diagnostica_query(self, aeroporto, email):
 
-        #estraiamo per fare una lista unica pulita.
-        lista_voli_completa = []
-        for doc in cursor_flights:
-            if "data" in doc and isinstance(doc["data"], list):
-                lista_voli_completa.extend(doc["data"])
+        if self.db is None: return {}
 
-        return lista_voli_completa
+        return spiega_query_calde(self.db, aeroporto, email)
 
 mongo_db = MongoDB()
\ No newline at end of file
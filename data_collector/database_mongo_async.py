@@ -0,0 +1,309 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from pymongo import AsyncMongoClient, MongoClient, DeleteMany, UpdateOne
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
+from voli import giorno_e_ora, incrementi_rollup, volo_piu_recente, filtro_voli, filtro_cancellazione, ORDINE_VOLI
+from indici import riconcilia_indici, indici_con_retention, spiega_query_calde, INDICE_VOLI
+from logger import get_logger
+
+log = get_logger("data_collector.database_mongo_async")
+
+# Versione asyncio di MongoDB (driver AsyncMongoClient di pymongo) usata da app_async.py:
+# stesse collection, stessi documenti e stessi indici della versione a thread
+
+#stesse variabili d'ambiente di database_mongo.py (che non importo: creerebbe anche il client sincrono)
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+CACHE_MEDIE_TTL = int(os.getenv("CACHE_MEDIE_TTL", "60"))
+CACHE_ULTIMO_VOLO_TTL = float(os.getenv("CACHE_ULTIMO_VOLO_TTL", "5"))
+
+
+class AsyncMongoDB:
+    def __init__(self):
+        self.client = None
+        self.db = None
+
+        #le cache in memoria vivono nel solo event loop: niente lock
+        self.cache_medie = {}
+        self.ultimi_voli = {}
+
+    async def connect_db(self):
+        tentativi = 10
+        while tentativi > 0:
+            try:
+                self.client = AsyncMongoClient(MONGO_URL, serverSelectionTimeoutMS=5000)
+                await self.client.admin.command('ping')
+                log.info("Connessione riuscita con MONGO (async)")
+                self.db = self.client["flight_db"]
+                # gli indici si allineano una volta sola all'avvio, con il driver sincrono in un thread
+                await asyncio.to_thread(self._riconcilia_indici)
+                return
+            except ConnectionFailure:
+                log.warning("Tentativo di riconnessione con MONGO...")
+                await asyncio.sleep(3)
+                tentativi -= 1
+        log.error("Impossibile connettersi con MONGO.")
+
+    def _riconcilia_indici(self):
+        client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=5000)
+        try:
+            riconcilia_indici(client["flight_db"], indici_con_retention(RETENTION_DAYS))
+        finally:
+            client.close()
+
+    async def diagnostica_query(self, aeroporto, email):
+
+        if self.db is None: return {}
+
+        #explain() delle query calde di indici.py, anche questo con il driver sincrono in un thread
+        return await asyncio.to_thread(self._spiega_query_calde, aeroporto, email)
+
+    def _spiega_query_calde(self, aeroporto, email):
+        client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=5000)
+        try:
+            return spiega_query_calde(client["flight_db"], aeroporto, email)
+        finally:
+            client.close()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+
+
+    async def aggiungi_interesse(self, email, aeroporto):
+
+        if self.db is None: return False
+
+        await self.db.interests.update_one(
+            {"user": email, "airport": aeroporto},
+            #added_at = ultima volta che l'interesse è stato aggiunto: le cancellazioni arrivate in ritardo
+            #dall'outbox toccano solo gli interessi aggiunti prima della cancellazione dell'utente
+            {"$set": {"user": email, "airport": aeroporto, "added_at": time.time()}},
+            upsert=True
+        )
+        return True
+
+
+    async def rimuovi_interessi_utente(self, email):
+
+        if self.db is None: return 0
+
+        result = await self.db.interests.delete_many({"user": email})
+        log.info("Cancellati %d interessi per %s", result.deleted_count, email)
+        return result.deleted_count
+
+
+    async def rimuovi_interessi_utenti(self, cancellazioni):
+
+        #come MongoDB.rimuovi_interessi_utenti: cancellazioni = {email: istante della cancellazione o None}
+        if self.db is None or not cancellazioni: return 0
+
+        operazioni = [DeleteMany(filtro_cancellazione(email, alle)) for email, alle in cancellazioni.items()]
+        result = await self.db.interests.bulk_write(operazioni, ordered=False)
+        log.info("Cancellati %d interessi per %d utenti", result.deleted_count, len(cancellazioni))
+        return result.deleted_count
+
+
+    async def salva_voli(self, aeroporto, voli):
+
+        if self.db is None: return None
+
+        nuovi = await self.upsert_voli(aeroporto, voli)
+        await self.aggiorna_rollup(aeroporto, nuovi)
+        await self.aggiorna_ultimo_volo(aeroporto, nuovi)
+
+        documento = {
+            "airport": aeroporto,
+            "timestamp": time.time(),
+            "created_at": datetime.now(timezone.utc),
+            "count": len(nuovi),
+        }
+        res = await self.db.flights.insert_one(documento)
+        return str(res.inserted_id)
+
+
+    async def upsert_voli(self, aeroporto, voli):
+
+        operazioni = []
+        for volo in voli:
+            seen_at = datetime.fromtimestamp(volo.get("firstSeen") or time.time(), timezone.utc)
+            operazioni.append(UpdateOne(
+                {"airport": aeroporto, "icao24": volo.get("icao24"), "firstSeen": volo.get("firstSeen")},
+                {"$set": dict(volo, airport=aeroporto, seen_at=seen_at)},
+                upsert=True
+            ))
+
+        if not operazioni:
+            return []
+
+        risultato = await self.db.flight_events.bulk_write(operazioni, ordered=False)
+        return [voli[i] for i in risultato.upserted_ids]
+
+
+    async def aggiorna_rollup(self, aeroporto, voli):
+
+        operazioni = [
+            UpdateOne(
+                {"_id": f"{aeroporto}:{giorno}"},
+                {"$inc": inc, "$setOnInsert": {"airport": aeroporto, "day": giorno}},
+                upsert=True
+            )
+            for giorno, inc in incrementi_rollup(voli).items()
+        ]
+        if operazioni:
+            await self.db.flight_rollups.bulk_write(operazioni, ordered=False)
+            for chiave in [k for k in self.cache_medie if k[0] == aeroporto]:
+                del self.cache_medie[chiave]
+
+
+    async def aggiorna_ultimo_volo(self, aeroporto, voli):
+
+        volo = volo_piu_recente(aeroporto, voli)
+        if volo is None: return
+
+        res = await self.db.latest_flight.update_one(
+            {"_id": aeroporto, "firstSeen": {"$lt": volo["firstSeen"]}},
+            {"$set": {"firstSeen": volo["firstSeen"], "volo": volo}}
+        )
+        if res.matched_count == 0:
+            try:
+                await self.db.latest_flight.insert_one({"_id": aeroporto, "firstSeen": volo["firstSeen"], "volo": volo})
+            except DuplicateKeyError:
+                return
+
+        self.ultimi_voli[aeroporto] = (volo, time.monotonic() + CACHE_ULTIMO_VOLO_TTL)
+
+
+    async def get_stato_fetch(self, aeroporto):
+
+        if self.db is None: return None
+
+        return await self.db.fetch_state.find_one({"_id": aeroporto})
+
+
+    async def get_ultimo_aggiornamento(self, aeroporto):
+
+        if self.db is None: return None
+
+        stato = await self.db.fetch_state.find_one({"_id": aeroporto}, {"last_end": 1})
+        return stato["last_end"] if stato else None
+
+
+    async def aggiorna_stato_fetch(self, aeroporto, fine_finestra, chiavi_recenti):
+
+        if self.db is None: return
+
+        await self.db.fetch_state.update_one(
+            {"_id": aeroporto},
+            {"$max": {"last_end": fine_finestra},
+             "$set": {"chiavi_recenti": chiavi_recenti}},
+            upsert=True
+        )
+
+
+    async def get_tutti_aeroporti_monitorati(self):
+
+        if self.db is None: return []
+
+        return await self.db.interests.distinct("airport")
+
+
+    async def get_ultimo_volo(self, aeroporto):
+
+        if self.db is None: return None
+
+        valore = self.ultimi_voli.get(aeroporto)
+        if valore is not None and valore[1] > time.monotonic():
+            return dict(valore[0])
+
+        doc = await self.db.latest_flight.find_one({"_id": aeroporto})
+        if doc:
+            volo = doc["volo"]
+        else:
+            volo = await self.db.flight_events.find_one(
+                {"airport": aeroporto},
+                {"_id": 0, "seen_at": 0},
+                sort=[("firstSeen", -1)]
+            )
+            if volo is None:
+                return None
+            await self.aggiorna_ultimo_volo(aeroporto, [volo])
+
+        self.ultimi_voli[aeroporto] = (volo, time.monotonic() + CACHE_ULTIMO_VOLO_TTL)
+        return dict(volo)
+
+
+    async def get_conteggi_giornalieri(self, aeroporto, primo_giorno, ultimo_giorno):
+
+        if self.db is None: return {}
+
+        cursore = self.db.flight_rollups.find(
+            {"airport": aeroporto, "day": {"$gte": primo_giorno, "$lte": ultimo_giorno}},
+            {"_id": 0, "day": 1, "count": 1}
+        )
+        return {doc["day"]: doc["count"] async for doc in cursore}
+
+
+    async def get_media_voli(self, aeroporto, giorni):
+
+        if self.db is None or giorni < 1: return 0
+
+        oggi = time.time()
+        ultimo_giorno, _ = giorno_e_ora(oggi)
+        primo_giorno, _ = giorno_e_ora(oggi - (giorni - 1) * 86400)
+
+        chiave = (aeroporto, giorni, ultimo_giorno)
+        valore = self.cache_medie.get(chiave)
+        if valore is not None and valore[1] > time.monotonic():
+            return valore[0]
+
+        conteggi = await self.get_conteggi_giornalieri(aeroporto, primo_giorno, ultimo_giorno)
+        media = round(sum(conteggi.values()) / giorni, 2)
+
+        if CACHE_MEDIE_TTL > 0:
+            self.cache_medie[chiave] = (media, time.monotonic() + CACHE_MEDIE_TTL)
+        return media
+
+
+    async def conta_voli_di_interesse_utente(self, email, inizio=None, fine=None):
+
+        if self.db is None: return 0
+
+        lista_aeroporti = [
+            doc["airport"] async for doc in self.db.interests.find({"user": email}, {"_id": 0, "airport": 1})
+        ]
+        if not lista_aeroporti:
+            return 0
+        return await self.db.flight_events.count_documents(filtro_voli(lista_aeroporti, inizio, fine), hint=INDICE_VOLI)
+
+
+    async def get_voli_di_interesse_utente(self, email, limite=None, dopo=None, campi=None, inizio=None, fine=None):
+
+        #restituisce un cursore asincrono (async for), stessi filtri della versione sincrona
+
+        if self.db is None: return None
+
+        lista_aeroporti = [
+            doc["airport"] async for doc in self.db.interests.find({"user": email}, {"_id": 0, "airport": 1})
+        ]
+        if not lista_aeroporti:
+            return None
+
+        # filtro temporale sulla partenza del volo e paginazione per chiave: riparte subito dopo
+        # l'ultimo volo già restituito (vedi voli.filtro_voli)
+        filtro = filtro_voli(lista_aeroporti, inizio, fine, dopo)
+
+        proiezione = {"seen_at": 0}
+        if campi:
+            proiezione = dict.fromkeys(campi, 1)
+            proiezione.update({"firstSeen": 1, "_id": 1})
+
+        cursor_flights = self.db.flight_events.find(filtro, proiezione).sort(ORDINE_VOLI).hint(INDICE_VOLI)
+        if limite:
+            cursor_flights = cursor_flights.limit(limite)
+        return cursor_flights
+
+
+mongo_db_async = AsyncMongoDB()
@@ -0,0 +1,86 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from logger import get_logger
+
+log = get_logger("data_collector.elezione")
+
+# Elezione di un solo "leader" tra i worker (anche di container diversi) tramite un lease su MongoDB:
+# il documento {_id: nome, owner, expires_at} appartiene a un solo processo finché lo rinnova.
+# Se il leader muore, il lease scade e un altro worker lo prende al giro successivo.
+
+LEASE_TTL = int(os.getenv("LEASE_TTL", "30"))   #secondi di validità del lease senza rinnovo
+
+
+class Lease:
+    def __init__(self, get_db, nome, ttl=LEASE_TTL):
+
+        #get_db() -> database Mongo (None se non connesso)
+        self.get_db = get_db
+        self.nome = nome
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.scadenza = 0
+        self.thread = None
+
+    def e_leader(self):
+        #il lease vale solo finché non scade: se il rinnovo si blocca, si smette di fare il leader
+        return time.time() < self.scadenza
+
+    def prova_ad_acquisire(self):
+
+        db = self.get_db()
+        if db is None:
+            return False
+
+        now = time.time()
+        try:
+            #prendo il lease se è scaduto o se è già mio (rinnovo)
+            doc = db.leases.find_one_and_update(
+                {"_id": self.nome, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.ttl}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            #il documento esiste ed è di un altro processo ancora vivo
+            doc = None
+
+        era_leader = self.e_leader()
+        if doc is not None and doc["owner"] == self.owner:
+            self.scadenza = now + self.ttl
+            if not era_leader:
+                log.info("%s ha preso il lease '%s'", self.owner, self.nome)
+            return True
+
+        self.scadenza = 0
+        if era_leader:
+            log.warning("%s ha perso il lease '%s'", self.owner, self.nome)
+        return False
+
+    def avvia(self):
+
+        #rinnovo periodico in background (3 volte per TTL)
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.prova_ad_acquisire()
+            except Exception as e:
+                log.error("Rinnovo del lease '%s' fallito: %s", self.nome, e)
+                self.scadenza = 0
+            time.sleep(self.ttl / 3)
+
+    def rilascia(self):
+        db = self.get_db()
+        if db is not None and self.e_leader():
+            db.leases.delete_one({"_id": self.nome, "owner": self.owner})
+        self.scadenza = 0
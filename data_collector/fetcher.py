@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from concurrent import futures
+from logger import get_logger
+from metriche import registra_download
+
+log = get_logger("data_collector.fetcher")
+
+# Download concorrente degli aeroporti monitorati: un pool limitato di thread scarica i dati
+# da OpenSky in parallelo, rispettando un rate limit globale, e salva ogni aeroporto appena pronto
+
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))            #download contemporanei massimi
+OPENSKY_RATE_LIMIT = float(os.getenv("OPENSKY_RATE_LIMIT", "2"))        #richieste al secondo verso OpenSky
+OPENSKY_RATE_BURST = int(os.getenv("OPENSKY_RATE_BURST", "4"))          #richieste consentite a raffica
+
+
+class RateLimiter:
+    def __init__(self, rate, burst):
+
+        #token bucket: si accumulano 'rate' gettoni al secondo fino a un massimo di 'burst'
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.gettoni = float(self.burst)
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+
+        #blocca il thread finché non è disponibile un gettone
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.gettoni = min(self.burst, self.gettoni + (now - self.ultimo) * self.rate)
+                self.ultimo = now
+                if self.gettoni >= 1:
+                    self.gettoni -= 1
+                    return
+                attesa = (1 - self.gettoni) / self.rate
+            time.sleep(attesa)
+
+
+#un solo bucket per processo verso OpenSky: lo usano il fetcher e i retry di http_client
+opensky_rate_limiter = RateLimiter(OPENSKY_RATE_LIMIT, OPENSKY_RATE_BURST)
+
+
+class FetcherConcorrente:
+    def __init__(self, fetch_fn, save_fn, max_workers=FETCH_CONCURRENCY, rate_limiter=None):
+
+        #fetch_fn(airport) -> (voli, finestra), save_fn(airport, voli, finestra) -> salva su Mongo
+        #(la finestra scaricata si registra solo dopo aver salvato i voli)
+        self.fetch_fn = fetch_fn
+        self.save_fn = save_fn
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or opensky_rate_limiter
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetcher")
+
+    def scarica_e_salva(self, airport):
+
+        self.rate_limiter.acquire()
+
+        inizio = time.perf_counter()
+        voli, finestra = self.fetch_fn(airport)
+        latenza_fetch = time.perf_counter() - inizio
+
+        #salvo subito, senza aspettare gli altri aeroporti del ciclo
+        self.save_fn(airport, voli, finestra)
+        latenza_totale = time.perf_counter() - inizio
+
+        #non campionato: una riga per aeroporto e per ciclo, poche rispetto alle richieste HTTP
+        log.info("airport=%s voli=%d fetch_s=%.3f totale_s=%.3f", airport, len(voli), latenza_fetch, latenza_totale)
+        registra_download(airport, latenza_fetch, latenza_totale)
+        return latenza_totale
+
+    def esegui_ciclo(self, aeroporti):
+
+        inizio = time.perf_counter()
+        completati = 0
+        errori = 0
+
+        in_corso = {self.executor.submit(self.scarica_e_salva, airport): airport for airport in aeroporti}
+        for future in futures.as_completed(in_corso):
+            airport = in_corso[future]
+            try:
+                future.result()
+                completati += 1
+            except Exception as e:
+                errori += 1
+                log.error("Download di %s fallito: %s", airport, e)
+
+        durata = time.perf_counter() - inizio
+        log.info("ciclo aeroporti=%d completati=%d errori=%d durata_s=%.3f concorrenza=%d",
+                 len(aeroporti), completati, errori, durata, self.max_workers)
+        return durata
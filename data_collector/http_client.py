@@ -0,0 +1,126 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from fetcher import FETCH_CONCURRENCY, opensky_rate_limiter
+from coda_fetch import CODA_FETCH_WORKERS
+
+# Client HTTP condiviso per tutte le chiamate verso OpenSky: una sola requests.Session con un pool
+# di connessioni keep-alive (niente nuovo handshake TCP+TLS a ogni richiesta), gzip e retry
+# con backoff su 429/5xx che rispetta l'header Retry-After
+
+#connessioni tenute aperte per host: la sessione la usano insieme i thread del fetcher e quelli della coda
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", str(FETCH_CONCURRENCY + CODA_FETCH_WORKERS)))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))                    #secondi, raddoppia a ogni tentativo
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "30"))      #attesa massima accettata da Retry-After
+
+
+class RetryConJitter(Retry):
+
+    #backoff esponenziale con jitter, così i thread del fetcher non riprovano tutti nello stesso istante.
+    #Ogni retry è una richiesta in più verso OpenSky: dopo l'attesa prende un gettone dal rate limiter
+    def __init__(self, *args, rate_limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kwargs):
+        #urllib3 crea un nuovo Retry a ogni tentativo: il rate limiter va passato avanti
+        kwargs.setdefault("rate_limiter", self.rate_limiter)
+        return super().new(**kwargs)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0
+        return random.uniform(backoff / 2, backoff)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, HTTP_RETRY_AFTER_MAX)
+
+
+class TempiRichieste:
+    def __init__(self):
+
+        #Chiave = "METODO host" -> valore = {richieste, errori, tempo totale, tempo massimo, ultimo status}
+        self.dati = {}
+        self.lock = threading.Lock()
+
+    def registra(self, chiave, durata, status):
+        with self.lock:
+            voce = self.dati.setdefault(chiave, {"richieste": 0, "errori": 0, "totale_s": 0.0, "max_s": 0.0, "ultimo_status": None})
+            voce["richieste"] += 1
+            voce["totale_s"] += durata
+            voce["max_s"] = max(voce["max_s"], durata)
+            voce["ultimo_status"] = status
+            if status is None or status >= 400:
+                voce["errori"] += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                chiave: {
+                    "richieste": voce["richieste"],
+                    "errori": voce["errori"],
+                    "media_ms": round(voce["totale_s"] / voce["richieste"] * 1000, 3),
+                    "max_ms": round(voce["max_s"] * 1000, 3),
+                    "ultimo_status": voce["ultimo_status"],
+                }
+                for chiave, voce in self.dati.items()
+            }
+
+
+tempi_richieste = TempiRichieste()
+
+
+class AdapterCronometrato(HTTPAdapter):
+
+    #misura la durata di ogni richiesta, retry compresi
+    def send(self, request, **kwargs):
+        chiave = f"{request.method} {urlsplit(request.url).netloc}"
+        inizio = time.perf_counter()
+        status = None
+        try:
+            response = super().send(request, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            tempi_richieste.registra(chiave, time.perf_counter() - inizio, status)
+
+
+def crea_sessione(pool_size=HTTP_POOL_SIZE, max_retries=HTTP_MAX_RETRIES, backoff=HTTP_BACKOFF, rate_limiter=None):
+
+    retry = RetryConJitter(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=None,               #anche la POST del token è sicura da ripetere
+        respect_retry_after_header=True,
+        raise_on_status=False,              #dopo l'ultimo tentativo restituisce la risposta, non un'eccezione
+        rate_limiter=rate_limiter,
+    )
+    adapter = AdapterCronometrato(pool_connections=4, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)   #usato dai test che puntano a uno stub locale
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+http_session = crea_sessione(rate_limiter=opensky_rate_limiter)
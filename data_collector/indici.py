@@ -0,0 +1,174 @@
+import time
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from voli import ORDINE_VOLI, filtro_voli, pipeline_compattazione
+from logger import get_logger
+
+log = get_logger("data_collector.indici")
+
+# Indici di MongoDB dichiarati in un solo posto: all'avvio vengono creati quelli mancanti,
+# ricreati quelli cambiati ed eliminati quelli non più dichiarati (solo sulle collection qui sotto)
+
+INDICE_VOLI = "airport_firstSeen_id"  #usato come hint dalle query paginate sui voli
+
+INDICI = {
+    "flights": [
+        # snapshot di un aeroporto in ordine di tempo
+        {"name": "airport_timestamp", "keys": [("airport", ASCENDING), ("timestamp", DESCENDING)]},
+    ],
+    "flight_events": [
+        # un documento per volo
+        {"name": "airport_icao24_firstSeen", "keys": [("airport", ASCENDING), ("icao24", ASCENDING), ("firstSeen", ASCENDING)], "unique": True},
+        # get_voli_di_interesse_utente: filtro per airport, ordinamento per (firstSeen, _id) come voli.ORDINE_VOLI;
+        # senza _id nell'indice ogni pagina finirebbe in un SORT in memoria (limite di 100 MB)
+        {"name": INDICE_VOLI, "keys": [("airport", ASCENDING), ("firstSeen", DESCENDING), ("_id", DESCENDING)]},
+        # compatta_dati_vecchi: intervallo di firstSeen su tutti gli aeroporti (gli altri indici iniziano
+        # con airport e non servono per questo filtro, che finirebbe in un COLLSCAN)
+        {"name": "firstSeen", "keys": [("firstSeen", ASCENDING)]},
+    ],
+    "flight_rollups": [
+        # get_media_voli / get_conteggi_giornalieri: un documento per (airport, giorno)
+        {"name": "airport_day", "keys": [("airport", ASCENDING), ("day", ASCENDING)], "unique": True},
+    ],
+    "interests": [
+        # find/delete_many per utente (query coperta se si proietta solo airport) e niente interessi doppi
+        {"name": "user_airport", "keys": [("user", ASCENDING), ("airport", ASCENDING)], "unique": True},
+        # distinct("airport") del monitoraggio ciclico
+        {"name": "airport", "keys": [("airport", ASCENDING)]},
+    ],
+}
+
+
+def indici_con_retention(giorni_retention, indici=INDICI):
+
+    #aggiunge gli indici TTL: Mongo cancella da solo i dati grezzi più vecchi di 'giorni_retention'
+    secondi = int(giorni_retention * 86400)
+    completi = {nome: list(dichiarati) for nome, dichiarati in indici.items()}
+    completi["flights"].append({"name": "created_at_ttl", "keys": [("created_at", ASCENDING)], "expireAfterSeconds": secondi})
+    completi["flight_events"].append({"name": "seen_at_ttl", "keys": [("seen_at", ASCENDING)], "expireAfterSeconds": secondi})
+    return completi
+
+
+def _stessa_definizione(esistente, dichiarato):
+    return (
+        list(esistente["key"].items()) == list(dichiarato["keys"])
+        and bool(esistente.get("unique", False)) == bool(dichiarato.get("unique", False))
+        and esistente.get("expireAfterSeconds") == dichiarato.get("expireAfterSeconds")
+    )
+
+
+def riconcilia_indici(db, indici=INDICI):
+
+    for nome_collection, dichiarati in indici.items():
+        collection = db[nome_collection]
+        esistenti = {idx["name"]: idx for idx in collection.list_indexes()}
+        per_nome = {d["name"]: d for d in dichiarati}
+
+        #elimino gli indici non più dichiarati o con una definizione diversa
+        for nome, idx in list(esistenti.items()):
+            if nome == "_id_":
+                continue
+            if nome not in per_nome or not _stessa_definizione(idx, per_nome[nome]):
+                log.info("Elimino indice %s.%s", nome_collection, nome)
+                try:
+                    collection.drop_index(nome)
+                except OperationFailure as e:
+                    # con più worker un altro processo può averlo già eliminato
+                    log.warning("Impossibile eliminare %s.%s: %s", nome_collection, nome, e)
+                del esistenti[nome]
+
+        for dichiarato in dichiarati:
+            nome = dichiarato["name"]
+            if nome in esistenti:
+                continue
+            try:
+                opzioni = {"name": nome, "unique": dichiarato.get("unique", False)}
+                if "expireAfterSeconds" in dichiarato:
+                    opzioni["expireAfterSeconds"] = dichiarato["expireAfterSeconds"]
+                collection.create_index(dichiarato["keys"], **opzioni)
+                log.info("Creato indice %s.%s", nome_collection, nome)
+            except OperationFailure as e:
+                # es. dati duplicati che impediscono un indice unique: il servizio parte comunque
+                log.warning("Impossibile creare %s.%s: %s", nome_collection, nome, e)
+
+
+def _riassumi_piano(piano):
+
+    #riduce il piano vincente alla catena di stage, es. "FETCH <- IXSCAN(airport_firstSeen_id)"
+    stage = piano.get("stage", "?")
+    if piano.get("indexName"):
+        stage = f"{stage}({piano['indexName']})"
+    figli = piano.get("inputStage") and [piano["inputStage"]] or piano.get("inputStages", [])
+    if figli:
+        return stage + " <- " + ", ".join(_riassumi_piano(f) for f in figli)
+    return stage
+
+
+def _riassumi_explain(explain):
+
+    query_planner = explain.get("queryPlanner")
+    if query_planner is None and explain.get("stages"):
+        # aggregate: il piano è nel primo stage ($cursor)
+        query_planner = explain["stages"][0].get("$cursor", {}).get("queryPlanner", {})
+    query_planner = query_planner or {}
+
+    piano = query_planner.get("winningPlan", {})
+    piano = _riassumi_piano(piano.get("queryPlan", piano))  # queryPlan: formato del motore SBE
+    stats = explain.get("executionStats", {})
+    return {
+        "piano": piano,
+        "indice_usato": "IXSCAN" in piano or "DISTINCT_SCAN" in piano,
+        # uno stage SORT (non SORT_MERGE) vuol dire ordinamento bloccante in memoria
+        "sort_in_memoria": "SORT" in piano.replace("SORT_MERGE", "").replace("SORT_KEY_GENERATOR", ""),
+        "documenti_restituiti": stats.get("nReturned"),
+        "chiavi_esaminate": stats.get("totalKeysExamined"),
+        "documenti_esaminati": stats.get("totalDocsExamined"),
+    }
+
+
+def spiega_query_calde(db, airport, email, giorni=7):
+
+    #explain() delle query più frequenti del servizio, con gli stessi filtri usati dal codice
+    limite_tempo = time.time() - giorni * 86400
+    #gli aeroporti seguiti dall'utente, come in get_voli_di_interesse_utente ('airport' se non ne segue)
+    aeroporti = [d["airport"] for d in db.interests.find({"user": email}, {"_id": 0, "airport": 1})] or [airport]
+    comandi = {
+        "get_ultimo_volo": {
+            "find": "latest_flight", "filter": {"_id": airport},
+        },
+        "get_media_voli": {
+            "find": "flight_rollups",
+            "filter": {"airport": airport, "day": {"$gte": time.strftime("%Y-%m-%d", time.gmtime(limite_tempo))}},
+            "projection": {"_id": 0, "day": 1, "count": 1},
+        },
+        "interessi_utente": {
+            "find": "interests", "filter": {"user": email}, "projection": {"_id": 0, "airport": 1},
+        },
+        "voli_di_interesse_utente": {
+            "find": "flight_events", "filter": filtro_voli(aeroporti), "sort": dict(ORDINE_VOLI),
+            "hint": INDICE_VOLI, "limit": 101,  # prima pagina di default (100 voli + 1)
+        },
+        "compatta_dati_vecchi": {
+            # un giorno di voli su tutti gli aeroporti, come un giro di compattazione
+            "aggregate": "flight_events", "pipeline": pipeline_compattazione(limite_tempo - 86400, limite_tempo),
+            "cursor": {}, "allowDiskUse": True,
+        },
+        "aeroporti_monitorati": {
+            "distinct": "interests", "key": "airport",
+        },
+        "rimuovi_interessi_utente": {
+            "delete": "interests", "deletes": [{"q": {"user": email}, "limit": 0}],
+        },
+        "rimuovi_interessi_utenti": {
+            "delete": "interests", "deletes": [{"q": {"user": {"$in": [email]}}, "limit": 0}],
+        },
+    }
+
+    risultati = {}
+    for nome, comando in comandi.items():
+        try:
+            explain = db.command("explain", comando, verbosity="executionStats")
+            risultati[nome] = _riassumi_explain(explain)
+        except OperationFailure as e:
+            risultati[nome] = {"errore": str(e)}
+    return risultati
@@ -0,0 +1,112 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging dei servizi (stesso modulo nei due servizi, come metriche.py): i thread delle richieste mettono
+# solo il record in una coda, la formattazione e la scrittura su stdout le fa un thread dedicato.
+# LOG_LEVEL sceglie il livello (i dump dei payload sono a DEBUG), LOG_FORMAT json|testo il formato,
+# LOG_CAMPIONAMENTO=N tiene una riga ogni N tra quelle ad alto volume (log.info(..., extra=CAMPIONA)).
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_CAMPIONAMENTO = int(os.getenv("LOG_CAMPIONAMENTO", "100"))
+
+#da passare come extra alle righe scritte per ogni richiesta: ne arriva su stdout una ogni LOG_CAMPIONAMENTO
+CAMPIONA = {"campiona": True}
+
+
+class FormatterJson(logging.Formatter):
+
+    #una riga JSON per record
+    def format(self, record):
+        voce = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "livello": record.levelname,
+            "logger": record.name,
+            "messaggio": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        if getattr(record, "campionamento", None):
+            voce["campionamento"] = record.campionamento
+        if record.exc_info:
+            voce["eccezione"] = self.formatException(record.exc_info)
+        return json.dumps(voce, ensure_ascii=False, default=str)
+
+
+class FiltroCampionamento(logging.Filter):
+    def __init__(self, ogni=LOG_CAMPIONAMENTO):
+
+        #conta le righe per messaggio (il template, non il testo finale) e lascia passare la prima di ogni N;
+        #warning ed errori passano sempre
+        super().__init__()
+        self.ogni = ogni
+        self.contatori = {}
+
+    def filter(self, record):
+        if self.ogni <= 1 or record.levelno >= logging.WARNING or not getattr(record, "campiona", False):
+            return True
+        contatore = self.contatori.get(record.msg)
+        if contatore is None:
+            contatore = self.contatori.setdefault(record.msg, itertools.count())
+        if next(contatore) % self.ogni:
+            return False
+        record.campionamento = self.ogni
+        return True
+
+
+class HandlerCoda(QueueHandler):
+
+    #QueueHandler di base formatta il messaggio nel thread che scrive il log: qui il record passa così
+    #com'è e la formattazione avviene nel thread del listener (gli argomenti non vanno modificati dopo il log)
+    def prepare(self, record):
+        return record
+
+
+_lock = threading.Lock()
+_pid = None
+_listener = None
+
+
+def configura():
+
+    #una coda e un thread di scrittura per processo: dopo un fork (worker gunicorn, pool di processi)
+    #il thread del padre non esiste più, quindi si riconfigura
+    global _pid, _listener
+    with _lock:
+        if _pid == os.getpid():
+            return
+
+        uscita = logging.StreamHandler(sys.stdout)
+        if LOG_FORMAT == "json":
+            uscita.setFormatter(FormatterJson())
+        else:
+            uscita.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+
+        coda = queue.SimpleQueue()
+        handler = HandlerCoda(coda)
+        handler.addFilter(FiltroCampionamento())
+
+        radice = logging.getLogger()
+        for vecchio in [h for h in radice.handlers if isinstance(h, HandlerCoda)]:
+            radice.removeHandler(vecchio)
+        radice.addHandler(handler)
+        radice.setLevel(LOG_LEVEL)
+
+        _listener = QueueListener(coda, uscita)
+        _listener.start()
+        #alla chiusura del processo il listener scrive quello che è rimasto in coda
+        atexit.register(_listener.stop)
+        _pid = os.getpid()
+
+
+def get_logger(nome):
+    configura()
+    return logging.getLogger(nome)
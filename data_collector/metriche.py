@@ -0,0 +1,203 @@
+import functools
+import os
+import time
+import grpc
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+# Metriche in formato Prometheus, esposte su /metrics (stesso modulo nei due servizi, come grpc_channels.py).
+# Con server.py girano più processi: se PROMETHEUS_MULTIPROC_DIR è impostata (lo fa server.py prima di
+# creare i processi) ogni processo scrive i suoi valori in quella cartella e /metrics li somma tutti.
+# Ogni misura costa qualche microsecondo (un perf_counter e un observe): trascurabile rispetto ai
+# millisecondi di una richiesta HTTP o di una query.
+
+#bucket in secondi: dal microsecondo delle cache ai secondi dei download da OpenSky
+BUCKET_LATENZA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+DURATA_HTTP = Histogram(
+    "http_request_duration_seconds", "Durata delle richieste REST per route",
+    ["route", "metodo", "status"], buckets=BUCKET_LATENZA)
+DURATA_GRPC = Histogram(
+    "grpc_server_duration_seconds", "Durata delle chiamate gRPC ricevute per metodo",
+    ["metodo"], buckets=BUCKET_LATENZA)
+DURATA_DB = Histogram(
+    "db_operation_duration_seconds", "Durata delle operazioni su Postgres e Mongo",
+    ["db", "operazione"], buckets=BUCKET_LATENZA)
+DURATA_CICLO = Histogram(
+    "background_cycle_duration_seconds", "Durata dei cicli dei thread in background",
+    ["ciclo"], buckets=BUCKET_LATENZA + (60, 300, 600))
+DURATA_OPERAZIONE = Histogram(
+    "operation_duration_seconds", "Durata delle operazioni misurate con cronometra()",
+    ["operazione"], buckets=BUCKET_LATENZA)
+DURATA_OPENSKY = Histogram(
+    "opensky_fetch_duration_seconds", "Durata dei download da OpenSky per esito",
+    ["esito"], buckets=BUCKET_LATENZA)
+#un'etichetta per aeroporto: sono solo quelli monitorati, qualche decina
+DURATA_AEROPORTO = Histogram(
+    "airport_download_duration_seconds", "Durata del download (fetch) e del download con salvataggio (totale) per aeroporto",
+    ["airport", "fase"], buckets=BUCKET_LATENZA + (60,))
+RICHIESTE_CACHE = Counter(
+    "cache_requests_total", "Letture dalle cache in memoria (hit ratio = hit / totale)",
+    ["cache", "esito"])
+FALLBACK_MOCK = Counter(
+    "opensky_mock_fallback_total", "Download da OpenSky falliti e sostituiti con dati mock")
+VOLI_COMPATTATI = Counter(
+    "compaction_flights_total", "Voli grezzi consolidati nei rollup giornalieri dalla compattazione")
+DOCUMENTI_ELIMINATI = Counter(
+    "compaction_deleted_documents_total", "Documenti grezzi senza campo Date cancellati dalla compattazione")
+#collStats di Mongo: stessi valori per tutti i processi, in multiprocesso vale l'ultimo letto
+DIMENSIONE_COLLECTION = Gauge(
+    "mongo_collection_bytes", "Byte occupati da una collection per tipo (dati, storage, indici)",
+    ["collection", "tipo"], multiprocess_mode="mostrecent")
+DOCUMENTI_COLLECTION = Gauge(
+    "mongo_collection_documents", "Documenti in una collection",
+    ["collection"], multiprocess_mode="mostrecent")
+
+
+class Cronometro:
+
+    #misura il tempo di un blocco (with) o di ogni chiamata di una funzione (decoratore) su una serie
+    #già risolta: nessun lookup delle etichette nel percorso caldo
+    __slots__ = ("serie", "inizio")
+
+    def __init__(self, serie):
+        self.serie = serie
+
+    def __enter__(self):
+        self.inizio = time.perf_counter()
+        return self
+
+    def __exit__(self, *eccezione):
+        #il tempo viene registrato anche se il blocco ha sollevato un'eccezione
+        self.serie.observe(time.perf_counter() - self.inizio)
+        return False
+
+    def __call__(self, funzione):
+        serie = self.serie
+
+        @functools.wraps(funzione)
+        def misurata(*args, **kwargs):
+            inizio = time.perf_counter()
+            try:
+                return funzione(*args, **kwargs)
+            finally:
+                serie.observe(time.perf_counter() - inizio)
+        return misurata
+
+
+_serie = {}
+
+
+def serie(metrica, **etichette):
+
+    #.labels() costa qualche microsecondo: le serie già usate si prendono da un dizionario
+    chiave = (metrica, tuple(etichette.items()))
+    risultato = _serie.get(chiave)
+    if risultato is None:
+        risultato = _serie.setdefault(chiave, metrica.labels(**etichette))
+    return risultato
+
+
+def misura(metrica, **etichette):
+    #with misura(DURATA_DB, db="mongo", operazione="salva_voli): ...  oppure come decoratore:
+    #@misura(DURATA_CICLO, ciclo="outbox"). Ogni with vuole un oggetto nuovo (non riusare lo stesso tra thread)
+    return Cronometro(serie(metrica, **etichette))
+
+
+def cronometra(operazione):
+    #scorciatoia per i nuovi punti caldi: @cronometra("hash_password") o with cronometra("..."):
+    return misura(DURATA_OPERAZIONE, operazione=operazione)
+
+
+def tempo_db(db, operazione):
+    return misura(DURATA_DB, db=db, operazione=operazione)
+
+
+def tempo_ciclo(ciclo):
+    return misura(DURATA_CICLO, ciclo=ciclo)
+
+
+def conta_cache(cache, hit):
+    serie(RICHIESTE_CACHE, cache=cache, esito="hit" if hit else "miss").inc()
+
+
+def registra_download(airport, fetch, totale):
+    serie(DURATA_AEROPORTO, airport=airport, fase="fetch").observe(fetch)
+    serie(DURATA_AEROPORTO, airport=airport, fase="totale").observe(totale)
+
+
+def registra_compattazione(voli, eliminati):
+    #throughput = rate(compaction_flights_total) / rate(background_cycle_duration_seconds_sum{ciclo="compattazione"})
+    VOLI_COMPATTATI.inc(voli)
+    DOCUMENTI_ELIMINATI.inc(eliminati)
+
+
+def registra_storage(collections):
+    #collections = {nome: {"documenti": n, "dimensione_dati": byte, ...}} come in get_statistiche_storage
+    for nome, stats in collections.items():
+        serie(DOCUMENTI_COLLECTION, collection=nome).set(stats.get("documenti", 0))
+        for tipo in ("dati", "storage", "indici"):
+            serie(DIMENSIONE_COLLECTION, collection=nome, tipo=tipo).set(stats.get(f"dimensione_{tipo}", 0))
+
+
+def risposta_metriche():
+
+    #testo da restituire su /metrics: in multiprocesso si legge la cartella condivisa, non il registro locale
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro)
+
+
+def registra_flask(app):
+
+    #latenza di ogni richiesta per route (la regola, es. /interests/status/<airport>, non il path reale,
+    #così il numero di serie resta limitato) e la route /metrics
+    serie_route = {}
+
+    @app.before_request
+    def _inizio_richiesta():
+        g.inizio_richiesta = time.perf_counter()
+
+    @app.after_request
+    def _fine_richiesta(response):
+        inizio = g.pop("inizio_richiesta", None)
+        if inizio is not None:
+            regola = request.url_rule
+            chiave = (regola.rule if regola is not None else "non_trovata", request.method, response.status_code)
+            serie_http = serie_route.get(chiave)
+            if serie_http is None:
+                serie_http = serie_route.setdefault(chiave, DURATA_HTTP.labels(
+                    route=chiave[0], metodo=chiave[1], status=str(chiave[2])))
+            serie_http.observe(time.perf_counter() - inizio)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        return Response(risposta_metriche(), mimetype=CONTENT_TYPE_LATEST)
+
+
+class InterceptorMetriche(grpc.ServerInterceptor):
+
+    #misura la durata di ogni metodo gRPC ricevuto (per gli stream fino all'ultimo messaggio inviato)
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        serie_grpc = serie(DURATA_GRPC, metodo=handler_call_details.method)
+
+        if handler.unary_unary is not None:
+            return handler._replace(unary_unary=Cronometro(serie_grpc)(handler.unary_unary))
+
+        if handler.unary_stream is not None:
+            funzione = handler.unary_stream
+
+            def unary_stream(request, context):
+                with Cronometro(serie_grpc):
+                    yield from funzione(request, context)
+            return handler._replace(unary_stream=unary_stream)
+
+        return handler
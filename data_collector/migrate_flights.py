@@ -0,0 +1,11 @@
+from database_mongo import mongo_db
+
+# Migrazione una tantum dei vecchi snapshot in flight_events (un documento per volo).
+# Si può rilanciare senza problemi: gli upsert non creano duplicati e gli snapshot già migrati
+# non hanno più il campo 'data'.
+# Uso (dentro il container): python migrate_flights.py
+
+if __name__ == '__main__':
+    mongo_db.migra_flights_a_flight_events()
+    # i contatori giornalieri di /flights/average vengono ricalcolati da flight_events
+    mongo_db.ricostruisci_rollup()
@@ -0,0 +1,154 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+import httpx
+from fetcher import FETCH_CONCURRENCY, OPENSKY_RATE_LIMIT, OPENSKY_RATE_BURST
+from http_client import TempiRichieste, HTTP_MAX_RETRIES, HTTP_BACKOFF, HTTP_RETRY_AFTER_MAX
+from opensky_auth import OPENSKY_CLIENT_ID, OPENSKY_CLIENT_SECRET, AUTH_URL, MARGINE_SCADENZA
+from logger import get_logger, CAMPIONA
+
+log = get_logger("data_collector.opensky_async")
+
+# Client OpenSky per app_async.py: stessa logica di http_client.py / opensky_auth.py / fetcher.py
+# (keep-alive, retry con jitter e Retry-After, token in cache con single-flight, rate limit)
+# ma con httpx.AsyncClient e primitive asyncio al posto dei thread
+
+STATUS_DA_RIPROVARE = {429, 500, 502, 503, 504}
+
+
+class AsyncRateLimiter:
+    def __init__(self, rate=OPENSKY_RATE_LIMIT, burst=OPENSKY_RATE_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.gettoni = float(self.burst)
+        self.ultimo = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.gettoni = min(self.burst, self.gettoni + (now - self.ultimo) * self.rate)
+                self.ultimo = now
+                if self.gettoni >= 1:
+                    self.gettoni -= 1
+                    return
+                await asyncio.sleep((1 - self.gettoni) / self.rate)
+
+
+class AsyncHttpClient:
+    def __init__(self, pool_size=FETCH_CONCURRENCY, rate_limiter=None):
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+        self.tempi = TempiRichieste()
+        #come RetryConJitter: ogni retry prende un gettone dal rate limiter verso OpenSky
+        self.rate_limiter = rate_limiter
+
+    def _attesa(self, tentativo, response):
+        #Retry-After se il server lo indica, altrimenti backoff esponenziale con jitter
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), HTTP_RETRY_AFTER_MAX)
+        backoff = HTTP_BACKOFF * (2 ** tentativo)
+        return random.uniform(backoff / 2, backoff)
+
+    async def request(self, method, url, **kwargs):
+        chiave = f"{method} {urlsplit(url).netloc}"
+        inizio = time.perf_counter()
+        response = None
+        try:
+            for tentativo in range(HTTP_MAX_RETRIES + 1):
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                    if response.status_code not in STATUS_DA_RIPROVARE or tentativo == HTTP_MAX_RETRIES:
+                        return response
+                except httpx.TransportError:
+                    if tentativo == HTTP_MAX_RETRIES:
+                        raise
+                    response = None
+                await asyncio.sleep(self._attesa(tentativo, response))
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire()
+            return response
+        finally:
+            self.tempi.registra(chiave, time.perf_counter() - inizio, response.status_code if response is not None else None)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class AsyncTokenProvider:
+    def __init__(self, http, client_id=OPENSKY_CLIENT_ID, client_secret=OPENSKY_CLIENT_SECRET,
+                 auth_url=AUTH_URL, margine=MARGINE_SCADENZA):
+        self.http = http
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.auth_url = auth_url
+        self.margine = margine
+
+        self.token = None
+        self.scadenza = 0
+        #future del rinnovo in corso: le coroutine che arrivano durante un rinnovo aspettano quello
+        self.rinnovo_in_corso = None
+
+    async def get_token(self):
+
+        if not (self.client_id and self.client_secret):
+            log.info("Client ID o Secret mancanti.", extra=CAMPIONA)
+            return None
+
+        if self.token is not None and time.time() < self.scadenza - self.margine:
+            return self.token
+
+        await self.rinnova()
+
+        #se il rinnovo è fallito uso il token vecchio finché non è davvero scaduto
+        if self.token is not None and time.time() < self.scadenza:
+            return self.token
+        return None
+
+    async def rinnova(self):
+
+        #una sola POST anche se più coroutine chiedono il token insieme
+        if self.rinnovo_in_corso is None:
+            self.rinnovo_in_corso = asyncio.ensure_future(self._richiedi_token())
+            self.rinnovo_in_corso.add_done_callback(self._fine_rinnovo)
+        await asyncio.shield(self.rinnovo_in_corso)
+
+    def _fine_rinnovo(self, futuro):
+        if self.rinnovo_in_corso is futuro:
+            self.rinnovo_in_corso = None
+
+    async def _richiedi_token(self):
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        }
+        try:
+            r = await self.http.request("POST", self.auth_url, data=payload, timeout=5)
+            if r.status_code == 200:
+                dati = r.json()
+                self.token = dati.get("access_token")
+                self.scadenza = time.time() + int(dati.get("expires_in", 300))
+                log.info("Token OpenSky rinnovato, valido per %s secondi", dati.get('expires_in'))
+            else:
+                log.warning("Autenticazione OpenSky fallita, status %d: %s", r.status_code, r.text)
+        except Exception as e:
+            log.warning("Errore nell'autenticazione OpenSky: %s", e)
+
+    async def loop_refresh(self):
+
+        #rinnovo anticipato, come TokenProvider.avvia_refresh_automatico ma come task asyncio
+        if not (self.client_id and self.client_secret):
+            return
+        while True:
+            attesa = self.scadenza - 2 * self.margine - time.time() if self.token else 0
+            if attesa <= 0:
+                await self.rinnova()
+                #se il rinnovo è fallito riprovo tra poco
+                attesa = self.scadenza - 2 * self.margine - time.time() if self.token else 30
+                attesa = max(attesa, 30)
+            await asyncio.sleep(attesa)
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from http_client import http_session
+from logger import get_logger, CAMPIONA
+
+log = get_logger("data_collector.opensky_auth")
+
+# Token OAuth2 di OpenSky condiviso da tutto il processo: viene tenuto in memoria fino a poco
+# prima della scadenza (expires_in), rinnovato in background e, se più thread lo chiedono
+# insieme mentre è scaduto, viene fatta una sola POST (single-flight)
+
+OPENSKY_CLIENT_ID = os.getenv("OPENSKY_CLIENT_ID")
+OPENSKY_CLIENT_SECRET = os.getenv("OPENSKY_CLIENT_SECRET")
+AUTH_URL = os.getenv(
+    "OPENSKY_AUTH_URL",
+    "https://auth.opensky-network.org/auth/realms/opensky-network/protocol/openid-connect/token"
+)
+MARGINE_SCADENZA = int(os.getenv("OPENSKY_TOKEN_MARGIN", "60"))  #secondi prima della scadenza in cui il token è considerato vecchio
+
+
+class TokenProvider:
+    def __init__(self, client_id, client_secret, auth_url, margine=MARGINE_SCADENZA):
+
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.auth_url = auth_url
+        self.margine = margine
+
+        self.token = None
+        self.scadenza = 0
+        #evento del rinnovo in corso: chi arriva durante un rinnovo aspetta quello invece di farne un altro
+        self.rinnovo_in_corso = None
+        self.lock = threading.Lock()
+        self.thread_refresh = None
+
+    def credenziali_presenti(self):
+        return bool(self.client_id and self.client_secret)
+
+    def _valido(self, now):
+        return self.token is not None and now < self.scadenza - self.margine
+
+    def get_token(self):
+
+        if not self.credenziali_presenti():
+            log.info("Client ID o Secret mancanti.", extra=CAMPIONA)
+            return None
+
+        with self.lock:
+            if self._valido(time.time()):
+                return self.token
+
+        self.rinnova()
+
+        with self.lock:
+            #se il rinnovo è fallito uso il token vecchio finché non è davvero scaduto
+            if self.token is not None and time.time() < self.scadenza:
+                return self.token
+            return None
+
+    def rinnova(self):
+
+        with self.lock:
+            evento = self.rinnovo_in_corso
+            if evento is None:
+                evento = threading.Event()
+                self.rinnovo_in_corso = evento
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            #un altro thread sta già facendo la POST: aspetto il suo risultato
+            evento.wait(timeout=10)
+            return
+
+        try:
+            self._richiedi_token()
+        finally:
+            with self.lock:
+                self.rinnovo_in_corso = None
+            evento.set()
+
+    def _richiedi_token(self):
+
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        }
+
+        try:
+            # Facciamo una POST all'URL di autenticazione di OPENSKY
+            r = http_session.post(self.auth_url, data=payload, timeout=5)
+            if r.status_code == 200:
+                dati = r.json()
+                with self.lock:
+                    self.token = dati.get("access_token")
+                    self.scadenza = time.time() + int(dati.get("expires_in", 300))
+                log.info("Token OpenSky rinnovato, valido per %s secondi", dati.get('expires_in'))
+            else:
+                log.warning("Autenticazione OpenSky fallita, status %d: %s", r.status_code, r.text)
+        except Exception as e:
+            log.warning("Errore nell'autenticazione OpenSky: %s", e)
+
+    def avvia_refresh_automatico(self):
+
+        #rinnova il token in anticipo, così le richieste non aspettano quasi mai la POST
+        if not self.credenziali_presenti() or self.thread_refresh is not None:
+            return
+        self.thread_refresh = threading.Thread(target=self._loop_refresh, daemon=True)
+        self.thread_refresh.start()
+
+    def _loop_refresh(self):
+        while True:
+            with self.lock:
+                attesa = self.scadenza - 2 * self.margine - time.time() if self.token else 0
+
+            if attesa <= 0:
+                self.rinnova()
+                with self.lock:
+                    #se il rinnovo è fallito riprovo tra poco
+                    attesa = self.scadenza - 2 * self.margine - time.time() if self.token else 30
+                attesa = max(attesa, 30)
+
+            time.sleep(attesa)
+
+
+token_provider = TokenProvider(OPENSKY_CLIENT_ID, OPENSKY_CLIENT_SECRET, AUTH_URL)
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import tempfile
+from gunicorn.app.base import BaseApplication
+from logger import get_logger
+
+# Avvio di produzione del Data Collector (al posto di "python app.py", che resta per lo sviluppo):
+# - le API REST girano in gunicorn con HTTP_WORKERS processi, ognuno con HTTP_THREADS thread
+# - il server gRPC gira in GRPC_PROCESSES processi separati sulla stessa porta (SO_REUSEPORT)
+# - monitoraggio ciclico e compattazione partono in ogni worker ma lavorano solo nel worker
+#   che tiene il lease "monitoraggio" su Mongo (elezione.py), quindi gli aeroporti non vengono scaricati due volte
+
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "4"))
+HTTP_THREADS = int(os.getenv("HTTP_THREADS", "8"))
+GRPC_PROCESSES = int(os.getenv("GRPC_PROCESSES", "1"))
+GRPC_THREADS = int(os.getenv("GRPC_THREADS", "10"))
+PORTA_HTTP = int(os.getenv("PORT", "5001"))
+
+log = get_logger("data_collector.server")
+
+
+def prepara_metriche():
+    #tutti i processi (worker gunicorn e processi gRPC) scrivono le metriche nella stessa cartella e /metrics
+    #le somma: la variabile va impostata prima che un processo importi prometheus_client (metriche.py)
+    cartella = os.getenv("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="metriche-")
+    os.makedirs(cartella, exist_ok=True)
+    for nome in os.listdir(cartella):
+        if nome.endswith(".db"):
+            os.remove(os.path.join(cartella, nome))  #valori di un avvio precedente
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = cartella
+
+
+def processo_grpc():
+    #app viene importato qui, nel processo figlio: nessun thread in background, solo DeleteData
+    import app
+    app.start_grpc_server(GRPC_THREADS)
+
+
+def post_worker_init(worker):
+    #hook di gunicorn: il worker ha già caricato app, avvio i suoi thread in background
+    import app
+    app.avvia_thread_background()
+
+
+def worker_exit(server, worker):
+    #lascio subito il lease, così un altro worker riprende il monitoraggio senza aspettare la scadenza
+    import app
+    app.lease_monitoraggio.rilascia()
+
+
+class ServerHTTP(BaseApplication):
+    def __init__(self, opzioni):
+        self.opzioni = opzioni
+        super().__init__()
+
+    def load_config(self):
+        for chiave, valore in self.opzioni.items():
+            self.cfg.set(chiave, valore)
+
+    def load(self):
+        #senza preload ogni worker importa app dopo il fork e apre le proprie connessioni
+        from app import app
+        return app
+
+
+if __name__ == '__main__':
+    prepara_metriche()
+
+    #spawn e non fork: gRPC non supporta il fork di un processo che lo ha già inizializzato
+    contesto = multiprocessing.get_context("spawn")
+    for i in range(GRPC_PROCESSES):
+        contesto.Process(target=processo_grpc, name=f"grpc-{i}", daemon=True).start()
+    log.info("Data Collector gRPC: %d processi sulla porta 50052", GRPC_PROCESSES)
+
+    ServerHTTP({
+        "bind": f"0.0.0.0:{PORTA_HTTP}",
+        "workers": HTTP_WORKERS,
+        "threads": HTTP_THREADS,
+        "worker_class": "gthread",
+        "preload_app": False,
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit,
+    }).run()
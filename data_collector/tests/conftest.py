@@ -0,0 +1,6 @@
+import os
+import sys
+
+# i moduli del servizio si importano come in app.py (import cache, import hashing...): la cartella
+# del servizio va nel path. Si lancia dalla cartella del servizio:  python -m pytest tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
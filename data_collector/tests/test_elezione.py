@@ -0,0 +1,100 @@
+import pytest
+import elezione
+from elezione import Lease
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class Orologio:
+    #sostituisce time.time nel modulo elezione: il tempo avanza solo quando lo decide il test
+    def __init__(self, adesso=1000.0):
+        self.adesso = adesso
+
+    def __call__(self):
+        return self.adesso
+
+    def avanza(self, secondi):
+        self.adesso += secondi
+
+
+@pytest.fixture
+def orologio(monkeypatch):
+    orologio = Orologio()
+    monkeypatch.setattr(elezione.time, "time", orologio)
+    return orologio
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def lease(db, ttl=30):
+    return Lease(lambda: db, "monitoraggio", ttl=ttl)
+
+
+def test_un_solo_leader(db, orologio):
+    primo, secondo = lease(db), lease(db)
+
+    assert primo.prova_ad_acquisire() is True
+    assert secondo.prova_ad_acquisire() is False
+    assert primo.e_leader() and not secondo.e_leader()
+    assert db.leases.find_one({"_id": "monitoraggio"})["owner"] == primo.owner
+
+
+def test_rinnovo_sposta_la_scadenza(db, orologio):
+    primo, secondo = lease(db), lease(db)
+    primo.prova_ad_acquisire()
+
+    orologio.avanza(20)
+    assert primo.prova_ad_acquisire() is True
+    orologio.avanza(20)   #40 secondi dalla prima acquisizione, 20 dal rinnovo
+    assert primo.e_leader()
+    assert secondo.prova_ad_acquisire() is False
+
+
+def test_lease_scaduto_passa_a_un_altro(db, orologio):
+    primo, secondo = lease(db), lease(db)
+    primo.prova_ad_acquisire()
+
+    #il primo smette di rinnovare (processo bloccato o morto)
+    orologio.avanza(31)
+    assert not primo.e_leader()
+    assert secondo.prova_ad_acquisire() is True
+
+    #il vecchio leader si accorge di averlo perso al rinnovo successivo
+    assert primo.prova_ad_acquisire() is False
+    assert not primo.e_leader() and secondo.e_leader()
+
+
+def test_rilascia_libera_subito_il_lease(db, orologio):
+    primo, secondo = lease(db), lease(db)
+    primo.prova_ad_acquisire()
+    primo.rilascia()
+
+    assert not primo.e_leader()
+    assert secondo.prova_ad_acquisire() is True
+
+
+def test_rilascia_di_chi_non_e_leader_non_tocca_il_lease(db, orologio):
+    primo, secondo = lease(db), lease(db)
+    primo.prova_ad_acquisire()
+    secondo.prova_ad_acquisire()
+    secondo.rilascia()
+
+    assert db.leases.find_one({"_id": "monitoraggio"})["owner"] == primo.owner
+
+
+def test_senza_database_non_si_e_leader(orologio):
+    senza_db = Lease(lambda: None, "monitoraggio")
+    assert senza_db.prova_ad_acquisire() is False
+    assert not senza_db.e_leader()
+
+
+def test_lease_con_nomi_diversi_sono_indipendenti(db, orologio):
+    monitoraggio = Lease(lambda: db, "monitoraggio")
+    secondo_lavoro = Lease(lambda: db, "altro_lavoro")
+    concorrente = Lease(lambda: db, "altro_lavoro")
+
+    assert monitoraggio.prova_ad_acquisire() and secondo_lavoro.prova_ad_acquisire()
+    assert not concorrente.prova_ad_acquisire()
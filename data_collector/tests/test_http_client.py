@@ -0,0 +1,47 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from http_client import crea_sessione
+
+
+class LimiterFinto:
+    #conta i gettoni presi senza mai aspettare
+    def __init__(self):
+        self.gettoni = 0
+
+    def acquire(self):
+        self.gettoni += 1
+
+
+@pytest.fixture
+def opensky_finto():
+    #risponde 503 alle prime due richieste e 200 alle successive
+    richieste = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            richieste.append(self.path)
+            self.send_response(503 if len(richieste) <= 2 else 200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"[]")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", richieste
+    server.shutdown()
+
+
+def test_ogni_retry_prende_un_gettone(opensky_finto):
+    url, richieste = opensky_finto
+    limiter = LimiterFinto()
+    session = crea_sessione(max_retries=3, backoff=0, rate_limiter=limiter)
+
+    assert session.get(f"{url}/flights/departure", timeout=5).status_code == 200
+    #la prima richiesta la paga chi chiama (FetcherConcorrente), i due retry la sessione
+    assert len(richieste) == 3
+    assert limiter.gettoni == 2
+
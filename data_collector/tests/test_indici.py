@@ -0,0 +1,133 @@
+import pytest
+from pymongo import ASCENDING
+from indici import INDICI, INDICE_VOLI, _riassumi_explain, indici_con_retention, riconcilia_indici
+from voli import pipeline_compattazione
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def nomi(collection):
+    return sorted(idx["name"] for idx in collection.list_indexes())
+
+
+# --- riconcilia_indici ---
+
+def test_crea_gli_indici_dichiarati(db):
+    riconcilia_indici(db)
+
+    for nome_collection, dichiarati in INDICI.items():
+        assert nomi(db[nome_collection]) == sorted(["_id_"] + [d["name"] for d in dichiarati])
+    esistenti = {idx["name"]: idx for idx in db.flight_events.list_indexes()}
+    assert list(esistenti[INDICE_VOLI]["key"].items()) == [("airport", 1), ("firstSeen", -1), ("_id", -1)]
+    assert esistenti["airport_icao24_firstSeen"]["unique"] is True
+
+
+def test_seconda_esecuzione_non_tocca_niente(db, monkeypatch):
+    riconcilia_indici(db)
+
+    def vietato(*args, **kwargs):
+        raise AssertionError("nessun indice da toccare")
+    monkeypatch.setattr(mongomock.collection.Collection, "create_index", vietato)
+    monkeypatch.setattr(mongomock.collection.Collection, "drop_index", vietato)
+    riconcilia_indici(db)
+
+
+def test_elimina_gli_indici_non_dichiarati(db):
+    db.interests.create_index([("vecchio", ASCENDING)], name="vecchio")
+    riconcilia_indici(db)
+
+    assert "vecchio" not in nomi(db.interests)
+    assert "_id_" in nomi(db.interests)
+
+
+def test_ricrea_gli_indici_con_definizione_diversa(db):
+    #stesso nome, ma senza unique e con le chiavi in un altro ordine
+    db.interests.create_index([("airport", ASCENDING), ("user", ASCENDING)], name="user_airport")
+    riconcilia_indici(db)
+
+    idx = {i["name"]: i for i in db.interests.list_indexes()}["user_airport"]
+    assert list(idx["key"].items()) == [("user", 1), ("airport", 1)]
+    assert idx["unique"] is True
+
+
+def test_ttl_aggiunto_e_poi_cambiato(db):
+    riconcilia_indici(db, indici_con_retention(30))
+    ttl = {i["name"]: i for i in db.flight_events.list_indexes()}["seen_at_ttl"]
+    assert ttl["expireAfterSeconds"] == 30 * 86400
+
+    riconcilia_indici(db, indici_con_retention(7))
+    ttl = {i["name"]: i for i in db.flight_events.list_indexes()}["seen_at_ttl"]
+    assert ttl["expireAfterSeconds"] == 7 * 86400
+
+    #retention disattivata: l'indice TTL sparisce, i dati restano
+    riconcilia_indici(db)
+    assert "seen_at_ttl" not in nomi(db.flight_events)
+
+
+def test_indici_con_retention_non_modifica_la_dichiarazione():
+    completi = indici_con_retention(1)
+    assert "created_at_ttl" in [d["name"] for d in completi["flights"]]
+    assert "created_at_ttl" not in [d["name"] for d in INDICI["flights"]]
+
+
+def test_indice_unique_impossibile_non_blocca_gli_altri(db):
+    #dati duplicati: l'indice unique non si può creare, gli altri sì e il servizio parte
+    db.interests.insert_many([{"user": "a@example.com", "airport": "LIRF"} for _ in range(2)])
+    riconcilia_indici(db)
+
+    assert "user_airport" not in nomi(db.interests)
+    assert "airport" in nomi(db.interests)
+
+
+# --- riassunto degli explain ---
+
+def test_riassumi_explain_indice_e_sort_merge():
+    explain = {
+        "queryPlanner": {"winningPlan": {
+            "stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "SORT_MERGE", "inputStages": [
+                {"stage": "IXSCAN", "indexName": INDICE_VOLI},
+                {"stage": "IXSCAN", "indexName": INDICE_VOLI},
+            ]}},
+        }},
+        "executionStats": {"nReturned": 101, "totalKeysExamined": 101, "totalDocsExamined": 101},
+    }
+    riassunto = _riassumi_explain(explain)
+
+    assert riassunto["piano"] == (f"LIMIT <- FETCH <- SORT_MERGE <- IXSCAN({INDICE_VOLI}), IXSCAN({INDICE_VOLI})")
+    assert riassunto["indice_usato"] is True
+    assert riassunto["sort_in_memoria"] is False
+    assert (riassunto["documenti_restituiti"], riassunto["chiavi_esaminate"], riassunto["documenti_esaminati"]) == (101, 101, 101)
+
+
+def test_riassumi_explain_sort_in_memoria_e_collscan():
+    explain = {"queryPlanner": {"winningPlan": {
+        "stage": "SORT", "inputStage": {"stage": "SORT_KEY_GENERATOR", "inputStage": {"stage": "COLLSCAN"}},
+    }}}
+    riassunto = _riassumi_explain(explain)
+
+    assert riassunto["piano"] == "SORT <- SORT_KEY_GENERATOR <- COLLSCAN"
+    assert riassunto["indice_usato"] is False
+    assert riassunto["sort_in_memoria"] is True
+    assert riassunto["documenti_restituiti"] is None
+
+
+def test_riassumi_explain_motore_sbe_e_aggregate():
+    sbe = {"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "airport_day"}}}}}
+    assert _riassumi_explain(sbe)["piano"] == "FETCH <- IXSCAN(airport_day)"
+
+    aggregate = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "DISTINCT_SCAN", "indexName": "airport"}}}}]}
+    riassunto = _riassumi_explain(aggregate)
+    assert riassunto["piano"] == "DISTINCT_SCAN(airport)"
+    assert riassunto["indice_usato"] is True
+
+
+def test_compattazione_ha_un_indice_che_inizia_con_firstseen():
+    #il $match della compattazione filtra solo su firstSeen: serve un indice con firstSeen come prima chiave
+    [match] = [fase["$match"] for fase in pipeline_compattazione(0, 86400) if "$match" in fase]
+    assert set(match) == {"firstSeen"}
+    assert any(d["keys"][0][0] == "firstSeen" for d in INDICI["flight_events"])
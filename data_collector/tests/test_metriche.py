@@ -0,0 +1,40 @@
+from prometheus_client import REGISTRY
+from metriche import registra_compattazione, registra_download, registra_storage
+
+
+def valore(nome, **etichette):
+    return REGISTRY.get_sample_value(nome, etichette) or 0
+
+
+def test_registra_compattazione_accumula():
+    voli, eliminati = valore("compaction_flights_total"), valore("compaction_deleted_documents_total")
+    registra_compattazione(120, 3)
+    registra_compattazione(30, 0)
+
+    assert valore("compaction_flights_total") == voli + 150
+    assert valore("compaction_deleted_documents_total") == eliminati + 3
+
+
+def test_registra_storage_per_collection():
+    registra_storage({
+        "flight_events": {"documenti": 10, "dimensione_dati": 1000, "dimensione_storage": 4096, "dimensione_indici": 2048},
+        "interests": {"documenti": 0},
+    })
+
+    assert valore("mongo_collection_documents", collection="flight_events") == 10
+    assert valore("mongo_collection_bytes", collection="flight_events", tipo="storage") == 4096
+    assert valore("mongo_collection_bytes", collection="flight_events", tipo="indici") == 2048
+    assert valore("mongo_collection_bytes", collection="interests", tipo="dati") == 0
+
+    #i valori si sostituiscono, non si sommano
+    registra_storage({"flight_events": {"documenti": 7}})
+    assert valore("mongo_collection_documents", collection="flight_events") == 7
+
+
+def test_registra_download_per_aeroporto():
+    prima = valore("airport_download_duration_seconds_count", airport="LIRF", fase="totale")
+    registra_download("LIRF", 0.2, 0.3)
+
+    assert valore("airport_download_duration_seconds_count", airport="LIRF", fase="totale") == prima + 1
+    assert valore("airport_download_duration_seconds_bucket", airport="LIRF", fase="fetch", le="0.25") >= 1
+    assert valore("airport_download_duration_seconds_bucket", airport="LIRF", fase="totale", le="0.25") == 0
@@ -0,0 +1,177 @@
+import base64
+import calendar
+import json
+import pytest
+from bson import ObjectId
+from voli import (
+    FINESTRA_INIZIALE, ORDINE_VOLI, SOVRAPPOSIZIONE_FINESTRA, calcola_finestra, cancellazioni_richieste, chiave_volo,
+    chiavi_sovrapposizione, codifica_cursore, decodifica_cursore, deduplica_voli, filtro_cancellazione, filtro_voli,
+    incrementi_rollup, volo_piu_recente,
+)
+
+
+def volo(icao24, first_seen, **altri):
+    return dict({"icao24": icao24, "firstSeen": first_seen}, **altri)
+
+
+def utc(giorno, ora=0, minuti=0):
+    anno, mese, gg = map(int, giorno.split("-"))
+    return calendar.timegm((anno, mese, gg, ora, minuti, 0))
+
+
+# --- finestra incrementale ---
+
+def test_prima_finestra_copre_le_ultime_due_ore():
+    assert calcola_finestra(None, 10000) == (10000 - FINESTRA_INIZIALE, [])
+
+
+def test_finestra_successiva_riparte_dalla_precedente_con_sovrapposizione():
+    stato = {"last_end": 9000, "chiavi_recenti": ["a:8990"]}
+    assert calcola_finestra(stato, 10000) == (9000 - SOVRAPPOSIZIONE_FINESTRA, ["a:8990"])
+
+
+def test_finestra_non_torna_indietro_oltre_due_ore():
+    #servizio fermo per un giorno: si riprende dalle ultime 2 ore, non dall'ultima finestra
+    stato = {"last_end": 10000 - 86400}
+    assert calcola_finestra(stato, 10000) == (10000 - FINESTRA_INIZIALE, [])
+
+
+def test_chiavi_sovrapposizione_solo_nella_coda_della_finestra():
+    fine = 10000
+    dati = [volo("a", fine - SOVRAPPOSIZIONE_FINESTRA - 1), volo("b", fine - SOVRAPPOSIZIONE_FINESTRA),
+            volo("c", fine), volo("d", None)]
+    assert chiavi_sovrapposizione(dati, fine) == [f"b:{fine - SOVRAPPOSIZIONE_FINESTRA}", f"c:{fine}"]
+
+
+# --- deduplica ---
+
+def test_deduplica_toglie_doppioni_e_voli_gia_visti():
+    dati = [volo("a", 1), volo("b", 2), volo("a", 1, callsign="doppione"), volo("a", 3)]
+    nuovi = deduplica_voli(dati, chiavi_note=["b:2"])
+
+    assert [chiave_volo(v) for v in nuovi] == ["a:1", "a:3"]
+    assert "callsign" not in nuovi[0]   #resta la prima occorrenza
+
+
+def test_finestre_consecutive_non_ripetono_i_voli_della_sovrapposizione():
+    fine = 10000
+    primo_giro = [volo("a", fine - 30), volo("b", fine - 500)]
+    stato = {"last_end": fine, "chiavi_recenti": chiavi_sovrapposizione(primo_giro, fine)}
+
+    inizio, chiavi_note = calcola_finestra(stato, fine + 600)
+    secondo_giro = [v for v in primo_giro + [volo("c", fine + 10)] if v["firstSeen"] >= inizio]
+    assert [chiave_volo(v) for v in deduplica_voli(secondo_giro, chiavi_note)] == [f"c:{fine + 10}"]
+
+
+# --- rollup e ultimo volo ---
+
+def test_incrementi_rollup_per_giorno_e_ora():
+    dati = [volo("a", utc("2025-11-20", 7, 5)), volo("b", utc("2025-11-20", 7, 55)),
+            volo("c", utc("2025-11-20", 23, 59)), volo("d", utc("2025-11-21", 0, 1)), volo("e", None)]
+
+    assert incrementi_rollup(dati) == {
+        "2025-11-20": {"count": 3, "hours.07": 2, "hours.23": 1},
+        "2025-11-21": {"count": 1, "hours.00": 1},
+    }
+
+
+def test_volo_piu_recente():
+    dati = [volo("a", 10, _id=ObjectId()), volo("b", 30, _id=ObjectId()), volo("c", None)]
+    recente = volo_piu_recente("LIRF", dati)
+
+    assert recente == {"icao24": "b", "firstSeen": 30, "airport": "LIRF"}
+    assert "_id" in dati[1]   #l'originale non viene modificato
+    assert volo_piu_recente("LIRF", [volo("x", None)]) is None
+
+
+# --- filtro e cursore della paginazione ---
+
+def test_filtro_voli_senza_cursore():
+    assert filtro_voli(["LIRF", "LIMC"]) == {"airport": {"$in": ["LIRF", "LIMC"]}}
+    assert filtro_voli(("LIRF",), inizio=100, fine=200) == {
+        "airport": {"$in": ["LIRF"]}, "firstSeen": {"$gte": 100, "$lte": 200},
+    }
+
+
+def test_filtro_voli_con_cursore_limita_firstseen_con_un_intervallo():
+    ultimo = ObjectId()
+    filtro = filtro_voli(["LIRF"], inizio=100, fine=200, dopo=(150, ultimo))
+
+    assert filtro["firstSeen"] == {"$gte": 100, "$lte": 150}
+    assert filtro["$or"] == [{"firstSeen": {"$lt": 150}}, {"_id": {"$lt": ultimo}}]
+    #il cursore non allarga mai la fine richiesta
+    assert filtro_voli(["LIRF"], fine=120, dopo=(150, ultimo))["firstSeen"] == {"$lte": 120}
+
+
+def test_cursore_andata_e_ritorno():
+    oid = ObjectId()
+    token = codifica_cursore({"firstSeen": 1700000000, "_id": oid, "callsign": "X"})
+
+    assert decodifica_cursore(token) == (1700000000, oid)
+    assert "/" not in token and "+" not in token   #sicuro da mettere in una query string
+
+
+@pytest.mark.parametrize("token", [
+    "non-base64!",
+    base64.urlsafe_b64encode(b"non json").decode(),
+    base64.urlsafe_b64encode(json.dumps({"f": 1}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps({"f": 1, "id": "zzz"}).encode()).decode(),
+])
+def test_cursore_non_valido(token):
+    with pytest.raises(ValueError, match="cursore non valido"):
+        decodifica_cursore(token)
+
+
+def test_pagine_consecutive_senza_buchi_ne_ripetizioni():
+    mongomock = pytest.importorskip("mongomock")
+    voli_db = mongomock.MongoClient().db.flight_events
+    #molti voli con lo stesso firstSeen, su più aeroporti: il cursore deve distinguerli con _id
+    voli_db.insert_many([
+        {"airport": ["LIRF", "LIMC", "EGLL"][i % 3], "icao24": f"{i:06x}", "firstSeen": 1000 + i // 7}
+        for i in range(250)
+    ])
+    voli_db.insert_one({"airport": "LFPG", "icao24": "fuori", "firstSeen": 1010})
+
+    letti, dopo = [], None
+    while True:
+        pagina = list(voli_db.find(filtro_voli(["LIRF", "LIMC", "EGLL"], dopo=dopo)).sort(ORDINE_VOLI).limit(40))
+        letti.extend(pagina)
+        if len(pagina) < 40:
+            break
+        dopo = decodifica_cursore(codifica_cursore(pagina[-1]))
+
+    assert len(letti) == 250
+    assert len({v["_id"] for v in letti}) == 250
+    assert [(v["firstSeen"], v["_id"]) for v in letti] == sorted(((v["firstSeen"], v["_id"]) for v in letti), reverse=True)
+
+
+def test_cancellazione_tardiva_non_tocca_gli_interessi_successivi():
+    mongomock = pytest.importorskip("mongomock")
+    interessi = mongomock.MongoClient().db.user_interests
+    interessi.insert_many([
+        {"user": "a@example.com", "airport_code": "LIRF", "added_at": 100.0},
+        {"user": "a@example.com", "airport_code": "LIMC"},
+        #aggiunto dopo che l'utente si è registrato di nuovo
+        {"user": "a@example.com", "airport_code": "EGLL", "added_at": 300.0},
+        {"user": "b@example.com", "airport_code": "LIRF", "added_at": 100.0},
+    ])
+
+    interessi.delete_many(filtro_cancellazione("a@example.com", 200.0))
+    assert [i["airport_code"] for i in interessi.find({"user": "a@example.com"})] == ["EGLL"]
+
+    interessi.delete_many(filtro_cancellazione("b@example.com"))
+    assert interessi.count_documents({"user": "b@example.com"}) == 0
+
+
+def test_cancellazioni_richieste():
+    user_pb2 = pytest.importorskip("user_pb2")
+    richiesta = user_pb2.DeleteDataBatchRequest(emails=["a@example.com"], deletions=[
+        user_pb2.UserDeletion(email="a@example.com", deleted_at=200.0),
+        user_pb2.UserDeletion(email="a@example.com", deleted_at=100.0),
+        user_pb2.UserDeletion(email="b@example.com", deleted_at=50.0),
+    ])
+    assert cancellazioni_richieste(richiesta) == {"a@example.com": 200.0, "b@example.com": 50.0}
+
+    #richiesta della versione precedente: solo le email, si cancella tutto
+    vecchia = user_pb2.DeleteDataBatchRequest(emails=["a@example.com", "b@example.com"])
+    assert cancellazioni_richieste(vecchia) == {"a@example.com": None, "b@example.com": None}
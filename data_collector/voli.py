@@ -0,0 +1,176 @@
+import base64
+import json
+import os
+import time
+from bson import ObjectId
+
+# Funzioni sui voli (e sugli interessi) che non dipendono da come si parla con Mongo o con OpenSky:
+# le usano sia la versione a thread (app.py) sia quella asyncio (app_async.py)
+
+FINESTRA_INIZIALE = 7200                                                    #2 ore alla prima richiesta per un aeroporto
+SOVRAPPOSIZIONE_FINESTRA = int(os.getenv("SOVRAPPOSIZIONE_FINESTRA", "60"))  #secondi ripresi dalla finestra precedente
+
+
+def chiave_volo(volo):
+    #un volo è identificato dall'aereo (icao24) e dall'istante in cui è stato visto la prima volta
+    return f"{volo.get('icao24')}:{volo.get('firstSeen')}"
+
+
+def deduplica_voli(voli, chiavi_note=()):
+
+    #toglie i voli già salvati (finestra precedente) e i doppioni interni alla risposta
+    viste = set(chiavi_note)
+    nuovi = []
+    for volo in voli:
+        chiave = chiave_volo(volo)
+        if chiave not in viste:
+            viste.add(chiave)
+            nuovi.append(volo)
+    return nuovi
+
+
+def calcola_finestra(stato, ora_fine):
+
+    # Alla prima richiesta cerchiamo nelle ultime 2 ore (7200 secondi), poi solo dalla fine
+    # della finestra precedente (con una piccola sovrapposizione) fino ad ora
+    ora_inizio = ora_fine - FINESTRA_INIZIALE
+    chiavi_note = []
+    if stato:
+        ora_inizio = max(ora_inizio, stato["last_end"] - SOVRAPPOSIZIONE_FINESTRA)
+        chiavi_note = stato.get("chiavi_recenti", [])
+    return ora_inizio, chiavi_note
+
+
+def chiavi_sovrapposizione(voli, ora_fine):
+    #voli che cadono nella sovrapposizione con la prossima finestra: verranno scartati al prossimo giro
+    return [chiave_volo(v) for v in voli if (v.get("firstSeen") or 0) >= ora_fine - SOVRAPPOSIZIONE_FINESTRA]
+
+
+def volo_mock(airport):
+    # solo per scopi dimostrativi
+    return [{
+        "icao24": "mock_id",
+        "firstSeen": int(time.time()) - 1000,
+        "estDepartureAirport": airport,
+        "lastSeen": int(time.time()),
+        "estArrivalAirport": "LIRF",
+        "callsign": f"TEST_{airport}",
+        "estDepartureAirportHorizDistance": 0,
+        "estDepartureAirportVertDistance": 0,
+        "estArrivalAirportHorizDistance": 0,
+        "estArrivalAirportVertDistance": 0,
+        "departureAirportCandidatesCount": 0,
+        "arrivalAirportCandidatesCount": 0
+    }]
+
+
+def giorno_e_ora(timestamp):
+    #giorno ("2025-11-20") e ora ("07") in UTC di un timestamp unix
+    data = time.gmtime(timestamp)
+    return time.strftime("%Y-%m-%d", data), time.strftime("%H", data)
+
+
+def incrementi_rollup(voli):
+
+    #Chiave = giorno -> valore = {"count": n, "hours.HH": n} pronto per un $inc
+    incrementi = {}
+    for volo in voli:
+        if not volo.get("firstSeen"):
+            continue
+        giorno, ora = giorno_e_ora(volo["firstSeen"])
+        inc = incrementi.setdefault(giorno, {"count": 0})
+        inc["count"] += 1
+        inc[f"hours.{ora}"] = inc.get(f"hours.{ora}", 0) + 1
+    return incrementi
+
+
+def volo_piu_recente(aeroporto, voli):
+
+    #il volo con firstSeen più alto, pronto per la vista latest_flight
+    candidati = [v for v in voli if v.get("firstSeen")]
+    if not candidati:
+        return None
+    volo = dict(max(candidati, key=lambda v: v["firstSeen"]), airport=aeroporto)
+    volo.pop("_id", None)
+    return volo
+
+
+#ordinamento di /flights/my-interests: coincide con l'indice airport_firstSeen_id (indici.py), così Mongo
+#fonde gli intervalli dei singoli aeroporti già ordinati (SORT_MERGE) invece di ordinare tutto in memoria
+ORDINE_VOLI = [("firstSeen", -1), ("_id", -1)]
+
+
+def filtro_voli(aeroporti, inizio=None, fine=None, dopo=None):
+
+    #filtro dei voli partiti dagli aeroporti indicati, opzionalmente tra 'inizio' e 'fine' (firstSeen)
+    #e dopo il volo (firstSeen, _id) con cui è finita la pagina precedente
+    filtro = {"airport": {"$in": list(aeroporti)}}
+    intervallo = {}
+    if inizio is not None:
+        intervallo["$gte"] = inizio
+    if fine is not None:
+        intervallo["$lte"] = fine
+
+    if dopo is not None:
+        first_seen, ultimo_id = dopo
+        #il limite su firstSeen resta un intervallo dell'indice; l'$or sceglie tra i voli con lo stesso firstSeen
+        intervallo["$lte"] = min(intervallo.get("$lte", first_seen), first_seen)
+        filtro["$or"] = [{"firstSeen": {"$lt": first_seen}}, {"_id": {"$lt": ultimo_id}}]
+
+    if intervallo:
+        filtro["firstSeen"] = intervallo
+    return filtro
+
+
+def filtro_cancellazione(email, cancellato_alle=None):
+
+    #interessi da togliere per un utente cancellato: solo quelli aggiunti prima della cancellazione
+    #(quelli senza added_at sono precedenti al campo). Con cancellato_alle=None tutti
+    filtro = {"user": email}
+    if cancellato_alle is not None:
+        filtro["$or"] = [{"added_at": {"$lt": cancellato_alle}}, {"added_at": {"$exists": False}}]
+    return filtro
+
+
+def cancellazioni_richieste(richiesta):
+
+    #DeleteDataBatchRequest -> {email: istante della cancellazione}; le richieste della versione
+    #precedente hanno solo emails e cancellano tutti gli interessi (None)
+    if not richiesta.deletions:
+        return dict.fromkeys(richiesta.emails)
+    cancellazioni = {}
+    for cancellazione in richiesta.deletions:
+        cancellazioni[cancellazione.email] = max(cancellazione.deleted_at, cancellazioni.get(cancellazione.email, 0))
+    return cancellazioni
+
+
+def pipeline_compattazione(da, fino_a):
+
+    #voli partiti tra 'da' e 'fino_a' (firstSeen) raggruppati per aeroporto, giorno e ora (UTC):
+    #il $match iniziale usa l'indice su firstSeen (indici.py), senza leggere tutta flight_events
+    return [
+        {"$match": {"firstSeen": {"$gte": da, "$lt": fino_a}}},
+        {"$project": {"airport": 1, "data": {"$toDate": {"$multiply": ["$firstSeen", 1000]}}}},
+        {"$group": {
+            "_id": {
+                "airport": "$airport",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$data"}},
+                "hour": {"$dateToString": {"format": "%H", "date": "$data"}},
+            },
+            "n": {"$sum": 1}
+        }}
+    ]
+
+
+#Token opaco per la paginazione: codifica (firstSeen, _id) dell'ultimo volo restituito
+def codifica_cursore(volo):
+    dati = json.dumps({"f": volo.get("firstSeen"), "id": str(volo["_id"])})
+    return base64.urlsafe_b64encode(dati.encode()).decode()
+
+
+def decodifica_cursore(token):
+    try:
+        dati = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        return dati["f"], ObjectId(dati["id"])
+    except Exception:
+        raise ValueError("cursore non valido")
@@ -1,19 +1,52 @@
+import os
+import io
+import csv
+import codecs
+import json
+import tempfile
 import threading
+import time
 import grpc
 from concurrent import futures
-from flask import Flask, request, jsonify, abort
-import hashlib
+from flask import Flask, request, jsonify, abort, Response
+from psycopg.types.json import Jsonb
 import user_pb2
 import user_pb2_grpc
-from database_postgres import database_postgres
-from cache import Cache
-import json
-
-
-global_cache = Cache(ttl_seconds=300)
+from database_postgres import database_postgres, CANALE_UTENTI
+from cache import Cache, UserExistenceCache
+from grpc_channels import channel_registry, opzioni_server
+from hashing import PasswordHasher
+from outbox import DispatcherCancellazioni, OUTBOX_TIMEOUT
+from metriche import registra_flask, InterceptorMetriche, tempo_ciclo
+from logger import get_logger, CAMPIONA
+
+
+global_cache = Cache(
+    ttl_seconds=300,
+    num_shards=int(os.getenv("CACHE_SHARDS", "16")),
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "100000")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    nome="idempotenza",
+)
+#cache email -> esiste/non esiste davanti alla CheckUser, con TTL diversi per esito positivo e negativo;
+#la usa solo il server gRPC, che la tiene allineata con le notifiche di CANALE_UTENTI (start_grpc_server)
+user_existence_cache = UserExistenceCache(
+    ttl_positivo=int(os.getenv("USER_CACHE_TTL_POSITIVO", "60")),
+    ttl_negativo=int(os.getenv("USER_CACHE_TTL_NEGATIVO", "10")),
+)
+#hash delle password (scrypt) calcolati in un pool di processi separato
+password_hasher = PasswordHasher()
+log = get_logger("user_manager.app")
 app = Flask(__name__)
+#latenze per route e /metrics
+registra_flask(app)
 
-DATA_COLLECTOR_GRPC = "data-collector:50052"
+STREAM_BATCH_SIZE = 1000  #email verificate per ogni query nella StreamCheckUsers
+DATA_COLLECTOR_GRPC = os.getenv("DATA_COLLECTOR_GRPC", "data-collector:50052")
+BULK_BLOCCO = int(os.getenv("BULK_BLOCCO", "1000"))   #righe per ogni COPY dell'import massivo
+BULK_BUFFER = 1024 * 1024                              #byte copiati alla volta dal corpo dell'import al file temporaneo
+IDEMPOTENZA_TTL = int(os.getenv("IDEMPOTENZA_TTL", "86400"))                          #secondi per cui si ricorda un Request-ID
+INTERVALLO_PULIZIA_IDEMPOTENZA = int(os.getenv("INTERVALLO_PULIZIA_IDEMPOTENZA", "3600"))
 
 
 #Definisco il Server gRPC (Risponde al Data Collector)
@@ -25,50 +58,134 @@ class UserManagerGRPC(user_pb2_grpc.UserManagerServicer):
         message_id = request.message_id
         email = request.email
 
-        print(f"Richiesta da parte di {client_id} con message_id: {message_id} e Email: {email}")
+        log.info("Richiesta da parte di %s con message_id: %s e Email: %s", client_id, message_id, email, extra=CAMPIONA)
 
         # controllo la cache con la Politica At-Most-Once
-        cache_response = global_cache.get_response(client_id, message_id)
+        cache_response = global_cache.get_response(client_id, message_id, "CheckUser")
         if cache_response:
-            print(f"Mi hai mandato gia la stessa request, ti prendo il dato conservato nella mia cache.")
+            log.info("Mi hai mandato gia la stessa request, ti prendo il dato conservato nella mia cache.", extra=CAMPIONA)
 
             return cache_response
 
         exists = False
-        connection = None
         try:
+            #prima guardo la cache di esistenza per email, poi eventualmente il DB
+            exists = email in verifica_email([email])
 
-            connection = database_postgres.get_connection()
-            cursore = connection.cursor()
+        except Exception as e:
+            log.error("Errore database: %s", e)
 
-            try:
-                cursore.execute("SELECT * FROM users WHERE email = %s", (email,))
+        response = user_pb2.CheckUserResponse(exists=exists)
 
-                if cursore.fetchone():
-                    exists = True
-            finally:
-                cursore.close()
+        #salvo il nuovo messaggio dentro la cache
+        global_cache.save_response(client_id, message_id, response, "CheckUser")
 
-        except Exception as e:
-            print(f"Errore database: {e}")
+        return response
 
-        finally:
-            #chiudiamo alla fine sempre la connessione
-            if connection:
-                connection.close()
 
-        response = user_pb2.CheckUserResponse(exists=exists)
+    def CheckUsers(self, request, context):
 
-        #salvo il nuovo messaggio dentro la cache
-        global_cache.save_response(client_id, message_id, response)
+        client_id = request.client_id
+        message_id = request.message_id
+        emails = list(request.emails)
+
+        log.info("Richiesta batch da parte di %s con message_id: %s per %d email", client_id, message_id, len(emails), extra=CAMPIONA)
+
+        # stessa politica At-Most-Once della CheckUser
+        cache_response = global_cache.get_response(client_id, message_id, "CheckUsers")
+        if cache_response:
+            log.info("Mi hai mandato gia la stessa request, ti prendo il dato conservato nella mia cache.", extra=CAMPIONA)
+            return cache_response
+
+        esistenti = set()
+        try:
+            esistenti = verifica_email(emails)
+        except Exception as e:
+            log.error("Errore database: %s", e)
+
+        response = user_pb2.CheckUsersResponse(results=[
+            user_pb2.UserExistence(email=email, exists=email in esistenti) for email in emails
+        ])
+
+        global_cache.save_response(client_id, message_id, response, "CheckUsers")
 
         return response
 
+    def StreamCheckUsers(self, request, context):
 
-def start_grpc_server():
+        client_id = request.client_id
+        message_id = request.message_id
+        emails = list(request.emails)
+
+        log.info("Richiesta stream da parte di %s con message_id: %s per %d email", client_id, message_id, len(emails), extra=CAMPIONA)
+
+        cache_response = global_cache.get_response(client_id, message_id, "StreamCheckUsers")
+        if cache_response:
+            log.info("Mi hai mandato gia la stessa request, ti prendo il dato conservato nella mia cache.", extra=CAMPIONA)
+            yield from cache_response.results
+            return
+
+        #le email vengono verificate a blocchi: i primi risultati partono prima che sia finita tutta la lista
+        risultati = []
+        for i in range(0, len(emails), STREAM_BATCH_SIZE):
+            blocco = emails[i:i + STREAM_BATCH_SIZE]
+            esistenti = set()
+            try:
+                esistenti = verifica_email(blocco)
+            except Exception as e:
+                log.error("Errore database: %s", e)
+
+            for email in blocco:
+                risultato = user_pb2.UserExistence(email=email, exists=email in esistenti)
+                risultati.append(risultato)
+                yield risultato
+
+        #salvo la risposta completa solo se lo stream è arrivato fino in fondo
+        global_cache.save_response(client_id, message_id, user_pb2.CheckUsersResponse(results=risultati), "StreamCheckUsers")
+
+
+def verifica_email(emails):
+
+    #restituisce l'insieme delle email registrate: quelle già note escono dalla cache di esistenza,
+    #le altre vengono verificate con una sola query per tutta la lista
+    esistenti = set()
+    da_verificare = []
+    for email in set(emails):
+        esito = user_existence_cache.get(email)
+        if esito is None:
+            da_verificare.append(email)
+        elif esito:
+            esistenti.add(email)
+
+    if not da_verificare:
+        return esistenti
+
+    letto_alle = time.time()
+    with database_postgres.get_connection("verifica_email") as connection:
+        cursore = connection.cursor()
+        try:
+            cursore.execute("SELECT email FROM users WHERE email = ANY(%s)", (da_verificare,))
+            trovate = {riga[0] for riga in cursore.fetchall()}
+        finally:
+            cursore.close()
+
+    for email in da_verificare:
+        user_existence_cache.save(email, email in trovate, letto_alle)
+
+    return esistenti | trovate
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+
+def start_grpc_server(max_workers=10):
+
+    # SO_REUSEPORT: più processi (server.py) possono ascoltare sulla stessa porta, il kernel distribuisce le connessioni
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers), options=opzioni_server(),
+                         interceptors=[InterceptorMetriche()])
     user_pb2_grpc.add_UserManagerServicer_to_server(UserManagerGRPC(), server)
+
+    #registrazioni e cancellazioni avvengono nei worker HTTP (altri processi con server.py): arrivano qui
+    #come notifiche Postgres e invalidano la cache di esistenza di questo processo
+    database_postgres.ascolta(CANALE_UTENTI, user_existence_cache.invalidate,
+                              user_existence_cache.attiva, user_existence_cache.disattiva)
     port=50051
     server.add_insecure_port(f"[::]:{port}")  #canale insicuro che prende qualsiasi host
     server.start()
@@ -87,7 +204,7 @@ def register():
     #utilizzo il DATA_COLLECTOR come client per identificare quel microservizio
     cache_resp = global_cache.get_response("DATA_COLLECTOR", request_id)
     if cache_resp:
-        print(f"Mi hai mandato gia la stessa request, ti prendo il dato conservato nella mia cache.")
+        log.info("Mi hai mandato gia la stessa request, ti prendo il dato conservato nella mia cache.", extra=CAMPIONA)
         return jsonify(cache_resp['body']), cache_resp['status']
 
     data = request.json
@@ -99,56 +216,244 @@ def register():
     if not email or not password:
         return jsonify({"errore": "Email obbligatoria"}), 400
 
-    connection = None
     try:
-        connection = database_postgres.get_connection()
-        cursor = connection.cursor()
+        #retry già processato da un altro processo: la risposta salvata esce dal DB senza pagare lo scrypt
+        salvata = leggi_risposta_salvata(request_id)
+        if salvata is not None:
+            log.info("Mi hai mandato gia la stessa request, ti prendo la risposta salvata nel DB.", extra=CAMPIONA)
+            global_cache.save_response("DATA_COLLECTOR", request_id, salvata)
+            return jsonify(salvata['body']), salvata['status']
 
-        try:
-            cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
-            if cursor.fetchone():
-                print(f"Utente con {email} e con ID {request_id} gia registrato / Vai in un eventuale login")
+        #hash calcolato prima di prendere la connessione: il pool Postgres non aspetta lo scrypt
+        pw_hash = password_hasher.hash(password)
+
+        with database_postgres.get_connection("registrazione") as connection:
+            cursor = connection.cursor()
+
+            try:
+                #una sola istruzione: registra il Request-ID e, solo se è nuovo, inserisce l'utente.
+                #Nessuna SELECT preventiva e nessuna unique violation se due richieste arrivano insieme
+                #(la seconda con lo stesso Request-ID aspetta il commit della prima)
+                cursor.execute(
+                    """
+                    WITH richiesta AS (
+                        INSERT INTO richieste_idempotenti (request_id, email) VALUES (%s, %s)
+                        ON CONFLICT (request_id) DO NOTHING
+                        RETURNING request_id
+                    ), utente AS (
+                        INSERT INTO users (email, password, nome, cognome)
+                        SELECT %s, %s, %s, %s FROM richiesta
+                        ON CONFLICT (email) DO NOTHING
+                        RETURNING email
+                    )
+                    SELECT EXISTS (SELECT 1 FROM richiesta), EXISTS (SELECT 1 FROM utente)
+                    """,
+                    (request_id, email, email, pw_hash, nome, cognome)
+                )
+                nuova_richiesta, creato = cursor.fetchone()
+
+                if not nuova_richiesta:
+                    #Request-ID già visto (da questo o da un altro processo): rispondo come la prima volta
+                    cursor.execute("SELECT status, body FROM richieste_idempotenti WHERE request_id = %s", (request_id,))
+                    status_code, response_body = cursor.fetchone()
+                    connection.commit()
+                    log.info("Mi hai mandato gia la stessa request, ti prendo la risposta salvata nel DB.", extra=CAMPIONA)
+                    global_cache.save_response("DATA_COLLECTOR", request_id, {'body': response_body, 'status': status_code})
+                    return jsonify(response_body), status_code
+
+                if creato:
+                    log.info("Registrazione completata per l'utente con request_id: %s ed email: %s", request_id, email, extra=CAMPIONA)
+                    response_body = {
+                        "messaggio": "Registrazione completata!",
+                        "email": email,
+                        "request_id": request_id
+                    }
+                    status_code = 201
+                else:
+                    log.info("Utente con %s e con ID %s gia registrato / Vai in un eventuale login", email, request_id, extra=CAMPIONA)
+                    response_body = {
+                        "messaggio": "Utente già registrato / Vai in un eventuale login",
+                        "email": email,
+                        "request_id": request_id
+                    }
+                    status_code = 200
 
-                return jsonify({
-                    "messaggio": "Utente già registrato / Vai in un eventuale login",
-                    "email": email,
-                    "request_id": request_id
-                }), 200
+                #la risposta si salva nella stessa transazione dell'utente
+                cursor.execute(
+                    "UPDATE richieste_idempotenti SET status = %s, body = %s WHERE request_id = %s",
+                    (status_code, Jsonb(response_body), request_id)
+                )
+                if creato:
+                    #al commit le cache di esistenza degli altri processi dimenticano il "non registrato"
+                    cursor.execute("SELECT pg_notify(%s, %s)", (CANALE_UTENTI, email))
+                connection.commit()
 
+                # la cache locale resta davanti al DB per i retry che tornano a questo processo
+                global_cache.save_response("DATA_COLLECTOR", request_id, {'body': response_body, 'status': status_code})
 
-            pw_hash = hashlib.sha256(password.encode()).hexdigest()
+                return jsonify(response_body), status_code
+
+            finally:
+
+                cursor.close()
+
+    except Exception as e:
+        return jsonify({"errore": f"Errore server: {str(e)}"}), 500
 
-            #Inserisco l'utente
-            cursor.execute(
-                "INSERT INTO users (email, password, nome, cognome) VALUES (%s, %s, %s, %s)",
-                (email,pw_hash, nome, cognome)
-            )
 
-            connection.commit()
-            print(f"Registrazione completata per l'utente con request_id: {request_id} ed email: {email}")
+def leggi_risposta_salvata(request_id):
+    #risposta già data a questo Request-ID (None se è nuovo); le righe visibili sono sempre complete,
+    #perché utente e risposta si scrivono nella stessa transazione
+    with database_postgres.get_connection("leggi_risposta_salvata") as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT status, body FROM richieste_idempotenti WHERE request_id = %s", (request_id,))
+            riga = cur.fetchone()
+        finally:
+            cur.close()
+    return {'body': riga[1], 'status': riga[0]} if riga else None
 
-            response_body = {
-                "messaggio": "Registrazione completata!",
-                "email": email,
-                "request_id": request_id
-            }
-            status_code = 201
 
-            # Salvo in cache per futuri retry con lo stesso ID
-            global_cache.save_response("DATA_COLLECTOR", request_id, {'body': response_body, 'status': status_code})
+@app.route('/users/bulk', methods=['POST'])
+def register_bulk():
 
-            return jsonify(response_body), status_code
+    #import massivo: corpo NDJSON (un utente per riga) o CSV (intestazione email,password,nome,cognome);
+    #la risposta è uno stream NDJSON con l'esito di ogni riga
+    formato = "csv" if request.mimetype == "text/csv" or request.args.get("format") == "csv" else "ndjson"
 
+    #il corpo si legge tutto prima di rispondere, copiandolo su un file temporaneo (la memoria non cresce
+    #con la dimensione dell'import): i client che inviano tutto il corpo prima di leggere la risposta
+    #(requests, curl dietro un proxy) altrimenti si bloccano con il server fermo su una risposta che nessuno legge
+    corpo = tempfile.TemporaryFile()
+    try:
+        copia_utf8(request.stream, corpo)
+        corpo.seek(0)
+    except ValueError as e:
+        #meglio un 400 adesso che un errore a metà di una risposta 200 già iniziata
+        corpo.close()
+        return jsonify({"errore": str(e)}), 400
+    except Exception:
+        corpo.close()
+        raise
+
+    def genera():
+        try:
+            blocco = []
+            for numero, dati in enumerate(leggi_righe_import(corpo, formato), start=1):
+                blocco.append((numero, dati))
+                if len(blocco) == BULK_BLOCCO:
+                    yield from importa_blocco(blocco)
+                    blocco = []
+            if blocco:
+                yield from importa_blocco(blocco)
         finally:
+            corpo.close()
 
-            cursor.close()
+    return Response(genera(), mimetype='application/x-ndjson')
 
-    except Exception as e:
-        return jsonify({"errore": f"Errore server: {str(e)}"}), 500
 
-    finally:
-        if connection:
-            connection.close()
+def copia_utf8(sorgente, destinazione):
+
+    #come shutil.copyfileobj, ma controlla che il corpo sia UTF-8 valido mentre lo copia.
+    #Il ValueError indica il byte sbagliato contando dall'inizio del corpo
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    copiati = 0
+    while True:
+        pezzo = sorgente.read(BULK_BUFFER)
+        #il decoder tiene da parte i byte di un carattere spezzato tra due pezzi
+        in_sospeso = len(decoder.getstate()[0])
+        try:
+            decoder.decode(pezzo, final=not pezzo)
+        except UnicodeDecodeError as e:
+            raise ValueError(f"Il corpo non è UTF-8 valido (byte {copiati - in_sospeso + e.start})") from None
+        if not pezzo:
+            return
+        destinazione.write(pezzo)
+        copiati += len(pezzo)
+
+
+def leggi_righe_import(corpo, formato):
+    testo = io.TextIOWrapper(corpo, encoding="utf-8", newline="" if formato == "csv" else None)
+    if formato == "csv":
+        yield from csv.DictReader(testo)
+        return
+
+    for linea in testo:
+        if not linea.strip():
+            continue
+        try:
+            yield json.loads(linea)
+        except ValueError:
+            yield None
+
+
+def importa_blocco(blocco):
+
+    esiti = {}
+    validi = []
+    for numero, dati in blocco:
+        if isinstance(dati, dict) and dati.get("email") and dati.get("password"):
+            validi.append((numero, dati))
+        else:
+            esiti[numero] = {"riga": numero, "stato": "errore", "errore": "Email e password obbligatori"}
+
+    try:
+        #hash del blocco in parallelo su tutti i processi del pool, poi COPY + un solo INSERT
+        hash_password = password_hasher.hash_molti([dati["password"] for _, dati in validi])
+        righe = [
+            (numero, dati["email"], pw_hash, dati.get("nome"), dati.get("cognome"))
+            for (numero, dati), pw_hash in zip(validi, hash_password)
+        ]
+        create = database_postgres.importa_utenti(righe) if righe else set()
+    except Exception as e:
+        log.error("Import massivo fallito: %s", e)
+        for numero, dati in validi:
+            esiti[numero] = {"riga": numero, "email": dati["email"], "stato": "errore", "errore": str(e)}
+        create = set()
+        validi = []
+
+    viste = set()
+    for numero, dati in validi:
+        email = dati["email"]
+        stato = "creato" if email in create and email not in viste else "gia_registrato"
+        viste.add(email)
+        esiti[numero] = {"riga": numero, "email": email, "stato": stato}
+
+    log.info("Import massivo: %d righe, %d utenti creati", len(blocco), len(create))
+
+    for numero, _ in blocco:
+        yield json.dumps(esiti[numero]) + "\n"
+
+
+def invia_cancellazioni(cancellazioni):
+    #cancellazioni = [(email, istante della cancellazione)]: il Data Collector toglie solo gli interessi
+    #aggiunti prima. emails resta per i Data Collector della versione precedente
+    #il canale verso il Data Collector (porta 50052) è condiviso e riusato tra le richieste
+    stub = channel_registry.get_stub(DATA_COLLECTOR_GRPC, user_pb2_grpc.DataCollectorStub, "DataCollector")
+    richiesta = user_pb2.DeleteDataBatchRequest(
+        emails=[email for email, _ in cancellazioni],
+        deletions=[user_pb2.UserDeletion(email=email, deleted_at=alle) for email, alle in cancellazioni],
+    )
+    response = stub.DeleteDataBatch(richiesta, timeout=OUTBOX_TIMEOUT)
+    if not response.success:
+        raise RuntimeError("il Data Collector non ha confermato la cancellazione")
+    return response.deleted_count
+
+
+dispatcher_cancellazioni = DispatcherCancellazioni(database_postgres, invia_cancellazioni)
+
+
+def pulizia_idempotenza_ciclica():
+    #le risposte salvate servono solo per i retry: dopo IDEMPOTENZA_TTL secondi vengono cancellate
+    while True:
+        time.sleep(INTERVALLO_PULIZIA_IDEMPOTENZA)
+        try:
+            with tempo_ciclo("pulizia_idempotenza"):
+                cancellate = database_postgres.pulisci_richieste_idempotenti(IDEMPOTENZA_TTL)
+            if cancellate:
+                log.info("Cancellate %d risposte di registrazione scadute", cancellate)
+        except Exception as e:
+            log.exception("Pulizia delle risposte di registrazione fallita: %s", e)
 
 
 @app.route('/users', methods=['DELETE'])
@@ -162,86 +467,122 @@ def delete_user():
     if not email or not password:
         abort(400, description="Email e Password obbligatori per cancellare")
 
-    pw_hash = hashlib.sha256(password.encode()).hexdigest()
-
-    conn = None
     try:
-        conn = database_postgres.get_connection()
-        cur = conn.cursor()
-        try:
-            #cancello da POSTGRES
-            cur.execute("DELETE FROM users WHERE email = %s AND password = %s", (email, pw_hash))
-            conn.commit()
-
-            if cur.rowcount > 0:
+        #la password si verifica fuori dal DB (hash con sale): prima leggo l'hash salvato
+        salvato = leggi_hash_password(email)
+        corretta, _ = password_hasher.verifica(password, salvato)
+
+        eliminati = 0
+        if corretta:
+            with database_postgres.get_connection("cancellazione_utente") as conn:
+                cur = conn.cursor()
+                try:
+                    #cancello da POSTGRES (solo se nel frattempo la password non è cambiata)
+                    cur.execute("DELETE FROM users WHERE email = %s AND password = %s", (email, salvato))
+                    eliminati = cur.rowcount
+                    if eliminati > 0:
+                        #la cancellazione dei dati sul Data Collector parte dall'outbox, nella stessa transazione
+                        cur.execute("INSERT INTO outbox_cancellazioni (email) VALUES (%s)", (email,))
+                        cur.execute("SELECT pg_notify(%s, %s)", (CANALE_UTENTI, email))
+                        if request_id:
+                            #come per la cache locale: la registrazione con questo Request-ID si può rifare
+                            cur.execute("DELETE FROM richieste_idempotenti WHERE request_id = %s", (request_id,))
+                    conn.commit()
+                finally:
+                    cur.close()
+
+        if eliminati > 0:
+            if request_id:
+
+                esito = global_cache.remove_response("DATA_COLLECTOR", request_id)
+
+                if esito:
+                    log.info("Cache pulita correttamente per l'ID %s", request_id)
+                else:
+                    log.info("Nessuna cache trovata per l'ID %s", request_id)
+
+            #rispondo appena fatto il commit: i dati sul Data Collector li cancella il dispatcher dell'outbox
+            return jsonify({"message": "Utente eliminato, cancellazione dei dati in corso", "email": email}), 200
+        else:
+
+            log.info("Utente %s non trovato nel DB o password errata.", email)
+
+            return jsonify({"errore": "Utente non trovato o credenziali errate"}), 401
 
-                if request_id:
+    except Exception as e:
+        # Gestione errori generici del server
+        log.exception("Errore nella cancellazione di %s: %s", email, e)
+        return jsonify({"errore": f"Errore interno del server: {str(e)}"}), 500
 
-                    esito = global_cache.remove_response("DATA_COLLECTOR", request_id)
 
-                    if esito:
-                        print(f"Cache pulita correttamente per l'ID {request_id}")
-                    else:
-                        print(f"Nessuna cache trovata per l'ID {request_id}")
-                try:
+@app.route('/login', methods=['POST'])
+def login():
+    data = request.get_json() or {}
+    email = data.get('email')
+    password = data.get('password')
 
-                    #connettiamo alla porta 50052 configurata nel Data Collector
-                    target_grpc = 'data-collector:50052'
-
-
-                    # Configuro il canale per riprovare se il server è giù
-                    service_config = {
-                        "methodConfig": [
-                            {
-                                "name": [{"service": "DataCollector"}],
-                                "timeout": "5s",                            #Timeout totale
-                                "retryPolicy": {
-                                    "maxAttempts": 5,                       #Riprovare massimo 5 volte
-                                    "initialBackoff": "0.5s",               #Aspetta 0.5s al primo errore
-                                    "maxBackoff": "2s",                     #massima attesa
-                                    "backoffMultiplier": 2,                 #Raddoppia l'attesa ogni volta
-                                    "retryableStatusCodes": ["UNAVAILABLE"] #Riprova solo se il server va giù
-                                }
-                            }
-                        ]
-                    }
+    if not email or not password:
+        return jsonify({"errore": "Email e Password obbligatori"}), 400
 
-                    options = [('grpc.service_config', json.dumps(service_config))] #da errore se non lo passo con json.dumps
+    try:
+        salvato = leggi_hash_password(email)
+        corretta, nuovo_hash = password_hasher.verifica(password, salvato)
 
-                    with grpc.insecure_channel(target_grpc, options=options) as channel:
+        if not corretta:
+            return jsonify({"errore": "Utente non trovato o credenziali errate"}), 401
 
-                        stub = user_pb2_grpc.DataCollectorStub(channel)
-                        request_grpc = user_pb2.DeleteDataRequest(email=email)
-                        response = stub.DeleteData(request_grpc)
+        if nuovo_hash:
+            #hash vecchio (sha256 senza sale o costo scrypt diverso): lo riscrivo con quello attuale
+            with database_postgres.get_connection("aggiorna_hash") as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute("UPDATE users SET password = %s WHERE email = %s AND password = %s",
+                                (nuovo_hash, email, salvato))
+                    conn.commit()
+                finally:
+                    cur.close()
+            log.info("Hash della password aggiornato per %s", email)
 
-                        print(f"Richiesta inviata per {email}. Successo: {response.success}")
+        return jsonify({"messaggio": "Login effettuato", "email": email}), 200
 
-                except grpc.RpcError as e:
+    except Exception as e:
+        log.exception("Errore nel login di %s: %s", email, e)
+        return jsonify({"errore": f"Errore interno del server: {str(e)}"}), 500
 
-                    print(f"Errore gRPC verso il Data Collector: {e}")
 
-                except Exception as e:
-                    print(f"Errore generico pulizia dei dati: {e}")
+def leggi_hash_password(email):
+    #hash salvato per l'utente, None se l'utente non esiste
+    with database_postgres.get_connection("leggi_hash_password") as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT password FROM users WHERE email = %s", (email,))
+            riga = cur.fetchone()
+        finally:
+            cur.close()
+    return riga[0] if riga else None
 
-                return jsonify({"message": "Utente eliminato e dati puliti", "email": email}), 200
-            else:
 
-                print(f"Utente {email} non trovato nel DB o password errata.")
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    #statistiche del pool di connessioni verso Postgres, della cache delle risposte e dell'outbox delle cancellazioni.
+    #La cache di esistenza vive nei processi gRPC: i suoi hit e miss sono in /metrics
+    return jsonify({
+        "db_pool": database_postgres.get_stats(),
+        "cache": global_cache.get_stats(),
+        "outbox_cancellazioni": dispatcher_cancellazioni.get_stats()
+    }), 200
 
-                return jsonify({"errore": "Utente non trovato o credenziali errate"}), 401
+def avvia_thread_background():
 
-        finally:
-            cur.close()
+    #thread di ogni processo che serve le API REST (qui sotto o in ogni worker di server.py)
+    pulizia_thread = threading.Thread(target=pulizia_idempotenza_ciclica, daemon=True)
+    pulizia_thread.start()
+    dispatcher_cancellazioni.avvia()
 
-    except Exception as e:
-        # Gestione errori generici del server
-        print(f"[SERVER ERROR] {str(e)}")
-        return jsonify({"errore": f"Errore interno del server: {str(e)}"}), 500
-    finally:
-        if conn: conn.close()
 
 if __name__ == '__main__':
 
+    avvia_thread_background()
     threading_grpc = threading.Thread(target=start_grpc_server, daemon=True)
     threading_grpc.start()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
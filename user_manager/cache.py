@@ -1,74 +1,294 @@
+import heapq
+import sys
 import threading
 import time
+from collections import OrderedDict
+from metriche import conta_cache
+from logger import get_logger
+
+log = get_logger("user_manager.cache")
 
 # mi costruisco la cache dove andrò a salvarmi i dati ovvero i risultati con il loro timestamp
+# la cache è divisa in segmenti (shard), ognuno con il suo lock: richieste su chiavi diverse
+# non si bloccano a vicenda. Ogni segmento è un LRU limitato in numero di elementi e in byte
+
+
+def stima_dimensione(valore):
+
+    #stima approssimativa dei byte occupati da una risposta (protobuf o dizionario json)
+    if hasattr(valore, "ByteSize"):
+        return sys.getsizeof(valore) + valore.ByteSize()
+    if isinstance(valore, dict):
+        return sys.getsizeof(valore) + sum(stima_dimensione(k) + stima_dimensione(v) for k, v in valore.items())
+    if isinstance(valore, (list, tuple)):
+        return sys.getsizeof(valore) + sum(stima_dimensione(v) for v in valore)
+    return sys.getsizeof(valore)
+
+
+class Segmento:
+    def __init__(self, max_entries, max_bytes):
+
+        #Chiave = "[metodo/]client_id:message_id" -> valore = (risultato, scadenza, dimensione), in ordine di utilizzo
+        self.dati = OrderedDict()
+        #heap delle scadenze (scadenza, chiave): le chiavi scadute si trovano in cima senza scorrere tutto
+        self.scadenze = []
+        self.bytes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evizioni = 0
+        self.lock = threading.Lock()
+
+    def _rimuovi(self, key):
+        _, _, dimensione = self.dati.pop(key)
+        self.bytes -= dimensione
+
+    def rimuovi_scaduti(self, now):
+
+        #da chiamare con il lock preso: toglie solo le chiavi in cima all'heap già scadute
+        rimossi = []
+        while self.scadenze and self.scadenze[0][0] <= now:
+            scadenza, key = heapq.heappop(self.scadenze)
+            entry = self.dati.get(key)
+            #l'elemento nell'heap può essere vecchio (chiave già rimossa o salvata di nuovo)
+            if entry is not None and entry[1] == scadenza:
+                self._rimuovi(key)
+                rimossi.append(key)
+
+        #se l'heap si riempie di elementi obsoleti lo ricostruisco
+        if len(self.scadenze) > 2 * len(self.dati) + 64:
+            self.scadenze = [(v[1], k) for k, v in self.dati.items()]
+            heapq.heapify(self.scadenze)
+        return rimossi
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.dati.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                self._rimuovi(key)
+                return None
+            self.dati.move_to_end(key)
+            return entry[0]
+
+    def save(self, key, response, scadenza, now):
+        dimensione = stima_dimensione(key) + stima_dimensione(response)
+        with self.lock:
+            if key in self.dati:
+                self._rimuovi(key)
+            self.dati[key] = (response, scadenza, dimensione)
+            self.bytes += dimensione
+            heapq.heappush(self.scadenze, (scadenza, key))
+
+            self.rimuovi_scaduti(now)
+
+            #se supero i limiti elimino le chiavi usate meno di recente (LRU)
+            while self.dati and (len(self.dati) > self.max_entries or self.bytes > self.max_bytes):
+                vecchia, _ = next(iter(self.dati.items()))
+                self._rimuovi(vecchia)
+                self.evizioni += 1
+
+    def remove(self, key):
+        with self.lock:
+            if key in self.dati:
+                self._rimuovi(key)
+                return True
+            return False
+
 
 class Cache:
-    def __init__(self,ttl_seconds=300):
+    def __init__(self, ttl_seconds=300, num_shards=16, max_entries=100000, max_bytes=64 * 1024 * 1024, nome="risposte"):
 
-        #mi creo una in-memory storage dove salviamo i dati
-        #Chiave = "client_id:message_id" -> valore = {risultato, timestamp}
-        self.cache = {}
+        self.nome = nome  #etichetta della cache nelle metriche
         self.ttl = ttl_seconds
+        self.num_shards = num_shards
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        #i limiti complessivi vengono divisi tra i segmenti
+        self.segmenti = [
+            Segmento(max(1, max_entries // num_shards), max(1, max_bytes // num_shards))
+            for _ in range(num_shards)
+        ]
 
-        #trasforma le richieste da parallelo in sequenziale,è un mutex (2 richieste, ne gestisco 1 per volta)
-        self.lock = threading.Lock()
         self.pulizia = threading.Thread(target=self.pulisci_cache, daemon=True)
         self.pulizia.start()
 
-    def get_response(self, client_id, message_id):
+    def _segmento(self, key):
+        return self.segmenti[hash(key) % self.num_shards]
 
-        #creiamo la chiave univoca combinando sia il client_id e il message_id
-        key = f"{client_id}:{message_id}"
+    def chiave(self, client_id, message_id, metodo=None):
+        #creiamo la chiave univoca combinando sia il client_id e il message_id; il metodo gRPC separa le
+        #risposte di tipo diverso (CheckUser e CheckUsers) che arrivano con lo stesso message_id
+        if metodo:
+            return f"{metodo}/{client_id}:{message_id}"
+        return f"{client_id}:{message_id}"
 
-        #senza il with potevamo usare lock.acquire e lock.realise
-        with self.lock:
-            data = self.cache.get(key)
-            if data:
-                return data['response']
-            return None
+    def get_response(self, client_id, message_id, metodo=None):
+
+        key = self.chiave(client_id, message_id, metodo)
+        risposta = self._segmento(key).get(key, time.time())
+        conta_cache(self.nome, risposta is not None)
+        return risposta
 
 
-    def save_response(self, client_id, message_id, response):
+    def save_response(self, client_id, message_id, response, metodo=None):
 
-        key = f"{client_id}:{message_id}"
+        key = self.chiave(client_id, message_id, metodo)
 
         #Salva una risposta appena calcolata
-        with self.lock:
-            self.cache[key] = {
-                'response': response,
-                'timestamp': time.time()
-            }
+        now = time.time()
+        self._segmento(key).save(key, response, now + self.ttl, now)
 
-    def remove_response(self, client_id, message_id):
+    def remove_response(self, client_id, message_id, metodo=None):
 
-        key = f"{client_id}:{message_id}"
-        with self.lock:
-            if key in self.cache:
-                del self.cache[key]
-                print(f"Rimossa chiave obsoleta: {key}")
-                return True
-            else:
-                print(f"Tentativo di rimuovere chiave inesistente: {key}")
-                return False
+        key = self.chiave(client_id, message_id, metodo)
+        if self._segmento(key).remove(key):
+            log.debug("Rimossa chiave obsoleta: %s", key)
+            return True
+        else:
+            log.debug("Tentativo di rimuovere chiave inesistente: %s", key)
+            return False
+
+    def get_stats(self):
+
+        elementi = 0
+        occupazione = 0
+        evizioni = 0
+        for segmento in self.segmenti:
+            with segmento.lock:
+                elementi += len(segmento.dati)
+                occupazione += segmento.bytes
+                evizioni += segmento.evizioni
+        return {
+            "entries": elementi,
+            "bytes": occupazione,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": evizioni,
+            "shards": self.num_shards,
+        }
 
 
     def pulisci_cache(self):
-        #controlla sempre e  ogni 60 secondi cancella le cose vecchie di 5 minuti
+        #ogni 60 secondi cancella le chiavi scadute, un segmento alla volta:
+        #il lock di ogni segmento è tenuto solo per le chiavi effettivamente scadute
         while True:
             time.sleep(60)
-            limit = time.time() - self.ttl  # 300 secondi = 5 minuti
-
-            with self.lock:
-                # Creo una lista delle chiavi vecchie da cancellare
-                keys_to_delete = [k for k, v in self.cache.items() if v['timestamp'] < limit]
 
-                for k in keys_to_delete:
-                    del self.cache[k]
+            for segmento in self.segmenti:
+                with segmento.lock:
+                    rimossi = segmento.rimuovi_scaduti(time.time())
 
+                for k in rimossi:
                     try:
                         request_id = k.split(':', 1)[1]
-                        print(f"Ho eliminato il Request-ID scaduto: {request_id}")
+                        log.debug("Ho eliminato il Request-ID scaduto: %s", request_id)
                     except IndexError:
 
-                        print(f"Eliminato: {k}")
\ No newline at end of file
+                        log.debug("Eliminato: %s", k)
+
+
+class UserExistenceCache:
+    def __init__(self, ttl_positivo=60, ttl_negativo=10, num_shards=16, max_entries=100000):
+
+        #Chiave = email -> valore = True/False (utente registrato o no)
+        #l'esito negativo dura meno: un utente appena registrato deve comparire subito
+        self.ttl_positivo = ttl_positivo
+        self.ttl_negativo = ttl_negativo
+        self.num_shards = num_shards
+        self.segmenti = [Segmento(max(1, max_entries // num_shards), sys.maxsize) for _ in range(num_shards)]
+
+        #istante dell'ultima invalidazione per email: una lettura dal DB iniziata prima
+        #di un'invalidazione non deve più finire in cache (evita dati vecchi dopo una delete)
+        self.invalidazioni = [Segmento(max(1, max_entries // num_shards), sys.maxsize) for _ in range(num_shards)]
+        self.ttl_invalidazione = max(ttl_positivo, ttl_negativo)
+        #un lock per segmento tiene insieme controllo e scrittura di save() rispetto a invalidate()
+        self.locks = [threading.Lock() for _ in range(num_shards)]
+
+        #le insert/delete fatte da altri processi arrivano come notifiche (LISTEN su Postgres):
+        #finché l'ascolto non è attivo la cache non risponde e non salva niente
+        self.sincronizzata = False
+        self.attivata_alle = 0.0
+
+        self.stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidate_count = 0
+
+    def _indice(self, email):
+        return hash(email) % self.num_shards
+
+    def get(self, email):
+
+        #restituisce True/False se l'esito è in cache, None se bisogna chiedere al DB
+        esito = self.segmenti[self._indice(email)].get(email, time.time()) if self.sincronizzata else None
+        with self.stats_lock:
+            if esito is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        conta_cache("esistenza_utenti", esito is not None)
+        return esito
+
+    def save(self, email, exists, letto_alle):
+
+        #letto_alle = istante in cui è partita la query sul DB
+        i = self._indice(email)
+        with self.locks[i]:
+            #letture partite prima dell'ascolto possono aver perso una modifica
+            if not self.sincronizzata or letto_alle <= self.attivata_alle:
+                return
+            now = time.time()
+            invalidata_alle = self.invalidazioni[i].get(email, now)
+            if invalidata_alle is not None and letto_alle <= invalidata_alle:
+                return
+
+            ttl = self.ttl_positivo if exists else self.ttl_negativo
+            self.segmenti[i].save(email, exists, now + ttl, now)
+
+    def invalidate(self, email):
+
+        #da chiamare dopo ogni insert/delete sulla tabella users (e per ogni notifica degli altri processi)
+        i = self._indice(email)
+        with self.locks[i]:
+            now = time.time()
+            self.invalidazioni[i].save(email, now, now + self.ttl_invalidazione, now)
+            self.segmenti[i].remove(email)
+        with self.stats_lock:
+            self.invalidate_count += 1
+
+    def attiva(self):
+        #l'ascolto delle notifiche è partito: da qui in poi nessuna modifica va persa
+        self.attivata_alle = time.time()
+        self.sincronizzata = True
+
+    def disattiva(self):
+
+        #ascolto interrotto: le notifiche perse potrebbero riguardare qualsiasi email, svuoto tutto
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            self.sincronizzata = False
+            for segmento in self.segmenti:
+                with segmento.lock:
+                    segmento.dati.clear()
+                    segmento.scadenze.clear()
+                    segmento.bytes = 0
+        finally:
+            for lock in self.locks:
+                lock.release()
+
+    def get_stats(self):
+        with self.stats_lock:
+            totale = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / totale, 4) if totale else 0.0,
+                "invalidations": self.invalidate_count,
+                "entries": sum(len(s.dati) for s in self.segmenti),
+                "ttl_positivo": self.ttl_positivo,
+                "ttl_negativo": self.ttl_negativo,
+                "sincronizzata": self.sincronizzata,
+            }
@@ -1,35 +1,70 @@
 import os
 import time
+import threading
+from contextlib import contextmanager
 import psycopg
+from psycopg_pool import ConnectionPool, PoolTimeout
 from dotenv import load_dotenv
+from metriche import DURATA_DB
+from logger import get_logger
 
 # Carica le variabili dal file .env
 load_dotenv()
 
+log = get_logger("user_manager.database_postgres")
+
+#Parametri del pool configurabili da ambiente (docker-compose)
+POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "2"))
+POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "20"))
+POOL_MAX_IDLE = float(os.getenv("PG_POOL_MAX_IDLE", "300"))            #secondi prima di chiudere una connessione inattiva
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("PG_POOL_ACQUIRE_TIMEOUT", "5"))  #attesa massima per ottenere una connessione
+POOL_MAX_LIFETIME = float(os.getenv("PG_POOL_MAX_LIFETIME", "1800"))   #dopo quanto una connessione viene rinnovata
+
+#canale NOTIFY con le email inserite o cancellate da users: le cache di esistenza di tutti i processi
+#(e di tutte le repliche) lo ascoltano. La notifica parte solo al commit della transazione che la invia
+CANALE_UTENTI = "utenti_modificati"
+
+
 class Database:
     def __init__(self):
         self.url = os.getenv("DATABASE_URL")
+        self.pool = None
+
+        #statistiche sul tempo di acquisizione delle connessioni dal pool
+        self.stats_lock = threading.Lock()
+        self.acquisizioni = 0
+        self.acquisizioni_fallite = 0
+        self.attesa_totale = 0.0
+        self.attesa_massima = 0.0
+
         self.connection_db()
 
     def connection_db(self):
 
+        #il pool è unico per tutto il processo: lo condividono i thread di Flask e del server gRPC
+        self.pool = ConnectionPool(
+            self.url,
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            max_idle=POOL_MAX_IDLE,
+            timeout=POOL_ACQUIRE_TIMEOUT,
+            max_lifetime=POOL_MAX_LIFETIME,
+            check=ConnectionPool.check_connection,  #health-check prima di consegnare la connessione
+            name="user_manager",
+            open=True,
+        )
+
         tentativi = 10
         while tentativi > 0:
-            connection = None
             try:
-                connection = psycopg.connect(self.url)
-                print("Postgres connesso con successo")
-                self.crea_tabella(connection)
-
-                connection.close()
+                with self.pool.connection() as connection:
+                    log.info("Postgres connesso con successo")
+                    self.crea_tabella(connection)
                 return
 
             except Exception as e:
 
-                 if connection is not None:
-                    connection.close()
-
-                 print("Riprovo tra 3 secondi...")
+                 log.warning("Connessione a Postgres fallita (%s), riprovo tra 3 secondi...", e)
                  time.sleep(3)
                  tentativi -= 1
 
@@ -38,7 +73,7 @@ class Database:
     def crea_tabella(self, conn):
 
         query = """
-        CREATE TABLE IF NOT EXISTS 
+        CREATE TABLE IF NOT EXISTS
         users (
             email VARCHAR(255) PRIMARY KEY,
             password VARCHAR(255),
@@ -48,14 +83,183 @@ class Database:
         );
         """
 
+        #risposte delle registrazioni per Request-ID: l'At-Most-Once sopravvive ai riavvii ed è
+        #condiviso da tutti i processi e le repliche dello User Manager
+        query_idempotenza = """
+        CREATE TABLE IF NOT EXISTS
+        richieste_idempotenti (
+            request_id VARCHAR(255) PRIMARY KEY,
+            email VARCHAR(255),
+            status INTEGER,
+            body JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS richieste_idempotenti_created_at ON richieste_idempotenti (created_at);
+        """
+
+        #cancellazioni da propagare al Data Collector, scritte nella stessa transazione della DELETE
+        query_outbox = """
+        CREATE TABLE IF NOT EXISTS
+        outbox_cancellazioni (
+            id BIGSERIAL PRIMARY KEY,
+            email VARCHAR(255) NOT NULL,
+            tentativi INTEGER DEFAULT 0,
+            prossimo_tentativo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS outbox_cancellazioni_prossimo_tentativo ON outbox_cancellazioni (prossimo_tentativo);
+        """
+
         cursore = conn.cursor()
         cursore.execute(query)
+        cursore.execute(query_idempotenza)
+        cursore.execute(query_outbox)
         conn.commit()
         cursore.close()
 
-    def get_connection(self):
+    def importa_utenti(self, righe):
+
+        #righe = [(riga, email, hash, nome, cognome)]: COPY in una tabella temporanea e poi un solo
+        #INSERT ... SELECT verso users; restituisce le email effettivamente create
+        with self.get_connection("importa_utenti") as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    """
+                    CREATE TEMP TABLE utenti_import (
+                        riga INTEGER, email VARCHAR(255), password VARCHAR(255),
+                        nome VARCHAR(100), cognome VARCHAR(100)
+                    ) ON COMMIT DROP
+                    """
+                )
+                with cur.copy("COPY utenti_import (riga, email, password, nome, cognome) FROM STDIN") as copy:
+                    for r in righe:
+                        copy.write_row(r)
+
+                #a parità di email nello stesso file vince la prima riga
+                cur.execute(
+                    """
+                    INSERT INTO users (email, password, nome, cognome)
+                    SELECT DISTINCT ON (email) email, password, nome, cognome
+                    FROM utenti_import
+                    ORDER BY email, riga
+                    ON CONFLICT (email) DO NOTHING
+                    RETURNING email
+                    """
+                )
+                create = {r[0] for r in cur.fetchall()}
+                if create:
+                    #le cache di esistenza degli altri processi dimenticano l'esito "non registrato"
+                    cur.execute("SELECT pg_notify(%s, email) FROM unnest(%s::text[]) AS email", (CANALE_UTENTI, list(create)))
+                conn.commit()
+            finally:
+                cur.close()
+        return create
+
+    def pulisci_richieste_idempotenti(self, eta_massima, blocco=1000):
+
+        #cancella a blocchi le risposte più vecchie di 'eta_massima' secondi; SKIP LOCKED evita che
+        #più processi si blocchino a vicenda sulle stesse righe
+        totale = 0
+        while True:
+            with self.get_connection("pulizia_idempotenza") as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute(
+                        """
+                        DELETE FROM richieste_idempotenti WHERE request_id IN (
+                            SELECT request_id FROM richieste_idempotenti
+                            WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                            LIMIT %s FOR UPDATE SKIP LOCKED
+                        )
+                        """,
+                        (eta_massima, blocco)
+                    )
+                    conn.commit()
+                    cancellate = cur.rowcount
+                finally:
+                    cur.close()
+            totale += cancellate
+            if cancellate < blocco:
+                return totale
+
+    def ascolta(self, canale, su_notifica, su_connessione, su_disconnessione, controllo=30):
+
+        #thread con una connessione dedicata (fuori dal pool) in LISTEN sul canale: su_notifica(payload)
+        #per ogni notifica; su_connessione/su_disconnessione quando l'ascolto parte o si interrompe
+        #(le notifiche arrivate nel frattempo sono perse). Ogni 'controllo' secondi senza notifiche
+        #una query verifica che la connessione sia ancora viva
+        def loop():
+            while True:
+                try:
+                    with psycopg.connect(self.url, autocommit=True) as conn:
+                        conn.execute(f"LISTEN {canale}")
+                        su_connessione()
+                        log.info("In ascolto sul canale %s", canale)
+                        while True:
+                            for notifica in conn.notifies(timeout=controllo):
+                                su_notifica(notifica.payload)
+                            conn.execute("SELECT 1")
+                except Exception as e:
+                    su_disconnessione()
+                    log.warning("Ascolto del canale %s interrotto (%s), riprovo tra 3 secondi...", canale, e)
+                    time.sleep(3)
+
+        thread = threading.Thread(target=loop, name=f"listen-{canale}", daemon=True)
+        thread.start()
+        return thread
+
+    @contextmanager
+    def get_connection(self, operazione="query"):
+
+        #prende in prestito una connessione dal pool e la restituisce all'uscita dal with
+        #(commit se tutto ok, rollback in caso di eccezione); 'operazione' è l'etichetta della metrica
+        #con il tempo in cui la connessione resta in uso
+        inizio = time.perf_counter()
+        acquisita = False
+        try:
+            with self.pool.connection() as connection:
+                acquisita = True
+                attesa = time.perf_counter() - inizio
+                self.registra_attesa(attesa)
+                DURATA_DB.labels(db="postgres", operazione="attesa_pool").observe(attesa)
+                try:
+                    yield connection
+                finally:
+                    DURATA_DB.labels(db="postgres", operazione=operazione).observe(time.perf_counter() - inizio - attesa)
+        except PoolTimeout:
+            if not acquisita:
+                with self.stats_lock:
+                    self.acquisizioni_fallite += 1
+            raise
+
+    def registra_attesa(self, attesa):
+        with self.stats_lock:
+            self.acquisizioni += 1
+            self.attesa_totale += attesa
+            self.attesa_massima = max(self.attesa_massima, attesa)
+
+    def get_stats(self):
+
+        #statistiche utili per dimensionare il pool
+        pool_stats = self.pool.get_stats()
+        with self.stats_lock:
+            media_ms = (self.attesa_totale / self.acquisizioni * 1000) if self.acquisizioni else 0.0
+            return {
+                "min_size": POOL_MIN_SIZE,
+                "max_size": POOL_MAX_SIZE,
+                "pool_size": pool_stats.get("pool_size", 0),
+                "in_use": pool_stats.get("pool_size", 0) - pool_stats.get("pool_available", 0),
+                "available": pool_stats.get("pool_available", 0),
+                "waiting": pool_stats.get("requests_waiting", 0),
+                "acquisizioni": self.acquisizioni,
+                "acquisizioni_fallite": self.acquisizioni_fallite,
+                "acquire_latency_avg_ms": round(media_ms, 3),
+                "acquire_latency_max_ms": round(self.attesa_massima * 1000, 3),
+            }
 
-        #fa una nuova connessione che ovviamente poi dobbiamo chiudere in app.py
-        return psycopg.connect(self.url)
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
 
-database_postgres= Database()
\ No newline at end of file
+database_postgres= Database()
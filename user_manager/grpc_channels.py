@@ -0,0 +1,112 @@
+import json
+import os
+import threading
+import grpc
+from logger import get_logger
+
+log = get_logger("grpc_channels")
+
+# Registro dei canali gRPC del processo: un solo canale per target, creato alla prima richiesta
+# e riusato da tutti i thread (i canali gRPC sono thread-safe e si riconnettono da soli)
+
+KEEPALIVE_MS = 30000  #intervallo dei ping dei client; i server ne accettano fino al doppio
+#timeout di default delle chiamate (secondi, retry compresi). Il timeout si passa a ogni chiamata
+#(stub.Metodo(richiesta, timeout=...)) e non sta nel service config: lì varrebbe come limite anche per
+#le chiamate che ne chiedono uno più lungo (es. OUTBOX_TIMEOUT della DeleteDataBatch)
+GRPC_TIMEOUT = float(os.getenv("GRPC_TIMEOUT", "5"))
+
+#Politica di retry condivisa da tutti i client gRPC
+RETRY_POLICY = {
+    "retryPolicy": {
+        "maxAttempts": 5,                       #Riprovare massimo 5 volte
+        "initialBackoff": "0.5s",               #Aspetta 0.5s al primo errore
+        "maxBackoff": "2s",                     #massima attesa
+        "backoffMultiplier": 2,                 #Raddoppia l'attesa ogni volta
+        "retryableStatusCodes": ["UNAVAILABLE"] #Riprova solo se il server è irraggiungibile
+    }
+}
+
+
+def crea_service_config(service_name):
+
+    #il service_config va passato come stringa json, altrimenti grpc da errore
+    service_config = {
+        "methodConfig": [
+            dict({"name": [{"service": service_name}]}, **RETRY_POLICY)
+        ]
+    }
+    return json.dumps(service_config)
+
+
+def opzioni_canale(service_name):
+    #opzioni comuni ai canali sincroni e a quelli grpc.aio
+    return [
+        ('grpc.service_config', crea_service_config(service_name)),
+        ('grpc.enable_retries', 1),
+        ('grpc.keepalive_time_ms', KEEPALIVE_MS),     #ping periodici per tenere viva la connessione HTTP/2
+        ('grpc.keepalive_permit_without_calls', 1),
+    ]
+
+
+def opzioni_server():
+    #i server devono accettare i ping dei client: con la politica di default (un ping ogni 5 minuti
+    #senza chiamate in corso) rispondono con GOAWAY "too_many_pings" e il canale si riconnette
+    return [
+        ('grpc.so_reuseport', 1),  #più processi (server.py) sulla stessa porta
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.min_ping_interval_without_data_ms', KEEPALIVE_MS // 2),
+    ]
+
+
+class ChannelRegistry:
+    def __init__(self):
+        #Chiave = target -> valore = canale; Chiave = (target, classe stub) -> valore = stub
+        self.canali = {}
+        self.stubs = {}
+        self.lock = threading.Lock()
+
+    def get_channel(self, target, service_name):
+
+        with self.lock:
+            channel = self.canali.get(target)
+            if channel is None:
+                # insecure_channel non apre subito la connessione: si connette (e riconnette) alla prima chiamata
+                channel = grpc.insecure_channel(target, options=opzioni_canale(service_name))
+                self.canali[target] = channel
+                log.info("Creato canale gRPC verso %s", target)
+            return channel
+
+    def get_stub(self, target, stub_class, service_name):
+
+        key = (target, stub_class)
+        with self.lock:
+            stub = self.stubs.get(key)
+        if stub is not None:
+            return stub
+
+        channel = self.get_channel(target, service_name)
+        with self.lock:
+            #se un altro thread l'ha già creato nel frattempo uso il suo
+            stub = self.stubs.setdefault(key, stub_class(channel))
+        return stub
+
+    def reset(self, target):
+
+        #chiude il canale di un target (es. dopo uno shutdown): verrà ricreato alla prossima richiesta
+        with self.lock:
+            channel = self.canali.pop(target, None)
+            for key in [k for k in self.stubs if k[0] == target]:
+                del self.stubs[key]
+        if channel is not None:
+            channel.close()
+
+    def close_all(self):
+        with self.lock:
+            canali = list(self.canali.values())
+            self.canali.clear()
+            self.stubs.clear()
+        for channel in canali:
+            channel.close()
+
+
+channel_registry = ChannelRegistry()
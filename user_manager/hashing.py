@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent import futures
+from itertools import repeat
+from metriche import cronometra
+
+# Hash delle password: scrypt (memory-hard) con sale per utente e costo configurabile, salvato come
+#   scrypt$n$r$p$sale$hash
+# Le righe vecchie (sha256 esadecimale senza sale) vengono ancora riconosciute e riscritte con
+# scrypt al primo login riuscito. Il calcolo gira in un pool di processi dedicato, così non tiene
+# occupati i thread di Flask e usa tutti i core.
+
+HASH_SCRYPT_N = int(os.getenv("HASH_SCRYPT_N", "16384"))   #costo in CPU/memoria (potenza di 2)
+HASH_SCRYPT_R = int(os.getenv("HASH_SCRYPT_R", "8"))
+HASH_SCRYPT_P = int(os.getenv("HASH_SCRYPT_P", "1"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))     #processi del pool per ogni processo che serve le API REST
+LUNGHEZZA_SALE = 16
+LUNGHEZZA_HASH = 32
+
+
+def _b64(dati):
+    return base64.b64encode(dati).decode()
+
+
+class HasherScrypt:
+    nome = "scrypt"
+
+    def __init__(self, n=HASH_SCRYPT_N, r=HASH_SCRYPT_R, p=HASH_SCRYPT_P):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    @staticmethod
+    def _scrypt(password, sale, n, r, p):
+        #maxmem: scrypt usa 128 * n * r * p byte, il default di OpenSSL (32MB) non basta per costi alti
+        return hashlib.scrypt(password.encode(), salt=sale, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p, dklen=LUNGHEZZA_HASH)
+
+    def hash(self, password):
+        sale = os.urandom(LUNGHEZZA_SALE)
+        digest = self._scrypt(password, sale, self.n, self.r, self.p)
+        return f"{self.nome}${self.n}${self.r}${self.p}${_b64(sale)}${_b64(digest)}"
+
+    def verifica(self, password, salvato):
+        _, n, r, p, sale, digest = salvato.split("$")
+        calcolato = self._scrypt(password, base64.b64decode(sale), int(n), int(r), int(p))
+        return hmac.compare_digest(calcolato, base64.b64decode(digest))
+
+    def da_aggiornare(self, salvato):
+        #hash di un altro algoritmo o fatto con un costo diverso da quello configurato ora
+        if not salvato.startswith(f"{self.nome}$"):
+            return True
+        _, n, r, p, _, _ = salvato.split("$")
+        return (int(n), int(r), int(p)) != (self.n, self.r, self.p)
+
+
+class HasherSha256:
+    #formato storico: sha256 esadecimale della password, senza sale (solo verifica)
+    nome = "sha256"
+
+    def hash(self, password):
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def verifica(self, password, salvato):
+        return hmac.compare_digest(self.hash(password), salvato)
+
+    def da_aggiornare(self, salvato):
+        return "$" in salvato
+
+
+HASHERS = {"scrypt": HasherScrypt, "sha256": HasherSha256}
+
+
+def riconosci(salvato):
+    #il prefisso "nome$" indica l'algoritmo; senza prefisso è il vecchio sha256
+    nome = salvato.split("$", 1)[0] if "$" in salvato else "sha256"
+    return HASHERS[nome]()
+
+
+# funzioni eseguite nei processi del pool (devono essere a livello di modulo per il pickle)
+def _calcola_hash(nome, parametri, password):
+    return HASHERS[nome](**parametri).hash(password)
+
+
+def _verifica(nome, parametri, password, salvato):
+    try:
+        corretta = riconosci(salvato).verifica(password, salvato)
+    except (KeyError, ValueError):
+        #algoritmo sconosciuto o hash illeggibile: è un login fallito, non un errore del server
+        return False, None
+    if not corretta:
+        return False, None
+    #password giusta: se l'hash salvato è vecchio (sha256 o costo diverso) restituisco quello nuovo
+    attuale = HASHERS[nome](**parametri)
+    if attuale.da_aggiornare(salvato):
+        return True, attuale.hash(password)
+    return True, None
+
+
+class PasswordHasher:
+    def __init__(self, nome="scrypt", parametri=None, workers=HASH_WORKERS):
+
+        #nome/parametri: hasher usato per le nuove password; workers=0 calcola nel thread chiamante
+        self.nome = nome
+        self.parametri = parametri if parametri is not None else {"n": HASH_SCRYPT_N, "r": HASH_SCRYPT_R, "p": HASH_SCRYPT_P}
+        self.workers = workers
+        self.executor = None
+        self.hash_fittizio = None
+        self.lock = threading.Lock()
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                #creato alla prima richiesta, così esiste solo nei processi che calcolano hash
+                #(i worker HTTP, non i processi gRPC) e viene creato dopo il fork dei worker gunicorn.
+                #spawn e non fork, come in server.py: qui il processo ha già thread e canali gRPC aperti
+                #(outbox, LISTEN, pulizia della cache) e un fork li copierebbe a metà. I processi del pool
+                #reimportano il modulo principale: server.py in produzione, app.py con "python app.py"
+                self.executor = futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.executor
+
+    def _esegui(self, funzione, *args):
+        if self.workers <= 0:
+            return funzione(*args)
+        return self._get_executor().submit(funzione, *args).result()
+
+    @cronometra("hash_password")
+    def hash(self, password):
+        return self._esegui(_calcola_hash, self.nome, self.parametri, password)
+
+    @cronometra("hash_password_blocco")
+    def hash_molti(self, passwords):
+
+        #hash di una lista di password divisa tra tutti i processi del pool (import massivo)
+        if self.workers <= 0:
+            return [_calcola_hash(self.nome, self.parametri, p) for p in passwords]
+        blocchi = max(1, len(passwords) // (self.workers * 4))
+        return list(self._get_executor().map(
+            _calcola_hash, repeat(self.nome), repeat(self.parametri), passwords, chunksize=blocchi
+        ))
+
+    @cronometra("verifica_password")
+    def verifica(self, password, salvato):
+
+        #-> (password corretta, nuovo hash da salvare oppure None se quello salvato va già bene)
+        if not salvato:
+            #utente inesistente: verifico comunque contro un hash fittizio, così il tempo di risposta
+            #non dice se l'account esiste
+            self._esegui(_verifica, self.nome, self.parametri, password, self._get_hash_fittizio())
+            return False, None
+        return self._esegui(_verifica, self.nome, self.parametri, password, salvato)
+
+    def _get_hash_fittizio(self):
+        #hash di una password casuale con il costo attuale, calcolato una volta per processo
+        if self.hash_fittizio is None:
+            self.hash_fittizio = self._esegui(_calcola_hash, self.nome, self.parametri, os.urandom(16).hex())
+        return self.hash_fittizio
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
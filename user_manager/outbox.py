@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from metriche import tempo_ciclo
+from logger import get_logger
+
+# Dispatcher dell'outbox delle cancellazioni: DELETE /users scrive l'email in outbox_cancellazioni
+# nella stessa transazione in cui cancella l'utente e risponde subito. Questo thread prende le righe
+# a blocchi (FOR UPDATE SKIP LOCKED, così più processi non si pestano i piedi), manda una sola
+# DeleteDataBatch al Data Collector e cancella le righe solo se la chiamata è andata a buon fine.
+# Se fallisce, le righe restano e vengono riprovate con un'attesa crescente: nessun interesse orfano.
+
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "500"))              #email per ogni DeleteDataBatch
+OUTBOX_INTERVALLO = float(os.getenv("OUTBOX_INTERVALLO", "1"))     #secondi di attesa quando l'outbox è vuoto
+OUTBOX_TIMEOUT = float(os.getenv("OUTBOX_TIMEOUT", "10"))          #timeout della chiamata gRPC
+OUTBOX_BACKOFF_MAX = int(os.getenv("OUTBOX_BACKOFF_MAX", "300"))   #attesa massima tra due tentativi
+
+log = get_logger("user_manager.outbox")
+
+
+class DispatcherCancellazioni:
+    def __init__(self, database, invia_fn, batch=OUTBOX_BATCH, intervallo=OUTBOX_INTERVALLO):
+
+        #invia_fn([(email, creato_alle)]) -> numero di interessi cancellati (solleva eccezione se fallisce);
+        #creato_alle = secondi unix della cancellazione dell'utente (riga dell'outbox)
+        self.database = database
+        self.invia_fn = invia_fn
+        self.batch = batch
+        self.intervallo = intervallo
+        self.thread = None
+
+        self.stats_lock = threading.Lock()
+        self.inviate = 0
+        self.chiamate = 0
+        self.errori = 0
+        self.ultimo_errore = None
+
+    def avvia(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._loop, name="outbox-cancellazioni", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                #se il blocco era pieno c'è probabilmente altro da inviare: riparto subito
+                if self.esegui_batch() < self.batch:
+                    time.sleep(self.intervallo)
+            except Exception as e:
+                log.exception("Errore nel dispatcher dell'outbox: %s", e)
+                time.sleep(self.intervallo)
+
+    @tempo_ciclo("outbox_cancellazioni")
+    def esegui_batch(self):
+
+        with self.database.get_connection("outbox_batch") as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    """
+                    SELECT id, email, EXTRACT(EPOCH FROM created_at AT TIME ZONE current_setting('TimeZone'))
+                    FROM outbox_cancellazioni
+                    WHERE prossimo_tentativo <= CURRENT_TIMESTAMP
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                    """,
+                    (self.batch,)
+                )
+                righe = cur.fetchall()
+                if not righe:
+                    conn.commit()
+                    return 0
+
+                ids = [r[0] for r in righe]
+                #la stessa email può comparire più volte (cancellata, registrata e cancellata di nuovo):
+                #vale la cancellazione più recente, che copre anche gli interessi delle precedenti
+                creato_alle = {}
+                for _, email, alle in righe:
+                    creato_alle[email] = max(float(alle), creato_alle.get(email, 0))
+                emails = sorted(creato_alle)
+                try:
+                    cancellati = self.invia_fn([(email, creato_alle[email]) for email in emails])
+                except Exception as e:
+                    #le righe restano in outbox: riprovo più tardi, con attesa che raddoppia ad ogni errore
+                    cur.execute(
+                        """
+                        UPDATE outbox_cancellazioni
+                        SET tentativi = tentativi + 1,
+                            prossimo_tentativo = CURRENT_TIMESTAMP + make_interval(secs => LEAST(%s, power(2, tentativi)))
+                        WHERE id = ANY(%s)
+                        """,
+                        (OUTBOX_BACKOFF_MAX, ids)
+                    )
+                    conn.commit()
+                    with self.stats_lock:
+                        self.errori += 1
+                        self.ultimo_errore = str(e)
+                    log.warning("Invio di %d cancellazioni fallito, riprovo più tardi: %s", len(emails), e)
+                    return 0
+
+                cur.execute("DELETE FROM outbox_cancellazioni WHERE id = ANY(%s)", (ids,))
+                conn.commit()
+            finally:
+                cur.close()
+
+        with self.stats_lock:
+            self.inviate += len(ids)
+            self.chiamate += 1
+        log.info("Propagate %d cancellazioni al Data Collector (%d interessi rimossi)", len(emails), cancellati)
+        return len(ids)
+
+    def get_stats(self):
+
+        with self.database.get_connection("outbox_stats") as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT count(*), min(created_at) FROM outbox_cancellazioni")
+                in_attesa, piu_vecchia = cur.fetchone()
+            finally:
+                cur.close()
+
+        with self.stats_lock:
+            return {
+                "in_attesa": in_attesa,
+                "piu_vecchia": piu_vecchia.isoformat() if piu_vecchia else None,
+                "cancellazioni_inviate": self.inviate,
+                "chiamate_batch": self.chiamate,
+                "errori": self.errori,
+                "ultimo_errore": self.ultimo_errore,
+            }
@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import tempfile
+from gunicorn.app.base import BaseApplication
+from logger import get_logger
+
+# Avvio di produzione dello User Manager (al posto di "python app.py", che resta per lo sviluppo):
+# - le API REST girano in gunicorn con HTTP_WORKERS processi, ognuno con HTTP_THREADS thread
+# - il server gRPC gira in GRPC_PROCESSES processi separati sulla stessa porta (SO_REUSEPORT)
+# Ogni processo ha il suo pool Postgres: PG_POOL_MAX_TOTAL connessioni in tutto, divise tra gli
+# HTTP_WORKERS + GRPC_PROCESSES processi (PG_POOL_MAX_SIZE di ognuno viene calcolato qui)
+
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "4"))
+HTTP_THREADS = int(os.getenv("HTTP_THREADS", "8"))
+GRPC_PROCESSES = int(os.getenv("GRPC_PROCESSES", "2"))
+GRPC_THREADS = int(os.getenv("GRPC_THREADS", "10"))
+PORTA_HTTP = int(os.getenv("PORT", "5000"))
+#sotto il max_connections di default di Postgres (100), lasciando margine per psql, backup e LISTEN
+PG_POOL_MAX_TOTAL = int(os.getenv("PG_POOL_MAX_TOTAL", "80"))
+
+log = get_logger("user_manager.server")
+
+
+def prepara_metriche():
+    #tutti i processi (worker gunicorn e processi gRPC) scrivono le metriche nella stessa cartella e /metrics
+    #le somma: la variabile va impostata prima che un processo importi prometheus_client (metriche.py)
+    cartella = os.getenv("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="metriche-")
+    os.makedirs(cartella, exist_ok=True)
+    for nome in os.listdir(cartella):
+        if nome.endswith(".db"):
+            os.remove(os.path.join(cartella, nome))  #valori di un avvio precedente
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = cartella
+
+
+def prepara_pool_postgres():
+
+    #i processi figli (spawn e worker gunicorn) ereditano l'ambiente: database_postgres legge da qui la
+    #dimensione del proprio pool. Ogni processo gRPC tiene anche una connessione fuori pool per il LISTEN
+    processi = HTTP_WORKERS + GRPC_PROCESSES
+    per_processo = max(1, (PG_POOL_MAX_TOTAL - GRPC_PROCESSES) // processi)
+    os.environ["PG_POOL_MAX_SIZE"] = str(per_processo)
+    os.environ["PG_POOL_MIN_SIZE"] = str(min(int(os.getenv("PG_POOL_MIN_SIZE", "2")), per_processo))
+    log.info("Pool Postgres: %d connessioni per processo, %d processi (massimo %d)",
+             per_processo, processi, PG_POOL_MAX_TOTAL)
+
+
+def processo_grpc():
+    #app viene importato qui, nel processo figlio: pool, cache e canali non sono condivisi tra processi
+    import app
+    app.start_grpc_server(GRPC_THREADS)
+
+
+def post_worker_init(worker):
+    #hook di gunicorn: il worker ha già caricato app, avvio i suoi thread in background
+    import app
+    app.avvia_thread_background()
+
+
+class ServerHTTP(BaseApplication):
+    def __init__(self, opzioni):
+        self.opzioni = opzioni
+        super().__init__()
+
+    def load_config(self):
+        for chiave, valore in self.opzioni.items():
+            self.cfg.set(chiave, valore)
+
+    def load(self):
+        #senza preload ogni worker importa app dopo il fork e apre le proprie connessioni
+        from app import app
+        return app
+
+
+if __name__ == '__main__':
+    prepara_metriche()
+    prepara_pool_postgres()
+
+    #spawn e non fork: gRPC non supporta il fork di un processo che lo ha già inizializzato
+    contesto = multiprocessing.get_context("spawn")
+    for i in range(GRPC_PROCESSES):
+        contesto.Process(target=processo_grpc, name=f"grpc-{i}", daemon=True).start()
+    log.info("User Manager gRPC: %d processi sulla porta 50051", GRPC_PROCESSES)
+
+    ServerHTTP({
+        "bind": f"0.0.0.0:{PORTA_HTTP}",
+        "workers": HTTP_WORKERS,
+        "threads": HTTP_THREADS,
+        "worker_class": "gthread",
+        "preload_app": False,
+        "post_worker_init": post_worker_init,
+    }).run()
@@ -0,0 +1,229 @@
+import pytest
+import cache
+from cache import Cache, Segmento, UserExistenceCache
+
+
+class Orologio:
+    #sostituisce time.time nel modulo cache: il tempo avanza solo quando lo decide il test
+    def __init__(self, adesso=1000.0):
+        self.adesso = adesso
+
+    def __call__(self):
+        return self.adesso
+
+    def avanza(self, secondi):
+        self.adesso += secondi
+
+
+@pytest.fixture
+def orologio(monkeypatch):
+    orologio = Orologio()
+    monkeypatch.setattr(cache.time, "time", orologio)
+    return orologio
+
+
+# --- Segmento: LRU, limiti e scadenze ---
+
+def test_segmento_elimina_la_chiave_usata_meno_di_recente():
+    segmento = Segmento(max_entries=2, max_bytes=10 ** 9)
+    segmento.save("a", 1, 100, 0)
+    segmento.save("b", 2, 100, 0)
+    assert segmento.get("a", 0) == 1   #"a" diventa la più recente
+    segmento.save("c", 3, 100, 0)
+
+    assert segmento.get("b", 0) is None
+    assert segmento.get("a", 0) == 1
+    assert segmento.get("c", 0) == 3
+    assert segmento.evizioni == 1
+
+
+def test_segmento_rispetta_il_limite_in_byte():
+    valore = "x" * 1000
+    dimensione = cache.stima_dimensione("k0") + cache.stima_dimensione(valore)
+    segmento = Segmento(max_entries=100, max_bytes=3 * dimensione)
+    for i in range(5):
+        segmento.save(f"k{i}", valore, 100, 0)
+
+    assert list(segmento.dati) == ["k2", "k3", "k4"]
+    assert segmento.bytes <= segmento.max_bytes
+    assert segmento.bytes == sum(v[2] for v in segmento.dati.values())
+
+
+def test_segmento_salvataggio_ripetuto_non_conta_due_volte_i_byte():
+    segmento = Segmento(max_entries=10, max_bytes=10 ** 9)
+    segmento.save("k", "valore", 100, 0)
+    prima = segmento.bytes
+    segmento.save("k", "valore", 200, 0)
+
+    assert segmento.bytes == prima
+    assert len(segmento.dati) == 1
+
+
+def test_segmento_chiave_scaduta_non_viene_restituita():
+    segmento = Segmento(max_entries=10, max_bytes=10 ** 9)
+    segmento.save("k", "v", scadenza=10, now=0)
+
+    assert segmento.get("k", 9) == "v"
+    assert segmento.get("k", 10) is None
+    assert "k" not in segmento.dati and segmento.bytes == 0
+
+
+def test_rimuovi_scaduti_ignora_le_scadenze_superate_da_un_nuovo_salvataggio():
+    segmento = Segmento(max_entries=10, max_bytes=10 ** 9)
+    segmento.save("k", "vecchio", scadenza=10, now=0)
+    segmento.save("k", "nuovo", scadenza=100, now=5)   #nell'heap resta anche (10, "k")
+    segmento.save("altra", "v", scadenza=8, now=5)
+
+    with segmento.lock:
+        rimossi = segmento.rimuovi_scaduti(50)
+
+    assert rimossi == ["altra"]
+    assert segmento.get("k", 50) == "nuovo"
+
+
+def test_rimuovi_scaduti_ricostruisce_un_heap_pieno_di_elementi_obsoleti():
+    segmento = Segmento(max_entries=10, max_bytes=10 ** 9)
+    for i in range(200):
+        segmento.save("k", i, scadenza=1000 + i, now=0)
+
+    assert len(segmento.scadenze) <= 2 * len(segmento.dati) + 64
+
+
+# --- Cache delle risposte gRPC ---
+
+def test_cache_chiave_separa_i_metodi():
+    risposte = Cache(num_shards=4)
+    risposte.save_response("client", "msg-1", "singola", metodo="CheckUser")
+    risposte.save_response("client", "msg-1", "lista", metodo="CheckUsers")
+
+    assert risposte.get_response("client", "msg-1", metodo="CheckUser") == "singola"
+    assert risposte.get_response("client", "msg-1", metodo="CheckUsers") == "lista"
+    assert risposte.get_response("client", "msg-1") is None
+    assert risposte.chiave("client", "msg-1") == "client:msg-1"
+    assert risposte.chiave("client", "msg-1", "CheckUser") == "CheckUser/client:msg-1"
+
+
+def test_cache_ttl(orologio):
+    risposte = Cache(ttl_seconds=30, num_shards=4)
+    risposte.save_response("client", "msg", "r")
+
+    orologio.avanza(29)
+    assert risposte.get_response("client", "msg") == "r"
+    orologio.avanza(1)
+    assert risposte.get_response("client", "msg") is None
+
+
+def test_cache_divide_i_limiti_tra_i_segmenti():
+    risposte = Cache(num_shards=8, max_entries=80, max_bytes=8000)
+
+    assert all(s.max_entries == 10 and s.max_bytes == 1000 for s in risposte.segmenti)
+    #le chiavi si distribuiscono sui segmenti
+    for i in range(200):
+        risposte.save_response("client", i, i)
+    assert sum(1 for s in risposte.segmenti if s.dati) > 1
+    stats = risposte.get_stats()
+    assert stats["entries"] <= 80
+    assert stats["evictions"] == 200 - stats["entries"]
+
+
+def test_cache_remove_response():
+    risposte = Cache(num_shards=4)
+    risposte.save_response("client", "msg", "r", metodo="CheckUser")
+
+    assert risposte.remove_response("client", "msg", metodo="CheckUser") is True
+    assert risposte.remove_response("client", "msg", metodo="CheckUser") is False
+    assert risposte.get_response("client", "msg", metodo="CheckUser") is None
+
+
+# --- Cache di esistenza degli utenti ---
+
+@pytest.fixture
+def esistenza(orologio):
+    esistenza = UserExistenceCache(ttl_positivo=60, ttl_negativo=10, num_shards=4)
+    esistenza.attiva()
+    orologio.avanza(1)
+    return esistenza
+
+
+def test_esistenza_non_risponde_finche_l_ascolto_non_e_attivo(orologio):
+    esistenza = UserExistenceCache(num_shards=4)
+    esistenza.save("a@example.com", True, orologio())
+
+    assert esistenza.get("a@example.com") is None
+    assert esistenza.get_stats()["sincronizzata"] is False
+
+
+def test_esistenza_ignora_le_letture_partite_prima_dell_attivazione(orologio):
+    esistenza = UserExistenceCache(num_shards=4)
+    letto_alle = orologio()
+    orologio.avanza(1)
+    esistenza.attiva()
+    esistenza.save("a@example.com", True, letto_alle)
+
+    assert esistenza.get("a@example.com") is None
+
+
+def test_esistenza_ttl_positivo_e_negativo(esistenza, orologio):
+    esistenza.save("si@example.com", True, orologio())
+    esistenza.save("no@example.com", False, orologio())
+
+    assert esistenza.get("si@example.com") is True
+    assert esistenza.get("no@example.com") is False
+    orologio.avanza(10)
+    assert esistenza.get("no@example.com") is None
+    assert esistenza.get("si@example.com") is True
+    orologio.avanza(50)
+    assert esistenza.get("si@example.com") is None
+
+
+def test_esistenza_lettura_iniziata_prima_di_un_invalidazione_non_entra_in_cache(esistenza, orologio):
+    #una CheckUser legge "esiste" dal DB, nel frattempo l'utente viene cancellato e invalidato
+    letto_alle = orologio()
+    orologio.avanza(0.5)
+    esistenza.invalidate("a@example.com")
+    esistenza.save("a@example.com", True, letto_alle)
+
+    assert esistenza.get("a@example.com") is None
+
+    #una lettura successiva all'invalidazione invece si salva
+    orologio.avanza(0.5)
+    esistenza.save("a@example.com", False, orologio())
+    assert esistenza.get("a@example.com") is False
+
+
+def test_esistenza_invalidate_toglie_il_valore_salvato(esistenza, orologio):
+    esistenza.save("a@example.com", False, orologio())
+    esistenza.invalidate("a@example.com")
+
+    assert esistenza.get("a@example.com") is None
+    assert esistenza.get_stats()["invalidations"] == 1
+
+
+def test_esistenza_disattiva_svuota_tutto(esistenza, orologio):
+    for i in range(20):
+        esistenza.save(f"u{i}@example.com", True, orologio())
+    esistenza.disattiva()
+
+    assert esistenza.get_stats()["entries"] == 0
+    assert all(s.bytes == 0 and not s.scadenze for s in esistenza.segmenti)
+    esistenza.save("u0@example.com", True, orologio())
+    assert esistenza.get("u0@example.com") is None
+
+    #riattivata, accetta solo letture partite dopo la nuova attivazione
+    letto_prima = orologio()
+    orologio.avanza(1)
+    esistenza.attiva()
+    esistenza.save("u0@example.com", True, letto_prima)
+    assert esistenza.get("u0@example.com") is None
+    orologio.avanza(1)
+    esistenza.save("u0@example.com", True, orologio())
+    assert esistenza.get("u0@example.com") is True
+
+
+def test_esistenza_statistiche(esistenza, orologio):
+    esistenza.save("a@example.com", True, orologio())
+    esistenza.get("a@example.com")
+    esistenza.get("b@example.com")
+
+    stats = esistenza.get_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
@@ -0,0 +1,145 @@
+import base64
+import hashlib
+from concurrent import futures
+import pytest
+from hashing import HasherScrypt, HasherSha256, PasswordHasher, riconosci, LUNGHEZZA_HASH, LUNGHEZZA_SALE
+
+#costo basso: i test controllano formato e logica, non la resistenza dell'hash
+PARAMETRI = {"n": 1024, "r": 8, "p": 1}
+
+
+def test_formato_scrypt():
+    salvato = HasherScrypt(**PARAMETRI).hash("segreta")
+    nome, n, r, p, sale, digest = salvato.split("$")
+
+    assert (nome, n, r, p) == ("scrypt", "1024", "8", "1")
+    assert len(base64.b64decode(sale)) == LUNGHEZZA_SALE
+    assert len(base64.b64decode(digest)) == LUNGHEZZA_HASH
+
+
+def test_scrypt_sale_diverso_per_ogni_hash():
+    hasher = HasherScrypt(**PARAMETRI)
+    assert hasher.hash("segreta") != hasher.hash("segreta")
+
+
+def test_scrypt_verifica():
+    hasher = HasherScrypt(**PARAMETRI)
+    salvato = hasher.hash("segreta")
+
+    assert hasher.verifica("segreta", salvato)
+    assert not hasher.verifica("sbagliata", salvato)
+
+
+def test_scrypt_verifica_con_i_parametri_salvati_non_con_quelli_attuali():
+    salvato = HasherScrypt(n=2048, r=4, p=1).hash("segreta")
+    assert HasherScrypt(**PARAMETRI).verifica("segreta", salvato)
+
+
+def test_scrypt_da_aggiornare():
+    hasher = HasherScrypt(**PARAMETRI)
+
+    assert not hasher.da_aggiornare(hasher.hash("segreta"))
+    assert hasher.da_aggiornare(HasherScrypt(n=2048, r=8, p=1).hash("segreta"))
+    assert hasher.da_aggiornare(hashlib.sha256(b"segreta").hexdigest())
+
+
+def test_sha256_storico():
+    salvato = hashlib.sha256(b"segreta").hexdigest()
+    hasher = HasherSha256()
+
+    assert hasher.verifica("segreta", salvato)
+    assert not hasher.verifica("sbagliata", salvato)
+
+
+@pytest.mark.parametrize("salvato, tipo", [
+    (hashlib.sha256(b"segreta").hexdigest(), HasherSha256),
+    ("scrypt$1024$8$1$c2FsZQ==$aGFzaA==", HasherScrypt),
+])
+def test_riconosci(salvato, tipo):
+    assert isinstance(riconosci(salvato), tipo)
+
+
+def test_riconosci_algoritmo_sconosciuto():
+    with pytest.raises(KeyError):
+        riconosci("bcrypt$12$qualcosa")
+
+
+@pytest.fixture
+def hasher():
+    #workers=0: calcolo nel thread del test, senza pool di processi
+    return PasswordHasher(parametri=PARAMETRI, workers=0)
+
+
+def test_password_hasher_verifica_senza_rehash(hasher):
+    salvato = hasher.hash("segreta")
+
+    assert hasher.verifica("segreta", salvato) == (True, None)
+    assert hasher.verifica("sbagliata", salvato) == (False, None)
+    assert hasher.verifica("segreta", None) == (False, None)
+
+
+def test_password_hasher_utente_inesistente_calcola_comunque_scrypt(hasher, monkeypatch):
+    verificati = []
+    originale = HasherScrypt.verifica
+    monkeypatch.setattr(HasherScrypt, "verifica", lambda self, pw, s: verificati.append(s) or originale(self, pw, s))
+
+    assert hasher.verifica("segreta", None) == (False, None)
+    assert hasher.verifica("segreta", "") == (False, None)
+    #stesso costo di un hash vero, calcolato una volta sola
+    assert len(verificati) == 2 and verificati[0] == verificati[1]
+    assert verificati[0].startswith("scrypt$1024$8$1$")
+
+
+@pytest.mark.parametrize("salvato", ["bcrypt$12$qualcosa", "scrypt$1024$8", "scrypt$x$8$1$c2FsZQ==$aGFzaA=="])
+def test_password_hasher_hash_sconosciuto_o_rovinato(hasher, salvato):
+    assert hasher.verifica("segreta", salvato) == (False, None)
+
+
+def test_password_hasher_riscrive_il_vecchio_sha256(hasher):
+    corretta, nuovo = hasher.verifica("segreta", hashlib.sha256(b"segreta").hexdigest())
+
+    assert corretta
+    assert nuovo.startswith("scrypt$1024$8$1$")
+    assert HasherScrypt(**PARAMETRI).verifica("segreta", nuovo)
+
+
+def test_password_hasher_riscrive_se_il_costo_e_cambiato(hasher):
+    salvato = HasherScrypt(n=2048, r=8, p=1).hash("segreta")
+    corretta, nuovo = hasher.verifica("segreta", salvato)
+
+    assert corretta and nuovo.startswith("scrypt$1024$")
+
+
+def test_password_hasher_password_sbagliata_non_riscrive(hasher):
+    assert hasher.verifica("sbagliata", hashlib.sha256(b"segreta").hexdigest()) == (False, None)
+
+
+def test_hash_molti_nel_pool_di_processi():
+    hasher = PasswordHasher(parametri=PARAMETRI, workers=2)
+    try:
+        salvati = hasher.hash_molti([f"pw-{i}" for i in range(10)])
+        assert len(salvati) == 10
+        assert all(HasherScrypt(**PARAMETRI).verifica(f"pw-{i}", s) for i, s in enumerate(salvati))
+        assert hasher.verifica("pw-3", salvati[3]) == (True, None)
+    finally:
+        hasher.close()
+
+
+def test_pool_dopo_aver_inizializzato_grpc():
+    #come nei worker: il processo ha già un server e un canale gRPC attivi quando nasce il pool
+    grpc = pytest.importorskip("grpc")
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
+    porta = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    canale = grpc.insecure_channel(f"127.0.0.1:{porta}")
+    hasher = PasswordHasher(parametri=PARAMETRI, workers=2)
+    try:
+        grpc.channel_ready_future(canale).result(timeout=10)
+
+        salvati = hasher.hash_molti([f"pw-{i}" for i in range(4)])
+        assert all(HasherScrypt(**PARAMETRI).verifica(f"pw-{i}", s) for i, s in enumerate(salvati))
+        assert hasher.executor._mp_context.get_start_method() == "spawn"
+    finally:
+        hasher.close()
+        canale.close()
+        server.stop(None)
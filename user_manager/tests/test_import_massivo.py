@@ -0,0 +1,124 @@
+import http.client
+import io
+import json
+import os
+import socket
+import threading
+import uuid
+import pytest
+
+# Import massivo contro un Postgres vero (DATABASE_URL) e un server HTTP vero: il client invia tutto
+# il corpo prima di leggere la risposta, come requests o curl dietro un proxy
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("serve un Postgres raggiungibile da DATABASE_URL", allow_module_level=True)
+
+from werkzeug.serving import make_server
+import app as user_manager
+from database_postgres import database_postgres
+
+
+@pytest.fixture(scope="module")
+def porta():
+    server = make_server("127.0.0.1", 0, user_manager.app, threaded=True)
+    #buffer di invio minimo (le connessioni accettate lo ereditano): la risposta non può accumularsi nel kernel
+    server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_port
+    server.shutdown()
+
+
+@pytest.fixture
+def prefisso():
+    prefisso = f"bulk-{uuid.uuid4().hex[:8]}"
+    yield prefisso
+    with database_postgres.get_connection() as conn:
+        conn.execute("DELETE FROM users WHERE email LIKE %s", (f"{prefisso}-%",))
+
+
+def invia_tutto_poi_leggi(porta, corpo, timeout=60):
+
+    #buffer di ricezione minimo: se il server risponde prima di aver letto il corpo, la risposta
+    #riempie subito i buffer e sendall resta bloccata fino al timeout
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.settimeout(timeout)
+    sock.connect(("127.0.0.1", porta))
+    try:
+        intestazioni = (
+            "POST /users/bulk HTTP/1.1\r\n"
+            "Host: 127.0.0.1\r\n"
+            "Content-Type: application/x-ndjson\r\n"
+            "Connection: close\r\n"
+            f"Content-Length: {len(corpo)}\r\n\r\n"
+        )
+        sock.sendall(intestazioni.encode() + corpo)
+
+        #solo ora si legge la risposta (http.client gestisce anche il chunked)
+        risposta = http.client.HTTPResponse(sock)
+        risposta.begin()
+        contenuto = risposta.read()
+    finally:
+        sock.close()
+
+    return risposta.status, [json.loads(riga) for riga in contenuto.splitlines() if riga]
+
+
+def test_corpo_piu_grande_dei_buffer_del_socket(porta, prefisso):
+
+    #3000 righe (più di un blocco da BULK_BLOCCO) con un campo ignorato che porta il corpo a circa 9 MB
+    righe = 3000
+    riempitivo = "x" * 3000
+    corpo = "".join(
+        json.dumps({"email": f"{prefisso}-{i}@example.com", "password": f"pw-{i}", "note": riempitivo}) + "\n"
+        for i in range(righe)
+    ).encode()
+    assert len(corpo) > 8 * 1024 * 1024
+
+    stato, esiti = invia_tutto_poi_leggi(porta, corpo)
+
+    assert stato == 200
+    assert [e["riga"] for e in esiti] == list(range(1, righe + 1))
+    assert all(e["stato"] == "creato" for e in esiti)
+
+
+def test_righe_non_valide_e_doppioni(porta, prefisso):
+
+    corpo = "\n".join([
+        json.dumps({"email": f"{prefisso}-a@example.com", "password": "pw"}),
+        "non è json",
+        json.dumps({"email": f"{prefisso}-b@example.com"}),
+        json.dumps({"email": f"{prefisso}-a@example.com", "password": "altra"}),
+    ]).encode() + b"\n"
+
+    _, esiti = invia_tutto_poi_leggi(porta, corpo)
+
+    assert [e["stato"] for e in esiti] == ["creato", "errore", "errore", "gia_registrato"]
+
+
+@pytest.mark.parametrize("posizione", [10, 1024 * 1024 + 5])
+def test_corpo_non_utf8(porta, prefisso, posizione):
+
+    #il byte non valido può cadere anche dopo il primo pezzo letto (BULK_BUFFER)
+    riga = json.dumps({"email": f"{prefisso}-a@example.com", "password": "pw", "nome": "Jos\u00e9"}) + "\n"
+    corpo = (riga * (posizione // len(riga) + 2)).encode()
+    corpo = corpo[:posizione] + b"\xff" + corpo[posizione:]
+
+    stato, esiti = invia_tutto_poi_leggi(porta, corpo)
+
+    assert stato == 400
+    assert esiti == [{"errore": f"Il corpo non è UTF-8 valido (byte {posizione})"}]
+    with database_postgres.get_connection() as conn:
+        assert conn.execute("SELECT count(*) FROM users WHERE email LIKE %s", (f"{prefisso}-%",)).fetchone()[0] == 0
+
+
+def test_copia_utf8_carattere_spezzato_tra_due_pezzi(monkeypatch):
+    monkeypatch.setattr(user_manager, "BULK_BUFFER", 3)
+    corpo = "aé€b".encode()   #é e € finiscono a cavallo tra due letture
+    copia = io.BytesIO()
+    user_manager.copia_utf8(io.BytesIO(corpo), copia)
+    assert copia.getvalue() == corpo
+
+    #il primo byte non valido è l'inizio del € troncato
+    with pytest.raises(ValueError, match=r"\(byte 3\)"):
+        user_manager.copia_utf8(io.BytesIO("aé€b".encode()[:4] + b"\xff"), io.BytesIO())
@@ -0,0 +1,144 @@
+import os
+import time
+import uuid
+from contextlib import contextmanager
+import pytest
+
+# Dispatcher dell'outbox delle cancellazioni contro un Postgres vero (DATABASE_URL)
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("serve un Postgres raggiungibile da DATABASE_URL", allow_module_level=True)
+
+import psycopg
+from database_postgres import database_postgres
+from outbox import DispatcherCancellazioni, OUTBOX_BACKOFF_MAX
+
+
+class DatabaseDiTest:
+    #stessa interfaccia di Database, ma con search_path su uno schema del test: il dispatcher vede
+    #solo le righe accodate dal test e non tocca le cancellazioni reali o quelle di altri test
+    def __init__(self, schema):
+        self.schema = schema
+
+    @contextmanager
+    def get_connection(self, operazione="query"):
+        with psycopg.connect(database_postgres.url, options=f"-c search_path={self.schema}") as connection:
+            yield connection
+
+
+@pytest.fixture
+def db():
+    schema = f"test_outbox_{uuid.uuid4().hex[:8]}"
+    with database_postgres.get_connection() as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+        conn.execute(f"CREATE TABLE {schema}.outbox_cancellazioni (LIKE public.outbox_cancellazioni INCLUDING ALL)")
+    yield DatabaseDiTest(schema)
+    with database_postgres.get_connection() as conn:
+        conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+class DataCollectorFinto:
+    #registra le DeleteDataBatch ricevute; con fallisci=True ogni chiamata solleva un errore
+    def __init__(self, fallisci=False):
+        self.fallisci = fallisci
+        self.chiamate = []
+        self.istanti = {}
+
+    def __call__(self, cancellazioni):
+        self.chiamate.append([e for e, _ in cancellazioni])
+        self.istanti.update(cancellazioni)
+        if self.fallisci:
+            raise RuntimeError("data collector non raggiungibile")
+        return len(cancellazioni)
+
+
+def accoda(db, *emails):
+    with db.get_connection() as conn:
+        ids = [conn.execute("INSERT INTO outbox_cancellazioni (email) VALUES (%s) RETURNING id", (e,)).fetchone()[0]
+               for e in emails]
+    return ids
+
+
+def righe(db):
+    #(email, tentativi, secondi mancanti al prossimo tentativo)
+    with db.get_connection() as conn:
+        return conn.execute(
+            """
+            SELECT email, tentativi, EXTRACT(EPOCH FROM prossimo_tentativo - CURRENT_TIMESTAMP::timestamp)
+            FROM outbox_cancellazioni ORDER BY id
+            """
+        ).fetchall()
+
+
+def rendi_scadute(db):
+    with db.get_connection() as conn:
+        conn.execute("UPDATE outbox_cancellazioni SET prossimo_tentativo = CURRENT_TIMESTAMP - interval '1 second'")
+
+
+def test_invio_riuscito_cancella_le_righe(db):
+    accoda(db, "b@example.com", "a@example.com", "a@example.com")
+    data_collector = DataCollectorFinto()
+    dispatcher = DispatcherCancellazioni(db, data_collector, batch=1000)
+
+    assert dispatcher.esegui_batch() == 3
+    #una sola chiamata, email senza doppioni e in ordine
+    assert data_collector.chiamate == [["a@example.com", "b@example.com"]]
+    assert righe(db) == []
+
+
+def test_invio_porta_l_istante_della_cancellazione(db):
+    prima = time.time()
+    [vecchia, _] = accoda(db, "a@example.com", "a@example.com")
+    #la stessa email cancellata due volte: vale la cancellazione più recente
+    with db.get_connection() as conn:
+        conn.execute("UPDATE outbox_cancellazioni SET created_at = created_at - interval '1 hour' WHERE id = %s", (vecchia,))
+    data_collector = DataCollectorFinto()
+    DispatcherCancellazioni(db, data_collector, batch=1000).esegui_batch()
+
+    assert data_collector.chiamate == [["a@example.com"]]
+    assert prima - 1 <= data_collector.istanti["a@example.com"] <= time.time() + 1
+
+
+def test_invio_fallito_riprova_con_attesa_che_raddoppia(db):
+    accoda(db, "a@example.com")
+    data_collector = DataCollectorFinto(fallisci=True)
+    dispatcher = DispatcherCancellazioni(db, data_collector, batch=1000)
+
+    for tentativi, attesa in ((1, 1), (2, 2), (3, 4), (4, 8)):
+        assert dispatcher.esegui_batch() == 0
+        [(_, salvati, mancanti)] = righe(db)
+        assert salvati == tentativi
+        assert attesa - 1 < mancanti <= attesa
+        #la riga non ancora scaduta non viene ripresa
+        data_collector.chiamate.clear()
+        dispatcher.esegui_batch()
+        assert data_collector.chiamate == []
+        rendi_scadute(db)
+
+    stats = dispatcher.get_stats()
+    assert stats["errori"] == 4
+    assert stats["ultimo_errore"] == "data collector non raggiungibile"
+
+
+def test_attesa_massima(db):
+    [id_riga] = accoda(db, "a@example.com")
+    with db.get_connection() as conn:
+        conn.execute("UPDATE outbox_cancellazioni SET tentativi = 30 WHERE id = %s", (id_riga,))
+    DispatcherCancellazioni(db, DataCollectorFinto(fallisci=True), batch=1000).esegui_batch()
+
+    [(_, tentativi, mancanti)] = righe(db)
+    assert tentativi == 31
+    assert OUTBOX_BACKOFF_MAX - 1 < mancanti <= OUTBOX_BACKOFF_MAX
+
+
+def test_righe_bloccate_da_un_altro_dispatcher_vengono_saltate(db):
+    [id_bloccata, _] = accoda(db, "bloccata@example.com", "libera@example.com")
+    data_collector = DataCollectorFinto()
+
+    #un altro processo ha preso la riga e sta ancora chiamando il Data Collector
+    with db.get_connection() as altro:
+        altro.execute("SELECT id FROM outbox_cancellazioni WHERE id = %s FOR UPDATE", (id_bloccata,))
+        DispatcherCancellazioni(db, data_collector, batch=1000).esegui_batch()
+        altro.rollback()
+
+    assert data_collector.chiamate == [["libera@example.com"]]
+    assert [r[0] for r in righe(db)] == ["bloccata@example.com"]
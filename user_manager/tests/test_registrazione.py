@@ -0,0 +1,131 @@
+import os
+import threading
+import uuid
+import pytest
+
+# Registrazione idempotente (una sola istruzione con CTE) contro un Postgres vero (DATABASE_URL)
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("serve un Postgres raggiungibile da DATABASE_URL", allow_module_level=True)
+
+import psycopg
+import app as user_manager
+from database_postgres import database_postgres, CANALE_UTENTI
+
+
+@pytest.fixture
+def prefisso():
+    prefisso = f"reg-{uuid.uuid4().hex[:8]}"
+    yield prefisso
+    with database_postgres.get_connection() as conn:
+        conn.execute("DELETE FROM users WHERE email LIKE %s", (f"{prefisso}-%",))
+        conn.execute("DELETE FROM richieste_idempotenti WHERE request_id LIKE %s", (f"{prefisso}-%",))
+
+
+@pytest.fixture
+def client():
+    return user_manager.app.test_client()
+
+
+@pytest.fixture
+def hash_calcolati(monkeypatch):
+    #conta gli scrypt calcolati dalla registrazione
+    calcolati = []
+    originale = user_manager.password_hasher.hash
+
+    def conta(password):
+        calcolati.append(password)
+        return originale(password)
+    monkeypatch.setattr(user_manager.password_hasher, "hash", conta)
+    return calcolati
+
+
+def registra(client, request_id, email, password="pw"):
+    return client.post("/users", json={"email": email, "password": password, "nome": "Test"},
+                       headers={"Request-ID": request_id})
+
+
+def conta_utenti(email):
+    with database_postgres.get_connection() as conn:
+        return conn.execute("SELECT count(*) FROM users WHERE email = %s", (email,)).fetchone()[0]
+
+
+def test_nuova_registrazione(client, prefisso):
+    email = f"{prefisso}-a@example.com"
+    r = registra(client, f"{prefisso}-1", email)
+
+    assert r.status_code == 201
+    assert r.get_json()["email"] == email
+    assert conta_utenti(email) == 1
+    with database_postgres.get_connection() as conn:
+        status, body = conn.execute("SELECT status, body FROM richieste_idempotenti WHERE request_id = %s",
+                                    (f"{prefisso}-1",)).fetchone()
+    assert (status, body) == (201, r.get_json())
+
+
+def test_stessa_email_con_un_altro_request_id(client, prefisso):
+    email = f"{prefisso}-a@example.com"
+    registra(client, f"{prefisso}-1", email)
+    r = registra(client, f"{prefisso}-2", email, password="altra")
+
+    assert r.status_code == 200
+    assert "già registrato" in r.get_json()["messaggio"]
+    assert conta_utenti(email) == 1
+
+
+def test_retry_da_un_altro_processo_usa_la_risposta_nel_db_senza_hash(client, prefisso, hash_calcolati, monkeypatch):
+    email = f"{prefisso}-a@example.com"
+    prima = registra(client, f"{prefisso}-1", email)
+    assert len(hash_calcolati) == 1
+
+    #un altro processo non ha la risposta nella sua cache locale
+    monkeypatch.setattr(user_manager, "global_cache", user_manager.Cache(num_shards=1))
+    #anche con un corpo diverso conta solo il Request-ID
+    retry = registra(client, f"{prefisso}-1", f"{prefisso}-b@example.com")
+
+    assert (retry.status_code, retry.get_json()) == (prima.status_code, prima.get_json())
+    assert len(hash_calcolati) == 1
+    assert conta_utenti(f"{prefisso}-b@example.com") == 0
+
+
+def test_retry_concorrenti_creano_un_solo_utente(prefisso, monkeypatch):
+    monkeypatch.setattr(user_manager, "global_cache", user_manager.Cache(num_shards=1))
+    email = f"{prefisso}-a@example.com"
+    risposte = []
+    lock = threading.Lock()
+    partenza = threading.Barrier(8)
+
+    def invia():
+        client = user_manager.app.test_client()
+        partenza.wait()
+        r = registra(client, f"{prefisso}-1", email)
+        with lock:
+            risposte.append((r.status_code, r.get_json()))
+
+    threads = [threading.Thread(target=invia) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(risposte) == 8
+    assert {status for status, _ in risposte} == {201}
+    assert all(body == risposte[0][1] for _, body in risposte)
+    assert conta_utenti(email) == 1
+
+
+def test_registrazione_notifica_le_cache_di_esistenza(client, prefisso):
+    email = f"{prefisso}-a@example.com"
+    #le cache di esistenza stanno nei processi gRPC: le avvisa la NOTIFY su CANALE_UTENTI
+    with psycopg.connect(database_postgres.url, autocommit=True) as ascolto:
+        ascolto.execute(f"LISTEN {CANALE_UTENTI}")
+        registra(client, f"{prefisso}-1", email)
+        registra(client, f"{prefisso}-2", email)
+        notificate = [n.payload for n in ascolto.notifies(timeout=1) if n.payload.startswith(prefisso)]
+
+    #solo l'insert che ha creato davvero l'utente notifica
+    assert notificate == [email]
+
+
+def test_manca_request_id(client):
+    r = client.post("/users", json={"email": "x@example.com", "password": "pw"})
+    assert r.status_code == 400
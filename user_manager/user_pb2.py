@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nuser.proto\"H\n\x10\x43heckUserRequest\x12\x11\n\tclient_id\x18\x01 \x01(\t\x12\x12\n\nmessage_id\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\"#\n\x11\x43heckUserResponse\x12\x0e\n\x06\x65xists\x18\x01 \x01(\x08\"\"\n\x11\x44\x65leteDataRequest\x12\r\n\x05\x65mail\x18\x01 \x01(\t\"%\n\x12\x44\x65leteDataResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x32\x41\n\x0bUserManager\x12\x32\n\tCheckUser\x12\x11.CheckUserRequest\x1a\x12.CheckUserResponse2F\n\rDataCollector\x12\x35\n\nDeleteData\x12\x12.DeleteDataRequest\x1a\x13.DeleteDataResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nuser.proto\"H\n\x10\x43heckUserRequest\x12\x11\n\tclient_id\x18\x01 \x01(\t\x12\x12\n\nmessage_id\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\"#\n\x11\x43heckUserResponse\x12\x0e\n\x06\x65xists\x18\x01 \x01(\x08\"J\n\x11\x43heckUsersRequest\x12\x11\n\tclient_id\x18\x01 \x01(\t\x12\x12\n\nmessage_id\x18\x02 \x01(\t\x12\x0e\n\x06\x65mails\x18\x03 \x03(\t\".\n\rUserExistence\x12\r\n\x05\x65mail\x18\x01 \x01(\t\x12\x0e\n\x06\x65xists\x18\x02 \x01(\x08\"5\n\x12\x43heckUsersResponse\x12\x1f\n\x07results\x18\x01 \x03(\x0b\x32\x0e.UserExistence\"\"\n\x11\x44\x65leteDataRequest\x12\r\n\x05\x65mail\x18\x01 \x01(\t\"%\n\x12\x44\x65leteDataResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"J\n\x16\x44\x65leteDataBatchRequest\x12\x0e\n\x06\x65mails\x18\x01 \x03(\t\x12 \n\tdeletions\x18\x02 \x03(\x0b\x32\r.UserDeletion\"1\n\x0cUserDeletion\x12\r\n\x05\x65mail\x18\x01 \x01(\t\x12\x12\n\ndeleted_at\x18\x02 \x01(\x01\"A\n\x17\x44\x65leteDataBatchResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x15\n\rdeleted_count\x18\x02 \x01(\x05\x32\xb2\x01\n\x0bUserManager\x12\x32\n\tCheckUser\x12\x11.CheckUserRequest\x1a\x12.CheckUserResponse\x12\x35\n\nCheckUsers\x12\x12.CheckUsersRequest\x1a\x13.CheckUsersResponse\x12\x38\n\x10StreamCheckUsers\x12\x12.CheckUsersRequest\x1a\x0e.UserExistence0\x01\x32\x8c\x01\n\rDataCollector\x12\x35\n\nDeleteData\x12\x12.DeleteDataRequest\x1a\x13.DeleteDataResponse\x12\x44\n\x0f\x44\x65leteDataBatch\x12\x17.DeleteDataBatchRequest\x1a\x18.DeleteDataBatchResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,12 +35,24 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_CHECKUSERREQUEST']._serialized_end=86
   _globals['_CHECKUSERRESPONSE']._serialized_start=88
   _globals['_CHECKUSERRESPONSE']._serialized_end=123
-  _globals['_DELETEDATAREQUEST']._serialized_start=125
-  _globals['_DELETEDATAREQUEST']._serialized_end=159
-  _globals['_DELETEDATARESPONSE']._serialized_start=161
-  _globals['_DELETEDATARESPONSE']._serialized_end=198
-  _globals['_USERMANAGER']._serialized_start=200
-  _globals['_USERMANAGER']._serialized_end=265
-  _globals['_DATACOLLECTOR']._serialized_start=267
-  _globals['_DATACOLLECTOR']._serialized_end=337
+  _globals['_CHECKUSERSREQUEST']._serialized_start=125
+  _globals['_CHECKUSERSREQUEST']._serialized_end=199
+  _globals['_USEREXISTENCE']._serialized_start=201
+  _globals['_USEREXISTENCE']._serialized_end=247
+  _globals['_CHECKUSERSRESPONSE']._serialized_start=249
+  _globals['_CHECKUSERSRESPONSE']._serialized_end=302
+  _globals['_DELETEDATAREQUEST']._serialized_start=304
+  _globals['_DELETEDATAREQUEST']._serialized_end=338
+  _globals['_DELETEDATARESPONSE']._serialized_start=340
+  _globals['_DELETEDATARESPONSE']._serialized_end=377
+  _globals['_DELETEDATABATCHREQUEST']._serialized_start=379
+  _globals['_DELETEDATABATCHREQUEST']._serialized_end=453
+  _globals['_USERDELETION']._serialized_start=455
+  _globals['_USERDELETION']._serialized_end=504
+  _globals['_DELETEDATABATCHRESPONSE']._serialized_start=506
+  _globals['_DELETEDATABATCHRESPONSE']._serialized_end=571
+  _globals['_USERMANAGER']._serialized_start=574
+  _globals['_USERMANAGER']._serialized_end=752
+  _globals['_DATACOLLECTOR']._serialized_start=755
+  _globals['_DATACOLLECTOR']._serialized_end=895
 # @@protoc_insertion_point(module_scope)
@@ -39,6 +39,16 @@ class UserManagerStub(object):
                 request_serializer=user__pb2.CheckUserRequest.SerializeToString,
                 response_deserializer=user__pb2.CheckUserResponse.FromString,
                 _registered_method=True)
+        self.CheckUsers = channel.unary_unary(
+                '/UserManager/CheckUsers',
+                request_serializer=user__pb2.CheckUsersRequest.SerializeToString,
+                response_deserializer=user__pb2.CheckUsersResponse.FromString,
+                _registered_method=True)
+        self.StreamCheckUsers = channel.unary_stream(
+                '/UserManager/StreamCheckUsers',
+                request_serializer=user__pb2.CheckUsersRequest.SerializeToString,
+                response_deserializer=user__pb2.UserExistence.FromString,
+                _registered_method=True)
 
 
 class UserManagerServicer(object):
@@ -51,6 +61,20 @@ class UserManagerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def CheckUsers(self, request, context):
+        """verifica di più email con una sola query (stessa semantica At-Most-Once di CheckUser)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamCheckUsers(self, request, context):
+        """variante in streaming per liste molto grandi: un risultato per email
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_UserManagerServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -59,6 +83,16 @@ def add_UserManagerServicer_to_server(servicer, server):
                     request_deserializer=user__pb2.CheckUserRequest.FromString,
                     response_serializer=user__pb2.CheckUserResponse.SerializeToString,
             ),
+            'CheckUsers': grpc.unary_unary_rpc_method_handler(
+                    servicer.CheckUsers,
+                    request_deserializer=user__pb2.CheckUsersRequest.FromString,
+                    response_serializer=user__pb2.CheckUsersResponse.SerializeToString,
+            ),
+            'StreamCheckUsers': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamCheckUsers,
+                    request_deserializer=user__pb2.CheckUsersRequest.FromString,
+                    response_serializer=user__pb2.UserExistence.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'UserManager', rpc_method_handlers)
@@ -97,6 +131,60 @@ class UserManager(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def CheckUsers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/UserManager/CheckUsers',
+            user__pb2.CheckUsersRequest.SerializeToString,
+            user__pb2.CheckUsersResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamCheckUsers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/UserManager/StreamCheckUsers',
+            user__pb2.CheckUsersRequest.SerializeToString,
+            user__pb2.UserExistence.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
 
 class DataCollectorStub(object):
     """Missing associated documentation comment in .proto file."""
@@ -112,6 +200,11 @@ class DataCollectorStub(object):
                 request_serializer=user__pb2.DeleteDataRequest.SerializeToString,
                 response_deserializer=user__pb2.DeleteDataResponse.FromString,
                 _registered_method=True)
+        self.DeleteDataBatch = channel.unary_unary(
+                '/DataCollector/DeleteDataBatch',
+                request_serializer=user__pb2.DeleteDataBatchRequest.SerializeToString,
+                response_deserializer=user__pb2.DeleteDataBatchResponse.FromString,
+                _registered_method=True)
 
 
 class DataCollectorServicer(object):
@@ -123,6 +216,13 @@ class DataCollectorServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def DeleteDataBatch(self, request, context):
+        """cancellazione di più utenti con una sola delete_many (usata dall'outbox dello User Manager)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_DataCollectorServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -131,6 +231,11 @@ def add_DataCollectorServicer_to_server(servicer, server):
                     request_deserializer=user__pb2.DeleteDataRequest.FromString,
                     response_serializer=user__pb2.DeleteDataResponse.SerializeToString,
             ),
+            'DeleteDataBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.DeleteDataBatch,
+                    request_deserializer=user__pb2.DeleteDataBatchRequest.FromString,
+                    response_serializer=user__pb2.DeleteDataBatchResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'DataCollector', rpc_method_handlers)
@@ -168,3 +273,30 @@ class DataCollector(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def DeleteDataBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/DataCollector/DeleteDataBatch',
+            user__pb2.DeleteDataBatchRequest.SerializeToString,
+            user__pb2.DeleteDataBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)